@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, DesignerProfile, Design, Message, Booking,Payment, Notification
+from .models import User, DesignerProfile, Design, Message, Booking,Payment, Notification, ContentBlob, Job, DeadLetterJob, Conversation, UnreadCounter, Tombstone, DesignDailyStats, ReconciliationRun, ReconciliationIssue
 # Register your models here.
 admin.site.register(User)
 admin.site.register(DesignerProfile)
@@ -7,4 +7,13 @@ admin.site.register(Design)
 admin.site.register(Message)
 admin.site.register(Booking)
 admin.site.register(Payment)
-admin.site.register(Notification)
\ No newline at end of file
+admin.site.register(Notification)
+admin.site.register(ContentBlob)
+admin.site.register(Job)
+admin.site.register(DeadLetterJob)
+admin.site.register(Conversation)
+admin.site.register(UnreadCounter)
+admin.site.register(Tombstone)
+admin.site.register(DesignDailyStats)
+admin.site.register(ReconciliationRun)
+admin.site.register(ReconciliationIssue)
@@ -0,0 +1,162 @@
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+def cache_key(key):
+    # Hashed so raw credentials never sit in a shared cache backend
+    return 'auth:token:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def user_version_key(user_id):
+    return f'auth:user:{user_id}:version'
+
+
+# What a cache hit rebuilds request.user from: no password hash, and the
+# remaining fields are deferred, so touching them loads the row
+USER_SNAPSHOT_FIELDS = ('id', 'username', 'role', 'is_active', 'is_staff', 'is_superuser')
+
+
+def get_cache():
+    return caches[getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', 'default')]
+
+
+def token_ttl():
+    seconds = getattr(settings, 'AUTH_TOKEN_TTL', None)
+    return timedelta(seconds=seconds) if seconds else None
+
+
+def is_expired(created, now=None):
+    ttl = token_ttl()
+    return ttl is not None and created + ttl <= (now or timezone.now())
+
+
+def forget_tokens(*keys):
+    # Drop now so this process stops trusting the entry, and again after commit
+    # so a request that re-cached the old state mid-transaction can't keep it
+    cache_keys = [cache_key(key) for key in keys if key]
+    if not cache_keys:
+        return
+    get_cache().delete_many(cache_keys)
+    transaction.on_commit(lambda: get_cache().delete_many(cache_keys))
+
+
+def user_version(user_id):
+    cache = get_cache()
+    version = cache.get(user_version_key(user_id))
+    if version is None:
+        # Seeded from the clock so an evicted version never comes back with an old value
+        version = int(time.time() * 1000)
+        if not cache.add(user_version_key(user_id), version, None):
+            version = cache.get(user_version_key(user_id), version)
+    return version
+
+
+def forget_user(user_id):
+    """Retires every cached snapshot of the user; call after changing who they are or what they may do."""
+    def bump():
+        cache = get_cache()
+        try:
+            cache.incr(user_version_key(user_id))
+        except ValueError:
+            cache.add(user_version_key(user_id), int(time.time() * 1000), None)
+    # Now, and again after commit, as forget_tokens does
+    bump()
+    transaction.on_commit(bump)
+
+
+def user_snapshot(user):
+    return {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS}
+
+
+def user_from_snapshot(snapshot):
+    # from_db pairs values with fields in model order, whatever order the names come in
+    fields = [f.attname for f in get_user_model()._meta.concrete_fields if f.attname in snapshot]
+    return get_user_model().from_db('default', fields, [snapshot[name] for name in fields])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that answers repeat requests from the cache alone: the
+    token key (hashed) maps to its creation time and a small snapshot of the
+    user (USER_SNAPSHOT_FIELDS, no password hash), stamped with the user's
+    version. A hit whose version is current costs no query; request.user is
+    rebuilt from the snapshot with the other fields deferred.
+
+    Entries live for AUTH_TOKEN_CACHE_TIMEOUT seconds. Deleting or rotating
+    the token drops its entry, and saving the user (deactivation, password or
+    role changes) bumps the version, retiring every snapshot at once; code that
+    changes users with queryset.update() must call forget_user(). With
+    AUTH_TOKEN_TTL set, tokens older than that are rejected; logging in again
+    issues a fresh one.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        entry = cache.get(cache_key(key))
+        if entry is not None and entry['version'] != cache.get(user_version_key(entry['user']['id'])):
+            entry = None
+        if entry is None:
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed('Invalid token.')
+            user = token.user
+            entry = {
+                'user': user_snapshot(user), 'version': user_version(user.pk), 'created': token.created,
+            }
+            timeout = getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 60)
+            ttl = token_ttl()
+            if ttl is not None:
+                # Never keep an entry past the token's own expiry
+                timeout = min(timeout, max(int((token.created + ttl - timezone.now()).total_seconds()), 0))
+            if timeout > 0:
+                cache.set(cache_key(key), entry, timeout)
+        else:
+            user = user_from_snapshot(entry['user'])
+
+        if is_expired(entry['created']):
+            raise AuthenticationFailed('Token has expired.')
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        return user, key
+
+
+def rotate_token(user):
+    """Replaces the user's token with a new key; the old key stops working at once."""
+    with transaction.atomic():
+        old_keys = list(Token.objects.filter(user=user).values_list('key', flat=True))
+        Token.objects.filter(user=user).delete()
+        token = Token.objects.create(user=user)
+    forget_tokens(*old_keys)
+    return token
+
+
+def issue_token(user):
+    """
+    The token handed out at login: the current one while it is valid, or a
+    new one once it has expired or is older than AUTH_TOKEN_ROTATE_AFTER.
+    """
+    token, created = Token.objects.get_or_create(user=user)
+    if created:
+        return token
+    rotate_after = getattr(settings, 'AUTH_TOKEN_ROTATE_AFTER', None)
+    stale = rotate_after and token.created + timedelta(seconds=rotate_after) <= timezone.now()
+    if stale or is_expired(token.created):
+        return rotate_token(user)
+    return token
+
+
+def revoke_token(user):
+    keys = list(Token.objects.filter(user=user).values_list('key', flat=True))
+    Token.objects.filter(user=user).delete()
+    forget_tokens(*keys)
@@ -0,0 +1,121 @@
+import json
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+
+class BatchError(ValidationError):
+    """400 with one entry per failed item; unlike ValidationError it keeps `index` an integer."""
+
+    def __init__(self, errors):
+        super().__init__()
+        self.detail = {'errors': errors}
+
+
+def get_batch_limit():
+    return getattr(settings, 'API_BATCH_MAX_SIZE', 100)
+
+
+def batch_items(data, files=None, file_fields=()):
+    """
+    The list of objects in a batch request: a JSON array body, or `items` as a
+    JSON array (as a string for multipart requests). For multipart uploads each
+    item's `file_fields` hold the name of the uploaded file part to use.
+    """
+    items = data.get('items') if hasattr(data, 'get') else data
+    if isinstance(items, str):
+        try:
+            items = json.loads(items)
+        except ValueError:
+            raise ValidationError({'items': 'Must be a JSON array.'})
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        raise ValidationError({'items': 'Send a non-empty list of objects.'})
+    limit = get_batch_limit()
+    if len(items) > limit:
+        raise ValidationError({'items': f'At most {limit} items per batch.'})
+    if files:
+        for item in items:
+            for field in file_fields:
+                if isinstance(item.get(field), str) and item[field] in files:
+                    item[field] = files[item[field]]
+    return items
+
+
+def parse_ids(value):
+    """`?ids=3,1,2` as a de-duplicated list of ints, in the order given."""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in (value or '').split(',') if part.strip()))
+    except ValueError:
+        raise ValidationError({'ids': 'A comma-separated list of integers is required.'})
+    if not ids:
+        raise ValidationError({'ids': 'This query parameter is required.'})
+    limit = get_batch_limit()
+    if len(ids) > limit:
+        raise ValidationError({'ids': f'At most {limit} ids per request.'})
+    return ids
+
+
+def load_instances(queryset, items):
+    """Fetches the objects a batch update names by `id` in one query, aligned with `items`."""
+    errors = []
+    ids = []
+    for index, item in enumerate(items):
+        try:
+            ids.append(int(item.get('id')))
+        except (TypeError, ValueError):
+            errors.append({'index': index, 'errors': {'id': ['A valid integer is required.']}})
+            ids.append(None)
+    found = queryset.in_bulk([pk for pk in ids if pk is not None])
+    seen = set()
+    for index, pk in enumerate(ids):
+        if pk is None:
+            continue
+        if pk not in found:
+            errors.append({'index': index, 'errors': {'id': ['Not found.']}})
+        elif pk in seen:
+            errors.append({'index': index, 'errors': {'id': ['Listed more than once.']}})
+        seen.add(pk)
+    if errors:
+        raise BatchError(sorted(errors, key=lambda error: error['index']))
+    return [found[pk] for pk in ids]
+
+
+def validate_items(serializer_class, items, context, instances=None):
+    """
+    Runs the serializer over every item and reports all failures at once as
+    `{"errors": [{"index": i, "errors": {...}}]}`, so nothing is written unless
+    the whole batch is valid.
+    """
+    serializers = []
+    errors = []
+    for index, item in enumerate(items):
+        instance = instances[index] if instances is not None else None
+        serializer = serializer_class(instance, data=item, partial=instance is not None, context=context)
+        if not serializer.is_valid():
+            errors.append({'index': index, 'errors': serializer.errors})
+        serializers.append(serializer)
+    if errors:
+        raise BatchError(errors)
+    return serializers
+
+
+def bulk_apply(model, serializers):
+    """Copies validated changes onto the instances and writes them with one bulk_update."""
+    instances = []
+    fields = set()
+    now = timezone.now()
+    has_updated_at = any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+    for serializer in serializers:
+        for attr, value in serializer.validated_data.items():
+            setattr(serializer.instance, attr, value)
+            fields.add(attr)
+        if has_updated_at:
+            # bulk_update skips save(), so auto_now has to be applied by hand
+            serializer.instance.updated_at = now
+        instances.append(serializer.instance)
+    if has_updated_at:
+        fields.add('updated_at')
+    if fields:
+        model.objects.bulk_update(instances, sorted(fields))
+    return instances
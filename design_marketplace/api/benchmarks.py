@@ -0,0 +1,399 @@
+import itertools
+import math
+import platform
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+from django.test import Client, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import rollups
+from .cache import design_cache
+from .conversations import PREVIEW_LENGTH
+from .models import (
+    Booking, Conversation, ConversationParticipant, Design, DesignerProfile, Message, Notification, UnreadCounter,
+    User,
+)
+from .querybudget import QueryCounter
+
+# Seeded users are named bench-designer-N / bench-client-N; everything else hangs off them
+PREFIX = 'bench-'
+# Share of each table in a dataset of `scale` rows
+SHAPE = {'users': 0.1, 'designs': 0.1, 'bookings': 0.2, 'messages': 0.3, 'notifications': 0.3}
+DESIGNER_SHARE = 0.2
+MESSAGES_PER_CONVERSATION = 5
+WORDS = (
+    'minimal', 'bold', 'vintage', 'modern', 'rustic', 'floral', 'geometric', 'retro', 'coastal', 'urban',
+    'logo', 'poster', 'kitchen', 'garden', 'brand', 'interior', 'label', 'cover', 'mural', 'identity',
+)
+
+
+def dataset_sizes(scale, **overrides):
+    """Row counts per table for a dataset of about `scale` rows; `overrides` pins single tables."""
+    sizes = {table: max(int(scale * share), 1) for table, share in SHAPE.items()}
+    sizes.update({table: count for table, count in overrides.items() if count is not None})
+    if sizes['users'] < 2:
+        raise ValueError('A dataset needs at least two users (a designer and a client).')
+    return sizes
+
+
+def batched(objects, size):
+    iterator = iter(objects)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def insert(model, objects, batch_size):
+    count = 0
+    for batch in batched(objects, batch_size):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        count += len(batch)
+    return count
+
+
+def bench_users():
+    return User.objects.filter(username__startswith=PREFIX)
+
+
+def has_dataset():
+    return bench_users().exists()
+
+
+def text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(sizes, batch_size=1000, seed=0, progress=None):
+    """
+    Bulk-inserts a synthetic dataset of `sizes` (see dataset_sizes) and brings
+    the derived state the signals would normally maintain (conversation
+    previews, unread counts, dashboard rollups) up to date with set-based
+    queries. Runs in one transaction; returns the rows inserted per table.
+    Timestamps are the insert time: auto_now_add fields can't be backdated here.
+    """
+    rng = random.Random(seed)
+    report = progress or (lambda table, count: None)
+    inserted = {}
+    # Unusable, and hashing once keeps a million users cheap
+    password = make_password(None)
+    designer_count = max(int(sizes['users'] * DESIGNER_SHARE), 1)
+    client_count = max(sizes['users'] - designer_count, 1)
+    unread = defaultdict(lambda: {'notifications': 0, 'messages': 0})
+
+    with transaction.atomic():
+        inserted['users'] = insert(User, itertools.chain(
+            (User(username=f'{PREFIX}designer-{i}', email=f'designer-{i}@bench.invalid', password=password,
+                  role=User.DESIGNER, first_name=f'Designer {i}') for i in range(designer_count)),
+            (User(username=f'{PREFIX}client-{i}', email=f'client-{i}@bench.invalid', password=password,
+                  role=User.CLIENT, first_name=f'Client {i}') for i in range(client_count)),
+        ), batch_size)
+        report('users', inserted['users'])
+        designers = list(bench_users().filter(role=User.DESIGNER).values_list('id', flat=True))
+        clients = list(bench_users().filter(role=User.CLIENT).values_list('id', flat=True))
+
+        inserted['designer_profiles'] = insert(DesignerProfile, (
+            DesignerProfile(user_id=user_id, bio=text(rng, 12), company_name=f'Studio {user_id}')
+            for user_id in designers
+        ), batch_size)
+        inserted['designs'] = insert(Design, (
+            Design(designer_id=rng.choice(designers), title=f'{text(rng, 2).title()} {i}', description=text(rng, 30),
+                   features=text(rng, 4), price=Decimal(rng.randrange(1000, 200000)) / 100,
+                   image='design_images/bench.png')
+            for i in range(sizes['designs'])
+        ), batch_size)
+        report('designs', inserted['designs'])
+        # Joined on the username prefix: id lists this long would overflow SQLite's parameter limit
+        seeded_designs = Design.objects.filter(designer__username__startswith=PREFIX)
+        designs = dict(seeded_designs.values_list('id', 'designer_id'))
+        design_ids = list(designs)
+
+        statuses = [Booking.PENDING] * 5 + [Booking.CONFIRMED] * 4 + [Booking.CANCELLED]
+        inserted['bookings'] = insert(Booking, (
+            Booking(client_id=rng.choice(clients), design_id=rng.choice(design_ids), status=rng.choice(statuses),
+                    notes=text(rng, 6))
+            for _ in range(sizes['bookings'])
+        ), batch_size)
+        report('bookings', inserted['bookings'])
+
+        # One thread per (design, client) pair, MESSAGES_PER_CONVERSATION messages each
+        threads = set()
+        wanted = math.ceil(sizes['messages'] / MESSAGES_PER_CONVERSATION)
+        for _ in range(wanted * 3):
+            if len(threads) >= wanted:
+                break
+            design_id = rng.choice(design_ids)
+            threads.add((design_id, *sorted([designs[design_id], rng.choice(clients)])))
+        inserted['conversations'] = insert(Conversation, (
+            Conversation(design_id=design_id, user_a_id=user_a, user_b_id=user_b)
+            for design_id, user_a, user_b in threads
+        ), batch_size)
+        seeded = Conversation.objects.filter(design__in=seeded_designs)
+        conversations = list(seeded.values_list(
+            'id', 'design_id', 'user_a_id', 'user_b_id',
+        ))
+        inserted['conversation_participants'] = insert(ConversationParticipant, (
+            ConversationParticipant(conversation_id=conversation_id, user_id=user_id)
+            for conversation_id, _, user_a, user_b in conversations for user_id in (user_a, user_b)
+        ), batch_size)
+
+        def messages():
+            for i in range(sizes['messages']):
+                conversation_id, design_id, user_a, user_b = conversations[i % len(conversations)]
+                sender, receiver = (user_a, user_b) if rng.random() < 0.5 else (user_b, user_a)
+                is_read = rng.random() < 0.7
+                if not is_read:
+                    unread[receiver]['messages'] += 1
+                yield Message(sender_id=sender, receiver_id=receiver, design_id=design_id,
+                              conversation_id=conversation_id, content=text(rng, 10), is_read=is_read)
+        inserted['messages'] = insert(Message, messages(), batch_size) if conversations else 0
+        report('messages', inserted['messages'])
+
+        users = designers + clients
+
+        def notifications():
+            for _ in range(sizes['notifications']):
+                user_id, is_read = rng.choice(users), rng.random() < 0.5
+                if not is_read:
+                    unread[user_id]['notifications'] += 1
+                yield Notification(user_id=user_id, message=text(rng, 8), is_read=is_read)
+        inserted['notifications'] = insert(Notification, notifications(), batch_size)
+        report('notifications', inserted['notifications'])
+
+        # What conversations.record_message and the unread-counter signals do per message
+        latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-id')
+        seeded.update(
+            last_message=Subquery(latest.values('pk')[:1]),
+            last_message_at=Subquery(latest.values('timestamp')[:1]),
+            last_message_preview=Coalesce(Subquery(
+                latest.annotate(preview=Substr('content', 1, PREVIEW_LENGTH)).values('preview')[:1],
+            ), Value('')),
+        )
+        unread_in_thread = Message.objects.filter(
+            conversation=OuterRef('conversation_id'), receiver=OuterRef('user_id'), is_read=False,
+        ).order_by().values('conversation').annotate(count=Count('pk')).values('count')
+        ConversationParticipant.objects.filter(conversation__in=seeded).update(
+            last_message_at=Subquery(Conversation.objects.filter(pk=OuterRef('conversation_id'))
+                                     .values('last_message_at')[:1]),
+            unread_count=Coalesce(Subquery(unread_in_thread, output_field=IntegerField()), 0),
+        )
+        insert(UnreadCounter, (UnreadCounter(user_id=user_id, **counts) for user_id, counts in unread.items()),
+               batch_size)
+        rollups.rebuild()
+    design_cache.invalidate()
+    return inserted
+
+
+def dataset_counts():
+    return {
+        'users': User.objects.count(),
+        'designs': Design.objects.count(),
+        'bookings': Booking.objects.count(),
+        'conversations': Conversation.objects.count(),
+        'messages': Message.objects.count(),
+        'notifications': Notification.objects.count(),
+    }
+
+
+class Fixtures:
+    """Ids and tokens the scenarios draw from: a random sample of the seeded designs and users."""
+
+    def __init__(self, rng, sample=200):
+        def pick(values):
+            values = list(values)
+            return rng.sample(values, min(sample, len(values)))
+        self.design_ids = pick(Design.objects.filter(designer__username__startswith=PREFIX)
+                               .values_list('id', flat=True))
+        if not self.design_ids:
+            raise ValueError('No benchmark dataset: run seed_benchmark_data first.')
+        self.client_tokens = self.tokens(pick(bench_users().filter(role=User.CLIENT).values_list('id', flat=True)))
+        self.inbox_tokens = self.tokens(pick(ConversationParticipant.objects.filter(
+            user__username__startswith=PREFIX, last_message_at__isnull=False,
+        ).values_list('user_id', flat=True).distinct()))
+        self.notification_tokens = self.tokens(pick(Notification.objects.filter(
+            user__username__startswith=PREFIX,
+        ).values_list('user_id', flat=True).distinct()))
+
+    @staticmethod
+    def tokens(user_ids):
+        Token.objects.bulk_create(
+            [Token(key=Token.generate_key(), user_id=user_id) for user_id in user_ids], ignore_conflicts=True,
+        )
+        return list(Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True))
+
+
+# Each scenario turns (fixtures, rng) into one request: (method, path, json body, token)
+def feed(fixtures, rng):
+    return 'get', '/api/designs/feed/', None, None
+
+
+def design_detail(fixtures, rng):
+    return 'get', f'/api/designs/{rng.choice(fixtures.design_ids)}/', None, None
+
+
+def booking_create(fixtures, rng):
+    body = {'design': rng.choice(fixtures.design_ids), 'notes': 'Benchmark booking'}
+    return 'post', '/api/bookings/', body, rng.choice(fixtures.client_tokens)
+
+
+def inbox(fixtures, rng):
+    return 'get', '/api/conversations/', None, rng.choice(fixtures.inbox_tokens)
+
+
+def notifications(fixtures, rng):
+    return 'get', '/api/notifications/', None, rng.choice(fixtures.notification_tokens)
+
+
+SCENARIOS = {
+    'feed': feed,
+    'design_detail': design_detail,
+    'booking_create': booking_create,
+    'inbox': inbox,
+    'notifications': notifications,
+}
+
+
+def measure(client, call):
+    method, path, body, token = call
+    extra = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+    if body is not None:
+        extra['content_type'] = 'application/json'
+    counter = QueryCounter()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        response = getattr(client, method)(path, body, **extra)
+    return (time.perf_counter() - started) * 1000, counter.count, response.status_code
+
+
+def percentile(ordered, pct):
+    # Nearest rank, so every reported value is a latency that was observed
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    statuses = Counter(str(status) for _, _, status in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(count for status, count in statuses.items() if int(status) >= 400),
+        'status_codes': dict(sorted(statuses.items())),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3),
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3),
+        },
+        'queries_per_request': {'mean': round(statistics.fmean(queries), 2), 'max': max(queries)},
+    }
+
+
+def run_scenario(name, fixtures, requests=200, concurrency=4, seed=0):
+    """
+    Sends `requests` requests of scenario `name` through the full middleware
+    stack (an in-process WSGI client per thread) from `concurrency` threads,
+    and summarizes latency, throughput and queries per request.
+    """
+    rng = random.Random(seed)
+    calls = [SCENARIOS[name](fixtures, rng) for _ in range(requests)]
+    samples = []
+    lock = threading.Lock()
+
+    def worker(calls):
+        client = Client(raise_request_exception=False)
+        results = [measure(client, call) for call in calls]
+        with lock:
+            samples.extend(results)
+
+    def thread_worker(calls):
+        try:
+            worker(calls)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        # Inline, so it also runs inside a test transaction
+        worker(calls)
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(thread_worker, [calls[i::concurrency] for i in range(concurrency)]))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def run(scenarios=None, requests=200, concurrency=4, warmup=20, seed=0):
+    """
+    Runs each scenario in turn (after `warmup` unrecorded requests) and returns
+    the JSON-ready report. Throttling stays in the request path but its limits
+    are lifted, as one load generator would otherwise trip them at once.
+    """
+    scenarios = scenarios or list(SCENARIOS)
+    fixtures = Fixtures(random.Random(seed))
+    unlimited = dict.fromkeys(getattr(settings, 'API_THROTTLE_RATES', {}), f'{10 ** 9}/s')
+    results = {}
+    with override_settings(API_THROTTLE_RATES=unlimited):
+        for name in scenarios:
+            if warmup:
+                run_scenario(name, fixtures, warmup, 1, seed - 1)
+            results[name] = run_scenario(name, fixtures, requests, concurrency, seed)
+    return {
+        'meta': {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests': requests,
+            'concurrency': concurrency,
+            'warmup': warmup,
+            'seed': seed,
+        },
+        'dataset': dataset_counts(),
+        'scenarios': results,
+    }
+
+
+def compare(report, baseline, tolerance=0.2, floor_ms=1.0):
+    """
+    Regressions of `report` against `baseline`, as messages. Latency (p50,
+    p95) and throughput may move by `tolerance` (a fraction) and latency by
+    at least `floor_ms`, to ride out noise; queries per request may not grow
+    beyond the tolerance on average or at all at the maximum, and the error
+    rate may not grow. Scenarios missing from either side are skipped.
+    """
+    regressions = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for key in ('p50', 'p95'):
+            now, before = current['latency_ms'][key], previous['latency_ms'][key]
+            if now > before * (1 + tolerance) and now - before >= floor_ms:
+                regressions.append(f'{name}: {key} latency {before:.2f}ms -> {now:.2f}ms')
+        now, before = current['throughput_rps'], previous['throughput_rps']
+        if now < before * (1 - tolerance):
+            regressions.append(f'{name}: throughput {before:.1f}/s -> {now:.1f}/s')
+        now, before = current['queries_per_request'], previous['queries_per_request']
+        if now['mean'] > before['mean'] * (1 + tolerance) or now['max'] > before['max']:
+            regressions.append(
+                f'{name}: queries per request {before["mean"]:g} (max {before["max"]}) -> '
+                f'{now["mean"]:g} (max {now["max"]})'
+            )
+        now = current['errors'] / current['requests']
+        before = previous['errors'] / previous['requests']
+        if now > before:
+            regressions.append(f'{name}: error rate {before:.1%} -> {now:.1%}')
+    return regressions
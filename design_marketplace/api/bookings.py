@@ -0,0 +1,76 @@
+import calendar
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Booking, Design
+
+
+class DateUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This design is already booked on that date.'
+    default_code = 'date_unavailable'
+
+
+def active_bookings(design_id):
+    # Matches the partial unique index's condition, so lookups stay on the index
+    return Booking.objects.filter(design_id=design_id, booking_date__isnull=False).exclude(status=Booking.CANCELLED)
+
+
+def save_booking(serializer, **fields):
+    """
+    Saves a new or edited booking, raising DateUnavailable if its design/date is
+    taken. The design row is locked first so concurrent bookings of one design
+    queue up and the loser gets a clean 409 (on databases without SELECT ... FOR
+    UPDATE, SQLite, the unique constraint alone decides the race).
+    """
+    design = fields.get('design') or serializer.validated_data.get('design') or serializer.instance.design
+    booking_date = serializer.validated_data.get('booking_date', getattr(serializer.instance, 'booking_date', None))
+    cancelled = getattr(serializer.instance, 'status', None) == Booking.CANCELLED
+    try:
+        with transaction.atomic():
+            Design.objects.select_for_update().only('pk').get(pk=design.pk)
+            if booking_date is not None and not cancelled:
+                clashes = active_bookings(design.pk).filter(booking_date=booking_date)
+                if serializer.instance is not None:
+                    clashes = clashes.exclude(pk=serializer.instance.pk)
+                if clashes.exists():
+                    raise DateUnavailable()
+            return serializer.save(**fields)
+    except IntegrityError:
+        raise DateUnavailable()
+
+
+def parse_month(value):
+    if not value:
+        today = date.today()
+        return today.year, today.month
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        date(year, month, 1)
+    except ValueError:
+        raise ValidationError({'month': 'Use the YYYY-MM format.'})
+    return year, month
+
+
+def month_calendar(design_id, year, month):
+    """Free and taken dates of one design for a month, from a single range query."""
+    first = date(year, month, 1)
+    last = first + timedelta(days=calendar.monthrange(year, month)[1] - 1)
+    taken = set(
+        active_bookings(design_id).filter(booking_date__range=(first, last)).values_list('booking_date', flat=True)
+    )
+    today = date.today()
+    days = []
+    day = first
+    while day <= last:
+        days.append({'date': day.isoformat(), 'available': day not in taken and day >= today})
+        day += timedelta(days=1)
+    return {
+        'design': design_id,
+        'month': f'{year:04d}-{month:02d}',
+        'taken': sorted(day.isoformat() for day in taken),
+        'days': days,
+    }
@@ -0,0 +1,92 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class VersionedResponseCache:
+    """
+    Read-through cache for rendered API payloads.
+
+    Every key embeds the namespace's current generation, so invalidation is a
+    single `incr` of the generation counter: stale entries are never read again
+    and simply age out of the backend. Works with any Django cache backend
+    (locmem in tests, a shared backend such as Redis or Memcached in production).
+    """
+
+    def __init__(self, namespace, alias='default', timeout=None):
+        self.namespace = namespace
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 300)
+
+    def generation_key(self):
+        return f'{self.namespace}:generation'
+
+    def stats_key(self, outcome):
+        return f'{self.namespace}:stats:{outcome}'
+
+    def get_generation(self):
+        generation = self.cache.get(self.generation_key())
+        if generation is None:
+            # Seed from the clock so an evicted counter never reuses an old generation
+            generation = int(time.time() * 1000)
+            if not self.cache.add(self.generation_key(), generation, None):
+                generation = self.cache.get(self.generation_key(), generation)
+        return generation
+
+    def make_key(self, request, kind):
+        digest = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+        return f'{self.namespace}:{self.get_generation()}:{kind}:{digest}'
+
+    def get(self, request, kind):
+        data = self.cache.get(self.make_key(request, kind))
+        self.record('hit' if data is not None else 'miss')
+        return data
+
+    def set(self, request, kind, data):
+        self.cache.set(self.make_key(request, kind), data, self.get_timeout())
+
+    def record(self, outcome):
+        key = self.stats_key(outcome)
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            pass
+
+    def stats(self):
+        hits = self.cache.get(self.stats_key('hit'), 0)
+        misses = self.cache.get(self.stats_key('miss'), 0)
+        total = hits + misses
+        return {
+            'generation': self.get_generation(),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+        }
+
+    def bump(self):
+        try:
+            self.cache.incr(self.generation_key())
+        except ValueError:
+            self.cache.set(self.generation_key(), int(time.time() * 1000), None)
+
+    def invalidate(self):
+        # Bump now so this process stops serving the old payload, and again after
+        # commit so nothing cached from a read that raced the write survives.
+        self.bump()
+        transaction.on_commit(self.bump)
+
+
+design_cache = VersionedResponseCache('designs')
@@ -0,0 +1,100 @@
+import hashlib
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+    default_detail = 'Not modified.'
+    default_code = 'not_modified'
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for list and detail GETs.
+
+    Validators come from one `MAX(updated_at), COUNT(*)` aggregate over the same
+    queryset the action would serialize, so a matching If-None-Match or
+    If-Modified-Since short-circuits with 304 before any rows are fetched or
+    serialized. Edits move the max, deletes move the count.
+
+    Deletes and salt changes leave the max alone, so Last-Modified is the later
+    of the max and the time this ETag was first served (kept in the cache):
+    a client sending only If-Modified-Since sees those changes too.
+    """
+    conditional_actions = ('list', 'retrieve')
+    validator_field = 'updated_at'
+    validator_seen_timeout = 24 * 3600
+
+    def get_validator_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            try:
+                queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            except (TypeError, ValueError, ValidationError):
+                # As get_object_or_404 does: a malformed pk is a missing object
+                raise Http404
+        return queryset
+
+    def get_validator_salt(self):
+        # Extra state the representation depends on beyond the rows' own updated_at
+        return ''
+
+    def get_validators(self, request):
+        state = self.get_validator_queryset().order_by().aggregate(
+            last_modified=Max(self.validator_field), count=Count('pk'),
+        )
+        if not state['count']:
+            return None, None
+        last_modified = state['last_modified']
+        source = ':'.join([
+            str(request.user.pk or ''), request.get_full_path(), str(state['count']),
+            last_modified.isoformat(), str(self.get_validator_salt()),
+        ])
+        digest = hashlib.md5(source.encode('utf-8')).hexdigest()
+        # An evicted entry comes back with a later time, which only costs a refetch
+        seen_key = f'conditional:seen:{digest}'
+        now = timezone.now()
+        cache.add(seen_key, now, self.validator_seen_timeout)
+        last_modified = max(last_modified, cache.get(seen_key, now))
+        return quote_etag(digest), int(last_modified.timestamp())
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.last_modified = None
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return
+        self.etag, self.last_modified = self.get_validators(request)
+        if self.etag and get_conditional_response(
+            request._request, etag=self.etag, last_modified=self.last_modified,
+        ) is not None:
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=self.get_validator_headers())
+        return super().handle_exception(exc)
+
+    def get_validator_headers(self):
+        headers = {}
+        if getattr(self, 'etag', None):
+            headers['ETag'] = self.etag
+            headers['Last-Modified'] = http_date(self.last_modified)
+        return headers
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for header, value in self.get_validator_headers().items():
+                response[header] = value
+        return response
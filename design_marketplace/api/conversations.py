@@ -0,0 +1,69 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import counters
+from .models import Conversation, ConversationParticipant, Message
+
+PREVIEW_LENGTH = 140
+
+
+def conversation_for(design_id, sender_id, receiver_id):
+    user_a, user_b = sorted([sender_id, receiver_id])
+    try:
+        with transaction.atomic():
+            conversation, created = Conversation.objects.get_or_create(
+                design_id=design_id, user_a_id=user_a, user_b_id=user_b,
+            )
+    except IntegrityError:
+        # A concurrent first message created the thread
+        return Conversation.objects.get(design_id=design_id, user_a_id=user_a, user_b_id=user_b)
+    if created:
+        ConversationParticipant.objects.bulk_create(
+            [ConversationParticipant(conversation=conversation, user_id=user_id) for user_id in {user_a, user_b}],
+            ignore_conflicts=True,
+        )
+    return conversation
+
+
+def attach_conversation(message):
+    """Assigns the thread before the message row is written (pre_save)."""
+    if message.conversation_id is None:
+        message.conversation = conversation_for(message.design_id, message.sender_id, message.receiver_id)
+
+
+def record_message(message):
+    """
+    Moves the thread's last-message fields forward (post_save). Guards on the
+    timestamp so a slower concurrent writer never rolls the preview back to an
+    older message. The unread count moves with the read state, in signals.
+    """
+    sent_at = message.timestamp
+    with transaction.atomic():
+        Conversation.objects.filter(
+            Q(last_message_at__isnull=True) | Q(last_message_at__lte=sent_at), pk=message.conversation_id,
+        ).update(
+            last_message=message, last_message_preview=message.content[:PREVIEW_LENGTH], last_message_at=sent_at,
+        )
+        participants = ConversationParticipant.objects.filter(conversation_id=message.conversation_id)
+        participants.filter(Q(last_message_at__isnull=True) | Q(last_message_at__lte=sent_at)).update(
+            last_message_at=sent_at,
+        )
+
+
+def adjust_unread(message, delta):
+    """Moves the receiver's unread count in the message's thread by `delta`, never below zero."""
+    ConversationParticipant.objects.filter(conversation_id=message.conversation_id, user_id=message.receiver_id).update(
+        unread_count=Greatest(F('unread_count') + delta, 0),
+    )
+
+
+def mark_conversation_read(conversation_id, user):
+    with transaction.atomic():
+        updated = (
+            Message.objects.filter(conversation_id=conversation_id, receiver=user, is_read=False)
+            .exclude(sender=user).update(is_read=True, updated_at=timezone.now())
+        )
+        ConversationParticipant.objects.filter(conversation_id=conversation_id, user=user).update(unread_count=0)
+        counters.adjust(user.pk, messages=-updated)
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ConversationParticipant, Message, Notification, UnreadCounter
+
+FIELDS = ('notifications', 'messages')
+
+
+def recount(user_id):
+    """Recomputes a user's counters from the source tables; the slow path, used to heal a missing row."""
+    values = {
+        'notifications': Notification.objects.filter(user_id=user_id, is_read=False).count(),
+        'messages': Message.objects.filter(receiver_id=user_id, is_read=False)
+        .exclude(sender_id=user_id).count(),
+    }
+    counter, _ = UnreadCounter.objects.update_or_create(user_id=user_id, defaults=values)
+    return counter
+
+
+def adjust(user_id, **deltas):
+    """Applies `adjust(user_id, notifications=+1, messages=-3)` as one UPDATE, never going below zero."""
+    updates = {
+        field: Greatest(F(field) + delta, 0) for field, delta in deltas.items() if field in FIELDS and delta
+    }
+    if not updates:
+        return
+    if not UnreadCounter.objects.filter(user_id=user_id).update(**updates):
+        recount(user_id)
+
+
+def adjust_many(field, deltas):
+    """`adjust` for many users at once, e.g. `adjust_many('notifications', {user_id: 3, ...})`, in one UPDATE."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = UnreadCounter.objects.filter(user_id__in=list(deltas)).update(**{field: Greatest(
+        F(field) + Case(*[When(user_id=user_id, then=Value(delta)) for user_id, delta in deltas.items()],
+                        output_field=IntegerField()),
+        0,
+    )})
+    if updated < len(deltas):
+        known = set(UnreadCounter.objects.filter(user_id__in=list(deltas)).values_list('user_id', flat=True))
+        for user_id in set(deltas) - known:
+            recount(user_id)
+
+
+def get_counters(user):
+    counter = UnreadCounter.objects.filter(user=user).first() or recount(user.pk)
+    return {field: getattr(counter, field) for field in FIELDS}
+
+
+def mark_notifications_read(user, up_to_id=None):
+    with transaction.atomic():
+        unread = Notification.objects.filter(user=user, is_read=False)
+        if up_to_id is not None:
+            unread = unread.filter(id__lte=up_to_id)
+        # update() bypasses save(), so bump updated_at for the ETag validators and delta sync
+        updated = unread.update(is_read=True, updated_at=timezone.now())
+        adjust(user.pk, notifications=-updated)
+    return updated
+
+
+def mark_messages_read(user, up_to_id=None, conversation_id=None):
+    with transaction.atomic():
+        unread = Message.objects.filter(receiver=user, is_read=False).exclude(sender=user)
+        if up_to_id is not None:
+            unread = unread.filter(id__lte=up_to_id)
+        if conversation_id is not None:
+            unread = unread.filter(conversation_id=conversation_id)
+        per_thread = dict(
+            unread.order_by().values('conversation_id').annotate(n=Count('id')).values_list('conversation_id', 'n')
+        )
+        updated = unread.update(is_read=True, updated_at=timezone.now())
+        per_thread.pop(None, None)
+        if per_thread:
+            # One UPDATE however many threads were touched
+            ConversationParticipant.objects.filter(conversation_id__in=list(per_thread), user=user).update(
+                unread_count=Greatest(F('unread_count') - Case(
+                    *[When(conversation_id=thread_id, then=Value(count)) for thread_id, count in per_thread.items()],
+                    output_field=IntegerField(),
+                ), 0)
+            )
+        adjust(user.pk, messages=-updated)
+    return updated
@@ -0,0 +1,142 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+from .filters import parse_int, parse_moment
+from .models import Booking, Payment
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# kind -> (model, date field filtered by ?from=&to=, [(column, ORM path)])
+EXPORTS = {
+    'bookings': (Booking, 'created_at', [
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+        ('booking_date', 'booking_date'),
+        ('status', 'status'),
+        ('design_id', 'design_id'),
+        ('design_title', 'design__title'),
+        ('client_id', 'client_id'),
+        ('client_username', 'client__username'),
+        ('negotiated_price', 'negotiated_price'),
+        ('notes', 'notes'),
+    ]),
+    'payments': (Payment, 'paid_at', [
+        ('id', 'id'),
+        ('booking_id', 'booking_id'),
+        ('design_id', 'booking__design_id'),
+        ('design_title', 'booking__design__title'),
+        ('client_username', 'booking__client__username'),
+        ('amount', 'amount'),
+        ('payment_method', 'payment_method'),
+        ('transaction_id', 'transaction_id'),
+        ('paid_at', 'paid_at'),
+        ('successful', 'successful'),
+    ]),
+}
+DESIGNER_PATHS = {'bookings': 'design__designer_id', 'payments': 'booking__design__designer_id'}
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+class ExportRenderer(BaseRenderer):
+    # Lets content negotiation accept the export media types; successful
+    # responses stream their own body, so this only ever renders errors
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class Echo:
+    """File-like object whose write() returns the line, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(kind, designer_id, params):
+    """
+    The export queryset as tuples, ordered by id. `?after_id=` resumes an
+    interrupted download after the last id received; `?from=&to=` bound the
+    created date (bookings) or paid date (payments).
+    """
+    model, date_field, columns = EXPORTS[kind]
+    queryset = model.objects.all()
+    if designer_id is not None:
+        queryset = queryset.filter(**{DESIGNER_PATHS[kind]: designer_id})
+    after_id = parse_int(params, 'after_id')
+    start = parse_moment(params, 'from')
+    end = parse_moment(params, 'to', end_of_day=True)
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+    if start is not None:
+        queryset = queryset.filter(**{f'{date_field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{date_field}__lte': end})
+    # Tuples straight from the cursor: the joins replace select_related, without building model instances
+    return queryset.order_by('id').values_list(*[path for _, path in columns])
+
+
+def csv_safe(value):
+    # Spreadsheets run text cells starting with these as formulas; a leading
+    # quote keeps client-written fields (notes, usernames) as plain text
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(kind, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([column for column, _ in EXPORTS[kind][2]])
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield writer.writerow([csv_safe(value) for value in row])
+
+
+def stream_ndjson(kind, rows):
+    names = [column for column, _ in EXPORTS[kind][2]]
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+STREAMS = {'csv': stream_csv, 'ndjson': stream_ndjson}
+
+
+async def stream_async(lines):
+    """
+    Feeds a STREAMS generator to an ASGI server. Django drains a sync iterator
+    into a list under ASGI, building the whole export in memory; this pulls
+    EXPORT_CHUNK_SIZE lines at a time on the sync thread (where the cursor
+    lives) and sends each batch as one chunk.
+    """
+    batch_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    next_batch = sync_to_async(lambda: list(islice(lines, batch_size)))
+    try:
+        while batch := await next_batch():
+            yield ''.join(batch)
+    finally:
+        # Closes the server-side cursor when the client goes away mid-download
+        await sync_to_async(lines.close)()
+
+
+def export_filename(kind, fmt):
+    return f'{kind}-{timezone.localdate():%Y%m%d}.{fmt}'
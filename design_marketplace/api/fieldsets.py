@@ -0,0 +1,94 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def param_names(request, name):
+    """The comma-separated names in `?name=` on a read request; None when absent."""
+    if request is None or request.method not in SAFE_METHODS or name not in request.query_params:
+        return None
+    return {part.strip() for part in request.query_params[name].split(',') if part.strip()}
+
+
+def requested_shape(serializer_class, request):
+    """
+    `(fields, expanded)` from `?fields=` and `?expand=`, or None when neither
+    is given. `fields` is None when every field is wanted. Without `?expand=`
+    the serializer's own nested relations stay expanded.
+    """
+    fields = param_names(request, 'fields')
+    expand = param_names(request, 'expand')
+    if fields is None and expand is None:
+        return None
+    expandable = serializer_class.Meta.expandable
+    if expand is None:
+        expand = {name for name in expandable if name in serializer_class._declared_fields}
+    return fields, expand & set(expandable)
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=id,title` limits a GET response to those fields, and `?expand=`
+    names the relations rendered as nested objects; the others render as ids.
+
+    `Meta.expandable` maps each relation to its nested serializer and the
+    select_related paths it needs; `Meta.field_columns` lists the model columns
+    behind fields that aren't model fields. Only the top-level serializer of a
+    response is reshaped; see `sparse_queryset` for the matching query.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.parent is None or (isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None)
+        shape = requested_shape(type(self), self.context.get('request')) if root else None
+        if shape is None:
+            return fields
+        only, expand = shape
+        if only is not None:
+            fields = {name: field for name, field in fields.items() if name in only}
+        for name, (serializer_class, _) in self.Meta.expandable.items():
+            if name not in fields:
+                continue
+            nested = isinstance(fields[name], serializers.BaseSerializer)
+            if name in expand and not nested:
+                fields[name] = serializer_class(read_only=True)
+            elif name not in expand and nested:
+                # Reads the `<name>_id` column; the related row is never loaded
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+        return fields
+
+
+def sparse_queryset(queryset, serializer_class, request, keep=()):
+    """
+    Narrows `queryset` to what `?fields=&expand=` will serialize: joins only
+    for expanded relations, and with `?fields=` only the requested columns plus
+    the primary key and `keep` (columns read by ordering and pagination).
+    """
+    shape = requested_shape(serializer_class, request)
+    if shape is None:
+        return queryset
+    only, expand = shape
+    joins = [
+        path for name, (_, paths) in serializer_class.Meta.expandable.items()
+        if name in expand and (only is None or name in only) for path in paths
+    ]
+    queryset = queryset.select_related(None)
+    if joins:
+        queryset = queryset.select_related(*joins)
+    if only is None:
+        return queryset
+
+    model = queryset.model
+    field_columns = getattr(serializer_class.Meta, 'field_columns', {})
+    columns = {model._meta.pk.name, *keep}
+    for name in only:
+        if name in field_columns:
+            columns.update(field_columns[name])
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete:
+            columns.add(name)
+    return queryset.only(*columns)
@@ -0,0 +1,141 @@
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# `?ordering=` values; each ends in `id` so it doubles as a keyset ordering
+DESIGN_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'price': ('price', 'created_at', 'id'),
+    '-price': ('-price', '-created_at', '-id'),
+}
+
+# (lower bound inclusive, upper bound exclusive) for the price facet
+PRICE_BUCKETS = [
+    (Decimal('0'), Decimal('50')),
+    (Decimal('50'), Decimal('100')),
+    (Decimal('100'), Decimal('250')),
+    (Decimal('250'), Decimal('500')),
+    (Decimal('500'), None),
+]
+TOP_DESIGNERS = 10
+
+
+def parse_decimal(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: 'A valid number is required.'})
+
+
+def parse_int(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'A valid integer is required.'})
+
+
+def parse_moment(params, name, end_of_day=False):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError
+            moment = datetime.combine(day, time.max if end_of_day else time.min)
+    except ValueError:
+        raise ValidationError({name: 'A valid ISO date or datetime is required.'})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def get_design_ordering(request):
+    value = request.query_params.get('ordering')
+    if not value:
+        return None
+    if value not in DESIGN_ORDERINGS:
+        raise ValidationError({'ordering': f'Choose one of: {", ".join(DESIGN_ORDERINGS)}.'})
+    return DESIGN_ORDERINGS[value]
+
+
+class DesignFilterBackend(BaseFilterBackend):
+    """
+    Server-side filters for design listings:
+    `?min_price=&max_price=&designer=&created_after=&created_before=&ordering=`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        min_price = parse_decimal(params, 'min_price')
+        max_price = parse_decimal(params, 'max_price')
+        designer = parse_int(params, 'designer')
+        created_after = parse_moment(params, 'created_after')
+        created_before = parse_moment(params, 'created_before', end_of_day=True)
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+        if designer is not None:
+            queryset = queryset.filter(designer_id=designer)
+        if created_after is not None:
+            queryset = queryset.filter(created_at__gte=created_after)
+        if created_before is not None:
+            queryset = queryset.filter(created_at__lte=created_before)
+        ordering = get_design_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+def price_bucket_label(low, high):
+    return f'{low}-{high}' if high is not None else f'{low}+'
+
+
+def design_facets(queryset):
+    """
+    Price-bucket and top-designer counts for an already-filtered design queryset,
+    in two queries whatever the catalogue size: a single-row aggregate with one
+    conditional count per bucket, and a GROUP BY designer cut to the top
+    TOP_DESIGNERS in SQL.
+    """
+    buckets = {}
+    for i, (low, high) in enumerate(PRICE_BUCKETS):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        buckets[f'bucket_{i}'] = Count('id', filter=condition)
+    totals = queryset.order_by().aggregate(total=Count('id'), **buckets)
+
+    rows = (
+        queryset.order_by()
+        .values('designer_id', 'designer__username')
+        .annotate(designs=Count('id'))
+        .order_by('-designs', 'designer_id')[:TOP_DESIGNERS]
+    )
+    return {
+        'total': totals['total'],
+        'price': [
+            {'label': price_bucket_label(low, high), 'min': str(low),
+             'max': str(high) if high is not None else None, 'count': totals[f'bucket_{i}']}
+            for i, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'designers': [
+            {'id': row['designer_id'], 'username': row['designer__username'], 'count': row['designs']}
+            for row in rows
+        ],
+    }
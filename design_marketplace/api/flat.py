@@ -0,0 +1,143 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.utils.functional import cached_property
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .fieldsets import requested_shape
+from .metrics import serializer_timer
+from .serializers import DesignSerializer, NotificationSerializer, image_srcset
+
+# Fields whose representation isn't the raw column value; they keep DRF's own to_representation
+CONVERTED_FIELDS = (
+    serializers.DecimalField, serializers.DateTimeField, serializers.DateField, serializers.TimeField,
+    serializers.DurationField, serializers.UUIDField,
+)
+
+
+def file_url(name, request):
+    # FileField.to_representation, from the stored name instead of a FieldFile
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class FlatSerializer:
+    """
+    Read-only list serializer over `.values()` rows, for list endpoints.
+
+    The field plan is compiled once from `serializer_class`: every field
+    becomes a column (nested serializers are joined through `__` lookups) and,
+    where DRF would change the value, a converter. A page is then one query
+    and plain dict lookups, with no serializer or model instances per row, and
+    the output is identical to `serializer_class(many=True).data`.
+
+    SerializerMethodFields need a `method_fields` entry: the columns they read
+    and a function of `(row, request)`.
+    """
+
+    def __init__(self, serializer_class, method_fields=None):
+        self.serializer_class = serializer_class
+        self.method_fields = method_fields or {}
+
+    @cached_property
+    def plan(self):
+        return self.compile(self.serializer_class(), '')
+
+    @cached_property
+    def columns(self):
+        columns = []
+
+        def collect(plan):
+            for _, column, kind, payload in plan:
+                columns.extend(payload[0] if kind == 'method' else [column])
+                if kind == 'nested':
+                    collect(payload)
+        collect(self.plan)
+        return list(dict.fromkeys(columns))
+
+    def compile(self, serializer, prefix):
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            column = prefix + field.source.replace('.', '__')
+            if isinstance(field, serializers.ListSerializer):
+                raise ImproperlyConfigured(f'{name}: many=True relations have no flat form')
+            if isinstance(field, serializers.BaseSerializer):
+                # Keyed on the related pk so a missing relation renders as None
+                pk = f'{column}__{field.Meta.model._meta.pk.name}'
+                plan.append((name, pk, 'nested', self.compile(field, column + '__')))
+            elif isinstance(field, serializers.SerializerMethodField):
+                if prefix or name not in self.method_fields:
+                    raise ImproperlyConfigured(f'{name}: SerializerMethodFields need a method_fields entry')
+                columns, function = self.method_fields[name]
+                plan.append((name, None, 'method', (columns, function)))
+            elif isinstance(field, serializers.FileField):
+                plan.append((name, column, 'file', None))
+            elif isinstance(field, CONVERTED_FIELDS):
+                plan.append((name, column, 'convert', field.to_representation))
+            else:
+                plan.append((name, column, 'value', None))
+        return plan
+
+    def rows(self, queryset):
+        return queryset.values(*self.columns)
+
+    def represent(self, rows, context):
+        request = context.get('request')
+
+        def build(row, plan):
+            data = {}
+            for name, column, kind, payload in plan:
+                if kind == 'method':
+                    data[name] = payload[1](row, request)
+                    continue
+                value = row[column]
+                if value is None:
+                    data[name] = None
+                elif kind == 'value':
+                    data[name] = value
+                elif kind == 'convert':
+                    data[name] = payload(value)
+                elif kind == 'file':
+                    data[name] = file_url(value, request)
+                else:
+                    data[name] = build(row, payload)
+            return data
+        with serializer_timer():
+            return [build(row, self.plan) for row in rows]
+
+
+class FlatListMixin:
+    """
+    Serves the viewset's `flat_actions` through `flat_serializer`. Requests
+    asking for a sparse shape (`?fields=`/`?expand=`) take the regular path.
+    """
+    flat_serializer = None
+    flat_actions = ('list',)
+
+    def use_flat(self):
+        return self.action in self.flat_actions and requested_shape(self.get_serializer_class(), self.request) is None
+
+    def flat_list(self, queryset):
+        rows = self.flat_serializer.rows(queryset)
+        page = self.paginate_queryset(rows)
+        context = self.get_serializer_context()
+        if page is not None:
+            return self.get_paginated_response(self.flat_serializer.represent(page, context))
+        return Response(self.flat_serializer.represent(rows, context))
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_flat():
+            return super().list(request, *args, **kwargs)
+        return self.flat_list(self.filter_queryset(self.get_queryset()))
+
+
+design_flat = FlatSerializer(DesignSerializer, method_fields={
+    'image_srcset': (['image', 'image_variants'], lambda row, request: image_srcset(
+        row['image'], row['image_variants'], request,
+    )),
+})
+notification_flat = FlatSerializer(NotificationSerializer)
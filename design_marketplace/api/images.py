@@ -0,0 +1,116 @@
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .jobs import enqueue, enqueue_many
+
+logger = logging.getLogger('api.images')
+
+DERIVATIVE_WIDTHS = (320, 640, 1080)
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def derivative_name(name, width, fmt):
+    root, _ = posixpath.splitext(name)
+    return posixpath.join('derivatives', root, f'{width}w.{fmt}')
+
+
+def delete_derivatives(name, storage=None):
+    storage = storage or default_storage
+    for width in DERIVATIVE_WIDTHS:
+        for fmt in DERIVATIVE_FORMATS:
+            target = derivative_name(name, width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+
+
+def _encode(image, fmt):
+    pil_format, options = DERIVATIVE_FORMATS[fmt]
+    if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(name, storage=None, force=False):
+    """
+    Writes every width/format variant of `name` next to the other derivatives
+    and returns `{fmt: {'<width>w': derivative name}}`. Existing files are kept
+    unless `force` is set, so reruns are cheap and safe.
+    """
+    storage = storage or default_storage
+    variants = {fmt: {} for fmt in DERIVATIVE_FORMATS}
+    pending = []
+    for width in DERIVATIVE_WIDTHS:
+        for fmt in DERIVATIVE_FORMATS:
+            target = derivative_name(name, width, fmt)
+            variants[fmt][f'{width}w'] = target
+            if force or not storage.exists(target):
+                pending.append((width, fmt, target))
+    if not pending:
+        return variants
+
+    with storage.open(name, 'rb') as source, Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        original.load()
+        for width, fmt, target in pending:
+            image = original.copy()
+            # Never upscale: small uploads just get re-encoded at their own size
+            image.thumbnail((width, width * 10), Image.LANCZOS)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, _encode(image, fmt))
+    return variants
+
+
+def refresh_design_variants(design_id, force=False):
+    from .cache import design_cache
+    from .models import Design
+
+    design = Design.objects.filter(pk=design_id).only('id', 'image', 'image_variants').first()
+    if design is None or not design.image:
+        return None
+    if not force and design.image_variants.get('source') == design.image.name:
+        return design.image_variants
+    if not default_storage.exists(design.image.name):
+        logger.info('Skipping derivatives for design %s: %s is missing', design_id, design.image.name)
+        return None
+    variants = generate_derivatives(design.image.name, force=force)
+    variants['source'] = design.image.name
+    # update() skips post_save, so invalidate the cached payloads explicitly
+    Design.objects.filter(pk=design_id).update(image_variants=variants, updated_at=timezone.now())
+    design_cache.invalidate()
+    return variants
+
+
+def schedule_design_variants(*design_ids):
+    """Builds derivatives off the request path: on a job worker, or right after commit when async is off."""
+    if not getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        for design_id in design_ids:
+            transaction.on_commit(lambda design_id=design_id: _build_now(design_id))
+        return
+    # No idempotency key: a re-upload needs a fresh run, and the task itself is a no-op when up to date
+    if len(design_ids) == 1:
+        enqueue('build_design_variants', {'design_id': design_ids[0]})
+    else:
+        enqueue_many('build_design_variants', [{'design_id': design_id} for design_id in design_ids])
+
+
+def _build_now(design_id):
+    try:
+        refresh_design_variants(design_id)
+    except Exception:
+        logger.exception('Failed to build image derivatives for design %s', design_id)
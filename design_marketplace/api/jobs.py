@@ -0,0 +1,160 @@
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DeadLetterJob, Job
+
+logger = logging.getLogger('api.jobs')
+
+TASKS = {}
+
+
+def task(name):
+    """
+    Registers a function as a job handler; it is called with the job payload as
+    kwargs. A job can run more than once, so handlers must be idempotent.
+    """
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(task_name, payload=None, idempotency_key=None, queue='default', delay=None, max_attempts=None):
+    """
+    Adds a job. Call it inside the transaction that produces the work, so the
+    job exists exactly when the data does. Re-enqueueing an existing
+    `idempotency_key` returns the original job instead of adding a duplicate.
+    """
+    if task_name not in TASKS:
+        raise KeyError(f'Unknown task {task_name!r}')
+    fields = {
+        'queue': queue,
+        'task': task_name,
+        'payload': payload or {},
+        'run_at': timezone.now() + (delay or timedelta(0)),
+        'max_attempts': max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+    }
+    if idempotency_key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(idempotency_key=idempotency_key, **fields)
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=idempotency_key)
+
+
+def enqueue_many(task_name, payloads, queue='default'):
+    """Adds one job per payload with a single bulk insert (no idempotency keys)."""
+    if task_name not in TASKS:
+        raise KeyError(f'Unknown task {task_name!r}')
+    now = timezone.now()
+    max_attempts = getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+    return Job.objects.bulk_create([
+        Job(queue=queue, task=task_name, payload=payload, run_at=now, max_attempts=max_attempts)
+        for payload in payloads
+    ])
+
+
+def backoff(attempts):
+    base = getattr(settings, 'JOB_RETRY_BACKOFF', 2)
+    cap = getattr(settings, 'JOB_RETRY_BACKOFF_MAX', 3600)
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    # Jitter keeps retries of a failed dependency from arriving in lockstep
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def requeue_stale(queue='default'):
+    """Returns jobs whose worker died mid-run (lock older than the visibility timeout) to the queue."""
+    timeout = getattr(settings, 'JOB_VISIBILITY_TIMEOUT', 300)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(queue=queue, status=Job.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.QUEUED, locked_by='', locked_at=None,
+    )
+
+
+def claim(worker_id, queue='default', batch_size=10):
+    """
+    Locks up to `batch_size` due jobs for this worker. The compare-and-set UPDATE
+    on status makes claiming safe between processes even where SELECT ... FOR
+    UPDATE SKIP LOCKED is unavailable (SQLite).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(queue=queue, status=Job.QUEUED, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+    claimed = []
+    for job_id in candidates:
+        won = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if won:
+            claimed.append(job_id)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'id'))
+
+
+def execute(job):
+    handler = TASKS.get(job.task)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for task {job.task!r}')
+        # Not inside a transaction: handlers encode images and call webhooks, and
+        # an open transaction would hold SQLite's write lock (BEGIN IMMEDIATE)
+        # throughout. Delivery is at-least-once: a crash before the DONE mark, or
+        # a run outlasting JOB_VISIBILITY_TIMEOUT, runs the handler again, so
+        # handlers must be idempotent (see api.tasks).
+        handler(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+        if job.attempts >= job.max_attempts:
+            with transaction.atomic():
+                DeadLetterJob.objects.create(
+                    job_id=job.pk, queue=job.queue, task=job.task, payload=job.payload,
+                    idempotency_key=job.idempotency_key, attempts=job.attempts, last_error=error,
+                )
+                Job.objects.filter(pk=job.pk).update(status=Job.FAILED, last_error=error, locked_at=None)
+            return False
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.QUEUED, last_error=error, locked_by='', locked_at=None,
+            run_at=timezone.now() + backoff(job.attempts),
+        )
+        return False
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, last_error='', locked_at=None)
+    return True
+
+
+def work(queue='default', worker_id=None, batch_size=10, once=False, should_stop=lambda: False):
+    """Worker loop: claim, run, repeat. With `once` it returns when nothing is due."""
+    worker_id = worker_id or default_worker_id()
+    poll_interval = getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+    processed = 0
+    requeue_stale(queue)
+    while not should_stop():
+        jobs = claim(worker_id, queue=queue, batch_size=batch_size)
+        for job in jobs:
+            execute(job)
+            processed += 1
+        if not jobs:
+            if once:
+                break
+            requeue_stale(queue)
+            time.sleep(poll_interval)
+    return processed
@@ -0,0 +1,110 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+from django.db import connection
+
+# Referenced from settings.LOGGING, which is configured before the apps load: no model imports here
+from .querybudget import QueryCounter
+
+REDACTED = '[REDACTED]'
+DEFAULT_REDACT_FIELDS = ('password', 'token', 'authorization', 'secret', 'cookie', 'csrf')
+# Attributes every LogRecord has; anything else came in through `extra=`
+RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+request_logger = logging.getLogger('api.requests')
+payload_logger = logging.getLogger('api.payloads')
+
+
+def redact(value, fields=None):
+    """Copy of `value` with the values of credential-like keys (at any depth) masked."""
+    if fields is None:
+        fields = getattr(settings, 'LOG_REDACT_FIELDS', DEFAULT_REDACT_FIELDS)
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if any(field in str(key).lower() for field in fields) else redact(item, fields)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item, fields) for item in value]
+    return value
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any `extra=` fields, redacted."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(redact({key: value for key, value in vars(record).items() if key not in RECORD_ATTRS}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingStreamHandler(QueueHandler):
+    """
+    Formats in the calling thread and hands the line to a background thread
+    that writes it, so slow stdout/stderr never holds up a request.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Drop rather than block the request when the writer falls behind
+            pass
+
+
+def should_log(status, duration_ms):
+    if status >= 500 or duration_ms >= getattr(settings, 'LOG_SLOW_REQUEST_MS', 500):
+        return True
+    return random.random() < getattr(settings, 'LOG_REQUEST_SAMPLE_RATE', 1.0)
+
+
+class RequestLogMiddleware:
+    """
+    Logs one line per request to `api.requests` with method, path, status,
+    duration and query count. Server errors and requests slower than
+    LOG_SLOW_REQUEST_MS are always logged; the rest at LOG_REQUEST_SAMPLE_RATE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request_logger.isEnabledFor(logging.INFO):
+            return self.get_response(request)
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        if should_log(response.status_code, duration_ms):
+            user = getattr(request, 'user', None)
+            request_logger.info('request', extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+                'queries': counter.count,
+                'user_id': user.pk if user is not None and user.is_authenticated else None,
+            })
+        return response
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.images import refresh_design_variants
+from api.models import Design
+
+
+class Command(BaseCommand):
+    help = 'Builds the resized WebP/JPEG variants for existing design images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-encode variants that already exist.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = Design.objects.exclude(image='').order_by('id').values_list('id', flat=True)
+        built = skipped = failed = 0
+        for design_id in queryset.iterator(chunk_size=options['chunk_size']):
+            try:
+                variants = refresh_design_variants(design_id, force=options['force'])
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'Design {design_id}: {exc}')
+                continue
+            if variants is None:
+                skipped += 1
+            else:
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {built} designs, {skipped} skipped (missing file), {failed} failed.'
+        ))
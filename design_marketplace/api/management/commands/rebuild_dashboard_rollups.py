@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the designer dashboard rollup (DesignDailyStats) from bookings and payments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--designer', type=int, action='append', dest='designers',
+                            help='Only rebuild this designer id (repeatable).')
+
+    def handle(self, *args, **options):
+        rows = rebuild(designer_ids=options['designers'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} dashboard rows.'))
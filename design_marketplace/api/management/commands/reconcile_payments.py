@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.reconciliation import ReconciliationConflict, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Matches a provider settlement CSV (transaction_id, amount, status, settled_at) against payments. '
+        'Re-running a finished file is a no-op and an interrupted one resumes where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Settlement CSV file.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows looked up and written per transaction.')
+        parser.add_argument('--restart', action='store_true', help='Start a new run even if this file was seen before.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        started = time.monotonic()
+
+        def report(run):
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{run.rows_processed} rows ({run.rows_processed / elapsed:.0f}/s): {run.settled} settled, '
+                f'{run.reversed} reversed, {run.unmatched} unmatched, {run.mismatched} mismatched, {run.invalid} invalid'
+            )
+
+        try:
+            run = reconcile(options['path'], chunk_size=options['chunk_size'], restart=options['restart'], progress=report)
+        except (OSError, ValueError, ReconciliationConflict) as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Run {run.pk} {run.status}: {run.rows_processed} rows, {run.matched} matched, {run.settled} settled, '
+            f'{run.reversed} reversed, {run.unchanged} unchanged, {run.unmatched} unmatched, '
+            f'{run.mismatched} amount mismatches, {run.invalid} invalid.'
+        ))
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import SCENARIOS, compare, run
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives the key endpoints against the seed_benchmark_data dataset from concurrent threads and reports '
+        'p50/p95/p99 latency, throughput and queries per request. With --baseline, exits non-zero on regressions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=list(SCENARIOS),
+                            help='Only run this scenario (repeatable); all by default.')
+        parser.add_argument('--requests', type=int, default=200, help='Recorded requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Client threads.')
+        parser.add_argument('--warmup', type=int, default=20, help='Unrecorded requests per scenario first.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix.')
+        parser.add_argument('--output', help='Write the JSON report here ("-" for stdout).')
+        parser.add_argument('--baseline', help='JSON report of an earlier run to compare against.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed latency/throughput change as a fraction (default 0.2).')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['warmup'] < 0:
+            raise CommandError('--requests and --concurrency must be at least 1, --warmup at least 0.')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Unreadable baseline: {exc}')
+        try:
+            report = run(options['scenarios'], requests=options['requests'], concurrency=options['concurrency'],
+                         warmup=options['warmup'], seed=options['seed'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(report)
+            if options['output']:
+                with open(options['output'], 'w') as f:
+                    json.dump(report, f, indent=2)
+                    f.write('\n')
+        if baseline is not None:
+            regressions = compare(report, baseline, tolerance=options['tolerance'])
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}:\n  '
+                                   + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}.'))
+
+    def print_table(self, report):
+        self.stdout.write(
+            f'{"scenario":<16}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}{"errors":>8}'
+        )
+        for name, result in report['scenarios'].items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f'{name:<16}{result["throughput_rps"]:>9.1f}{latency["p50"]:>9.2f}{latency["p95"]:>9.2f}'
+                f'{latency["p99"]:>9.2f}{result["queries_per_request"]["mean"]:>9.2f}{result["errors"]:>8}'
+            )
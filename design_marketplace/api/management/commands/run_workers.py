@@ -0,0 +1,58 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.jobs import default_worker_id, work
+
+
+def _worker(queue, batch_size, once):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    return work(queue=queue, worker_id=default_worker_id(), batch_size=batch_size,
+                once=once, should_stop=lambda: bool(stopping))
+
+
+def _forked_worker(queue, batch_size, once):
+    try:
+        _worker(queue, batch_size, once)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Runs background job workers for the database-backed queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--queue', default='default')
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due.')
+
+    def handle(self, *args, **options):
+        queue, batch_size, once = options['queue'], options['batch_size'], options['once']
+        if options['workers'] <= 1:
+            processed = _worker(queue, batch_size, once)
+            self.stdout.write(f'Processed {processed} jobs.')
+            return
+
+        # Children must not inherit the parent's open database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=_forked_worker, args=(queue, batch_size, once), daemon=False)
+            for _ in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f'Started {len(processes)} workers on queue "{queue}".')
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
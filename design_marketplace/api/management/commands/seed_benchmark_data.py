@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import dataset_sizes, has_dataset, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-inserts a synthetic dataset (users, designs, bookings, conversations, notifications) for '
+        'run_benchmarks. Point DATABASE_PATH at a scratch database; seeding refuses to run twice.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10000, help='Approximate total rows (default 10000).')
+        for table in ('users', 'designs', 'bookings', 'messages', 'notifications'):
+            parser.add_argument(f'--{table}', type=int, help=f'Number of {table}, overriding --scale.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; equal seeds give equal datasets.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        if has_dataset():
+            raise CommandError('This database already has a benchmark dataset.')
+        try:
+            sizes = dataset_sizes(options['scale'], **{
+                table: options[table] for table in ('users', 'designs', 'bookings', 'messages', 'notifications')
+            })
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        started = time.monotonic()
+
+        def report(table, count):
+            self.stdout.write(f'{count} {table} ({time.monotonic() - started:.1f}s)')
+
+        inserted = seed(sizes, batch_size=options['batch_size'], seed=options['seed'], progress=report)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        total = sum(inserted.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {total} rows in {elapsed:.1f}s ({total / elapsed:.0f}/s): '
+            + ', '.join(f'{count} {table}' for table, count in inserted.items())
+        ))
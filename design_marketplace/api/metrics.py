@@ -0,0 +1,191 @@
+import ipaddress
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hmac import compare_digest
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = ContextVar('request_stats', default=None)
+
+
+def format_labels(names, values, extra=''):
+    pairs = [
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            series = dict(self.series)
+        for labels, value in sorted(series.items()):
+            yield f'{self.name}{format_labels(self.labels, labels)} {format_value(value)}'
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels, buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        with self.lock:
+            # [count per bucket..., sum, count]; made cumulative when exposed
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f'{self.name}_bucket{format_labels(self.labels, labels, le)} {cumulative}'
+            le = 'le="+Inf"'
+            yield f'{self.name}_bucket{format_labels(self.labels, labels, le)} {values[-1]}'
+            yield f'{self.name}_sum{format_labels(self.labels, labels)} {format_value(values[-2])}'
+            yield f'{self.name}_count{format_labels(self.labels, labels)} {values[-1]}'
+
+
+REQUESTS = Counter('api_requests_total', 'Requests served, by route and status.', ('method', 'view', 'status'))
+REQUEST_SECONDS = Histogram('api_request_duration_seconds', 'Time to response, by route.', ('method', 'view'))
+DB_QUERIES = Histogram('api_db_queries', 'Database queries per request.', ('method', 'view'), QUERY_BUCKETS)
+DB_SECONDS = Histogram('api_db_duration_seconds', 'Time in database queries per request.', ('method', 'view'))
+SERIALIZER_SECONDS = Histogram(
+    'api_serializer_duration_seconds', 'Time in top-level serializers per request.', ('method', 'view'),
+)
+METRICS = [REQUESTS, REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, SERIALIZER_SECONDS]
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def serializer_timer():
+    """Adds the enclosed time to the request's serializer time; nested serializers aren't counted twice."""
+    stats = _current.get()
+    if stats is None or stats.serializing:
+        yield
+        return
+    stats.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializing = False
+        stats.serializer_seconds += time.perf_counter() - started
+
+
+def view_label(request):
+    # The URL name keeps label cardinality bounded; paths would not
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None and match.view_name else 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    Records per-route latency, query count, query time and serializer time for
+    /api/internal/metrics/. Metrics live in the worker process, so with several
+    workers each one is scraped (or exported) separately.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+        labels = (request.method, view_label(request))
+        REQUESTS.inc((*labels, response.status_code))
+        REQUEST_SECONDS.observe(labels, elapsed)
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_SECONDS.observe(labels, stats.db_seconds)
+        SERIALIZER_SECONDS.observe(labels, stats.serializer_seconds)
+        return response
+
+
+def internal_request_allowed(request):
+    """Internal endpoints answer `Authorization: Bearer <METRICS_TOKEN>`, or METRICS_ALLOWED_IPS (none by default)."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and compare_digest(header[7:].strip().encode(), token.encode()):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in getattr(settings, 'METRICS_ALLOWED_IPS', ()))
+
+
+def metrics_view(request):
+    # A plain Django view: no DRF authentication, throttling or content negotiation
+    if not internal_request_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_booking_booking_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='design',
+            index=models.Index(fields=['created_at', 'id'], name='design_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_notification_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='design',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
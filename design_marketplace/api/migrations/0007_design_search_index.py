@@ -0,0 +1,75 @@
+from django.db import migrations
+
+# SQLite: an external-content FTS5 table over api_design, kept in sync by triggers.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE api_design_fts USING fts5(
+        title, description, features,
+        content='api_design', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER api_design_fts_insert AFTER INSERT ON api_design BEGIN
+        INSERT INTO api_design_fts(rowid, title, description, features)
+        VALUES (new.id, new.title, new.description, new.features);
+    END
+    """,
+    """
+    CREATE TRIGGER api_design_fts_delete AFTER DELETE ON api_design BEGIN
+        INSERT INTO api_design_fts(api_design_fts, rowid, title, description, features)
+        VALUES ('delete', old.id, old.title, old.description, old.features);
+    END
+    """,
+    """
+    CREATE TRIGGER api_design_fts_update AFTER UPDATE OF title, description, features ON api_design BEGIN
+        INSERT INTO api_design_fts(api_design_fts, rowid, title, description, features)
+        VALUES ('delete', old.id, old.title, old.description, old.features);
+        INSERT INTO api_design_fts(rowid, title, description, features)
+        VALUES (new.id, new.title, new.description, new.features);
+    END
+    """,
+    "INSERT INTO api_design_fts(api_design_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS api_design_fts_update',
+    'DROP TRIGGER IF EXISTS api_design_fts_delete',
+    'DROP TRIGGER IF EXISTS api_design_fts_insert',
+    'DROP TABLE IF EXISTS api_design_fts',
+]
+
+# PostgreSQL: a stored generated tsvector column with a GIN index.
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE api_design ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(features, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    'CREATE INDEX api_design_search_gin ON api_design USING GIN (search_vector)',
+]
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS api_design_search_gin',
+    'ALTER TABLE api_design DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_content_blob'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
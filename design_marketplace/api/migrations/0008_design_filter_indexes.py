@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_design_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='design',
+            index=models.Index(fields=['price', 'created_at'], name='design_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='design',
+            index=models.Index(fields=['designer', 'created_at'], name='design_designer_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    Conversation = apps.get_model('api', 'Conversation')
+    ConversationParticipant = apps.get_model('api', 'ConversationParticipant')
+    Message = apps.get_model('api', 'Message')
+
+    threads = {}
+    for message in Message.objects.filter(conversation__isnull=True).order_by('timestamp', 'id').iterator():
+        user_a, user_b = sorted([message.sender_id, message.receiver_id])
+        key = (message.design_id, user_a, user_b)
+        if key not in threads:
+            conversation, _ = Conversation.objects.get_or_create(
+                design_id=message.design_id, user_a_id=user_a, user_b_id=user_b,
+            )
+            threads[key] = (conversation, {user_id: 0 for user_id in {user_a, user_b}})
+        conversation, unread = threads[key]
+        message.conversation_id = conversation.pk
+        message.save(update_fields=['conversation'])
+        conversation.last_message_id = message.pk
+        conversation.last_message_preview = message.content[:140]
+        conversation.last_message_at = message.timestamp
+        if not message.is_read and message.receiver_id != message.sender_id:
+            unread[message.receiver_id] += 1
+
+    for conversation, unread in threads.values():
+        conversation.save()
+        for user_id, count in unread.items():
+            ConversationParticipant.objects.update_or_create(
+                conversation=conversation, user_id=user_id,
+                defaults={'unread_count': count, 'last_message_at': conversation.last_message_at},
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_conversations'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
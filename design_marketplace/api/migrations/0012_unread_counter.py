@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    User = apps.get_model('api', 'User')
+    UnreadCounter = apps.get_model('api', 'UnreadCounter')
+    Notification = apps.get_model('api', 'Notification')
+    Message = apps.get_model('api', 'Message')
+
+    notifications = dict(
+        Notification.objects.filter(is_read=False).values('user_id')
+        .annotate(n=models.Count('id')).values_list('user_id', 'n')
+    )
+    messages = dict(
+        Message.objects.filter(is_read=False).exclude(sender_id=models.F('receiver_id'))
+        .values('receiver_id').annotate(n=models.Count('id')).values_list('receiver_id', 'n')
+    )
+    UnreadCounter.objects.bulk_create([
+        UnreadCounter(user_id=pk, notifications=notifications.get(pk, 0), messages=messages.get(pk, 0))
+        for pk in User.objects.values_list('id', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_backfill_conversations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notifications', models.PositiveIntegerField(default=0)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counter', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
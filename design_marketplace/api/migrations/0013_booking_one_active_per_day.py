@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+def check_double_bookings(apps, schema_editor):
+    # The constraint can't be created over existing clashes. Which booking
+    # wins is a business decision, so stop and list them for an operator
+    # instead of cancelling customer bookings here.
+    Booking = apps.get_model('api', 'Booking')
+    groups = {}
+    active = Booking.objects.exclude(status='cancelled').filter(booking_date__isnull=False)
+    for booking_id, design_id, day in active.order_by('created_at', 'id').values_list('id', 'design_id', 'booking_date'):
+        groups.setdefault((design_id, day), []).append(booking_id)
+    clashes = [
+        f'design {design_id} on {day}: bookings {", ".join(map(str, ids))}'
+        for (design_id, day), ids in groups.items() if len(ids) > 1
+    ]
+    if clashes:
+        raise RuntimeError(
+            'Double bookings must be resolved (cancel all but one booking per design and date) '
+            'before booking_one_active_per_day can be added:\n  ' + '\n  '.join(clashes)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_unread_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(models.Q(('status', 'cancelled'), _negated=True), ('booking_date__isnull', False)), fields=('design', 'booking_date'), name='booking_one_active_per_day'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:53
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+STATUS_FIELDS = {'pending': 'bookings_pending', 'confirmed': 'bookings_confirmed', 'cancelled': 'bookings_cancelled'}
+
+
+def backfill(apps, schema_editor):
+    # Same computation as api.rollups.rebuild, against the historical models
+    Booking = apps.get_model('api', 'Booking')
+    Payment = apps.get_model('api', 'Payment')
+    DesignDailyStats = apps.get_model('api', 'DesignDailyStats')
+    totals = defaultdict(dict)
+    rows = (
+        Booking.objects.annotate(day=TruncDate('created_at'))
+        .values('design_id', 'design__designer_id', 'day', 'status').annotate(n=Count('id')).order_by()
+    )
+    for row in rows:
+        if row['status'] in STATUS_FIELDS:
+            fields = totals[(row['design_id'], row['design__designer_id'], row['day'])]
+            fields[STATUS_FIELDS[row['status']]] = fields.get(STATUS_FIELDS[row['status']], 0) + row['n']
+    rows = (
+        Payment.objects.filter(successful=True)
+        .annotate(day=Coalesce(TruncDate('paid_at'), TruncDate('booking__created_at'), output_field=DateField()))
+        .values('booking__design_id', 'booking__design__designer_id', 'day')
+        .annotate(n=Count('id'), amount=Sum('amount')).order_by()
+    )
+    for row in rows:
+        fields = totals[(row['booking__design_id'], row['booking__design__designer_id'], row['day'])]
+        fields['payments'] = fields.get('payments', 0) + row['n']
+        fields['revenue'] = fields.get('revenue', 0) + (row['amount'] or 0)
+    DesignDailyStats.objects.bulk_create([
+        DesignDailyStats(design_id=design_id, designer_id=designer_id, day=day, **fields)
+        for (design_id, designer_id, day), fields in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_sync_change_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DesignDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bookings_pending', models.IntegerField(default=0)),
+                ('bookings_confirmed', models.IntegerField(default=0)),
+                ('bookings_cancelled', models.IntegerField(default=0)),
+                ('payments', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('design', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='api.design')),
+                ('designer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='design_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['designer', 'day'], name='design_stats_designer_idx')],
+                'constraints': [models.UniqueConstraint(fields=('design', 'day'), name='design_daily_stats_unique')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
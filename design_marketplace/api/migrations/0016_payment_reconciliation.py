@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_design_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationIssue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_number', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('unmatched', 'No payment with this transaction id'), ('amount_mismatch', 'Settled amount differs from the booking price'), ('invalid', 'Unreadable row')], max_length=20)),
+                ('transaction_id', models.CharField(blank=True, max_length=255)),
+                ('expected_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('settled_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_sha256', models.CharField(db_index=True, max_length=64)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('rows_processed', models.PositiveIntegerField(default=0)),
+                ('matched', models.PositiveIntegerField(default=0)),
+                ('settled', models.PositiveIntegerField(default=0)),
+                ('reversed', models.PositiveIntegerField(default=0)),
+                ('unchanged', models.PositiveIntegerField(default=0)),
+                ('unmatched', models.PositiveIntegerField(default=0)),
+                ('mismatched', models.PositiveIntegerField(default=0)),
+                ('invalid', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['transaction_id'], name='payment_transaction_idx'),
+        ),
+        migrations.AddField(
+            model_name='reconciliationissue',
+            name='payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.payment'),
+        ),
+        migrations.AddField(
+            model_name='reconciliationissue',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='issues', to='api.reconciliationrun'),
+        ),
+        migrations.AddConstraint(
+            model_name='reconciliationissue',
+            constraint=models.UniqueConstraint(fields=('run', 'line_number', 'kind'), name='reconciliation_issue_unique'),
+        ),
+    ]
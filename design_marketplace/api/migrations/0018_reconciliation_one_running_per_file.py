@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+def fail_duplicate_runs(apps, schema_editor):
+    # Keep the newest running run of each file (the one a resume would pick)
+    ReconciliationRun = apps.get_model('api', 'ReconciliationRun')
+    seen = set()
+    for run in ReconciliationRun.objects.filter(status='running').order_by('-id'):
+        if run.file_sha256 in seen:
+            run.status, run.last_error = 'failed', 'Superseded by a newer run'
+            run.save(update_fields=['status', 'last_error'])
+        seen.add(run.file_sha256)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_notification_dedupe_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reconciliationrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('file_sha256',), name='reconciliation_one_running_per_file'),
+        ),
+    ]
@@ -33,18 +33,89 @@ class Design(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to='design_images/')
+    # Resized WebP/JPEG renditions of `image`, filled in by api.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Backs the keyset-paginated feed ordered by (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='design_feed_idx'),
+            # Price-range filters / price ordering, and per-designer listings
+            models.Index(fields=['price', 'created_at'], name='design_price_idx'),
+            models.Index(fields=['designer', 'created_at'], name='design_designer_idx'),
+            # Delta sync walks each user's rows in (updated_at, id) order
+            models.Index(fields=['designer', 'updated_at', 'id'], name='design_sync_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+class ContentBlob(models.Model):
+    # One row per unique uploaded file, addressed by its SHA-256 (see api.storage)
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} refs)'
+
+class Conversation(models.Model):
+    # One thread per design between two users; user_a is always the lower id
+    design = models.ForeignKey(Design, on_delete=models.CASCADE, related_name='conversations')
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_preview = models.CharField(max_length=140, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['design', 'user_a', 'user_b'], name='unique_conversation'),
+        ]
+
+    def __str__(self):
+        return f'Conversation {self.id} on design {self.design_id}'
+
+class ConversationParticipant(models.Model):
+    # Denormalized inbox row: one per user per conversation
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inbox')
+    unread_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='unique_conversation_participant'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'last_message_at', 'id'], name='inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} in conversation {self.conversation_id}'
+
 class Message(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages')
     design = models.ForeignKey(Design, on_delete=models.CASCADE, related_name='messages')
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, null=True, blank=True, related_name='messages'
+    )
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['conversation', 'timestamp', 'id'], name='message_thread_idx'),
+            models.Index(fields=['sender', 'updated_at', 'id'], name='message_sent_sync_idx'),
+            models.Index(fields=['receiver', 'updated_at', 'id'], name='message_received_sync_idx'),
+        ]
+
     def __str__(self):
         return f'Message from {self.sender} to {self.receiver} on {self.design.title}'
 
@@ -67,6 +138,20 @@ class Booking(models.Model):
     notes = models.TextField(blank=True)
     booking_date = models.DateField(null=True, blank=True)  # Added for user-specified date
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', 'updated_at', 'id'], name='booking_sync_idx'),
+        ]
+        constraints = [
+            # A design can be booked once per day; cancelling frees the date again.
+            # Also the index behind the availability calendar's range query.
+            models.UniqueConstraint(
+                fields=['design', 'booking_date'],
+                condition=~models.Q(status='cancelled') & models.Q(booking_date__isnull=False),
+                name='booking_one_active_per_day',
+            ),
+        ]
+
     def __str__(self):
         return f'Booking {self.id} by {self.client.username} for {self.design.title}'
 
@@ -78,6 +163,12 @@ class Payment(models.Model):
     paid_at = models.DateTimeField(null=True, blank=True)
     successful = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Settlement reconciliation looks payments up by provider id in bulk
+            models.Index(fields=['transaction_id'], name='payment_transaction_idx'),
+        ]
+
     def __str__(self):
         return f'Payment for booking {self.booking.id} - {"Success" if self.successful else "Pending"}'
 
@@ -85,7 +176,187 @@ class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     message = models.CharField(max_length=255)
     is_read = models.BooleanField(default=False)
+    # Set by job handlers so a re-run job finds its notification instead of adding another
+    dedupe_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='notification_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f'Notification for {self.user.username}: {self.message}'
+
+class Job(models.Model):
+    # Background work executed by `manage.py run_workers` (see api.jobs)
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    queue = models.CharField(max_length=50, default='default')
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for the oldest due job of a queue
+            models.Index(fields=['queue', 'status', 'run_at'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.id} ({self.status})'
+
+
+class DeadLetterJob(models.Model):
+    # Jobs that exhausted their retries, kept for inspection and manual requeue
+    job_id = models.BigIntegerField()
+    queue = models.CharField(max_length=50)
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    attempts = models.PositiveIntegerField()
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Dead {self.task} #{self.job_id}'
+
+
+class UnreadCounter(models.Model):
+    # Per-user badge counts kept in step with Notification/Message (see api.counters)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='unread_counter')
+    notifications = models.PositiveIntegerField(default=0)
+    messages = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Unread for {self.user_id}: {self.notifications} notifications, {self.messages} messages'
+
+class Tombstone(models.Model):
+    # Deletion record served by the delta-sync endpoint (see api.sync), one per
+    # affected user. A plain integer user id, so tombstones written while a
+    # user's rows cascade away don't point at the user being deleted.
+    user_id = models.PositiveIntegerField()
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'deleted_at', 'id'], name='tombstone_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f'Deleted {self.kind} {self.object_id} (user {self.user_id})'
+
+
+class DesignDailyStats(models.Model):
+    # Dashboard rollup per design per day, maintained incrementally by
+    # api.rollups; `manage.py rebuild_dashboard_rollups` recomputes it.
+    # Bookings count on the day they were made, revenue on the day it was paid.
+    designer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='design_daily_stats')
+    design = models.ForeignKey(Design, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    bookings_pending = models.IntegerField(default=0)
+    bookings_confirmed = models.IntegerField(default=0)
+    bookings_cancelled = models.IntegerField(default=0)
+    payments = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['design', 'day'], name='design_daily_stats_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['designer', 'day'], name='design_stats_designer_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.design_id} on {self.day}'
+
+
+class ReconciliationRun(models.Model):
+    # One pass of a settlement file through api.reconciliation. `rows_processed`
+    # is committed with each chunk's updates, so an interrupted run resumes there.
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    file_name = models.CharField(max_length=255)
+    file_sha256 = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RUNNING)
+    rows_processed = models.PositiveIntegerField(default=0)
+    matched = models.PositiveIntegerField(default=0)
+    settled = models.PositiveIntegerField(default=0)
+    reversed = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    unmatched = models.PositiveIntegerField(default=0)
+    mismatched = models.PositiveIntegerField(default=0)
+    invalid = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            # Two processes reconciling one file would race on its resume point
+            models.UniqueConstraint(
+                fields=['file_sha256'], condition=models.Q(status='running'), name='reconciliation_one_running_per_file',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Reconciliation of {self.file_name} ({self.status})'
+
+
+class ReconciliationIssue(models.Model):
+    UNMATCHED = 'unmatched'
+    AMOUNT_MISMATCH = 'amount_mismatch'
+    INVALID = 'invalid'
+    KIND_CHOICES = [
+        (UNMATCHED, 'No payment with this transaction id'),
+        (AMOUNT_MISMATCH, 'Settled amount differs from the booking price'),
+        (INVALID, 'Unreadable row'),
+    ]
+
+    run = models.ForeignKey(ReconciliationRun, on_delete=models.CASCADE, related_name='issues')
+    line_number = models.PositiveIntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    transaction_id = models.CharField(max_length=255, blank=True)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    expected_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    settled_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    detail = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [
+            # A resumed chunk re-reports the same lines; this keeps them single
+            models.UniqueConstraint(fields=['run', 'line_number', 'kind'], name='reconciliation_issue_unique'),
+        ]
 
     def __str__(self):
-        return f'Notification for {self.user.username}: {self.message}'
\ No newline at end of file
+        return f'{self.kind} at line {self.line_number}'
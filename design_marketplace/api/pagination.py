@@ -0,0 +1,144 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .filters import get_design_ordering
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek-based pagination over a composite ordering.
+
+    The cursor is an opaque token holding the ordering values of the last row
+    on the page, so every page is a `WHERE (a, b) < (x, y) ... LIMIT n` lookup
+    against an index instead of an OFFSET scan, and no COUNT(*) is issued.
+    The last ordering field must be unique (normally `id`).
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request, view=None):
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, view)
+        self.page_size = self.get_page_size(request)
+        self.position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(self.seek_filter(self.position))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def seek_filter(self, position):
+        # (a, b, c) after (x, y, z)  ==  a > x  OR  (a = x AND b > y)  OR  ...
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.get_fields(), position):
+            lookup = '%s__%s' % (name, 'lt' if descending else 'gt')
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        return condition
+
+    def get_position(self, row):
+        position = []
+        for name, _ in self.get_fields():
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return position
+
+    def encode_cursor(self, position):
+        raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+        token = base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            position = json.loads(raw.decode('utf-8'))
+        except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_first_link(self):
+        if self.position is None:
+            return None
+        return remove_query_param(self.base_url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'first': self.get_first_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class DesignFeedPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+    max_page_size = 50
+
+    def get_ordering(self, request, view=None):
+        return get_design_ordering(request) or self.ordering
+
+
+class InboxPagination(KeysetPagination):
+    ordering = ('-last_message_at', '-id')
+    page_size = 20
+
+
+class ThreadPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
+    page_size = 30
@@ -0,0 +1,79 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import uuid
+from hmac import compare_digest
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+
+from .metrics import internal_request_allowed
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def profiling_token():
+    return getattr(settings, 'PROFILING_TOKEN', '')
+
+
+def is_authorized(request):
+    token = profiling_token()
+    return bool(token) and compare_digest(request.headers.get(PROFILE_HEADER, '').encode(), token.encode())
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def prune(directory, keep):
+    profiles = sorted(directory.glob('*.prof'), key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in profiles[keep:]:
+        path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a single request with cProfile when it carries
+    `X-Profile: <PROFILING_TOKEN>`. The stats file is stored under PROFILE_DIR
+    (the newest PROFILE_KEEP are kept) and its id returned in `X-Profile-Id`
+    for download from /api/internal/profiles/<id>/. Without the header, or
+    with PROFILING_TOKEN unset, a request costs one header lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_HEADER not in request.headers or not is_authorized(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        profile_id = uuid.uuid4().hex
+        profiler.dump_stats(directory / f'{profile_id}.prof')
+        prune(directory, getattr(settings, 'PROFILE_KEEP', 50))
+        response['X-Profile-Id'] = profile_id
+        return response
+
+
+def profile_view(request, profile_id):
+    """The raw pstats file (for snakeviz and friends), or `?format=text` for the top functions by cumulative time."""
+    if not (is_authorized(request) or internal_request_allowed(request)):
+        return HttpResponseForbidden()
+    path = profile_dir() / f'{profile_id}.prof'
+    if not PROFILE_ID.match(profile_id) or not path.exists():
+        raise Http404('No such profile.')
+    if request.GET.get('format') == 'text':
+        out = io.StringIO()
+        pstats.Stats(str(path), stream=out).sort_stats('cumulative').print_stats(50)
+        return HttpResponse(out.getvalue(), content_type='text/plain; charset=utf-8')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
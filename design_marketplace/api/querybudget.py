@@ -0,0 +1,53 @@
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('api.querybudget')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    """`connection.execute_wrapper` hook that counts the queries it sees."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMixin:
+    """
+    Declares how many queries each viewset action may run, independent of the
+    number of rows returned, e.g. `query_budget = {'list': 3, 'retrieve': 2}`.
+
+    With QUERY_BUDGET_LOG the overrun is logged; with QUERY_BUDGET_STRICT (the
+    test suite) it raises, so an N+1 regression fails loudly.
+    """
+    query_budget = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        log = getattr(settings, 'QUERY_BUDGET_LOG', False)
+        strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        if not (log or strict):
+            return super().dispatch(request, *args, **kwargs)
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = super().dispatch(request, *args, **kwargs)
+
+        action = getattr(self, 'action', None)
+        budget = self.query_budget.get(action)
+        if budget is not None and counter.count > budget:
+            message = '%s.%s ran %d queries (budget %d) for %s' % (
+                type(self).__name__, action, counter.count, budget, request.get_full_path()
+            )
+            if strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
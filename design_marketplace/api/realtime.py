@@ -0,0 +1,244 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication
+
+logger = logging.getLogger('api.realtime')
+
+CLOSE = object()
+
+
+class Subscription:
+    """A bounded per-connection queue, fed from any thread through its event loop."""
+
+    def __init__(self, user_id, loop, maxsize):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def offer(self, event):
+        # Runs on self.loop. A consumer that cannot keep up is cut off instead of
+        # buffering without bound; it reconnects with Last-Event-ID and replays.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(CLOSE)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """Fans events out to the subscribers connected to this process."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        maxsize = getattr(settings, 'NOTIFICATION_STREAM_QUEUE_SIZE', 100)
+        subscription = Subscription(user_id, asyncio.get_running_loop(), maxsize)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def deliver(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The connection's event loop has already shut down
+                self.unsubscribe(subscription)
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+
+class DatabasePollingBroker(InProcessBroker):
+    """
+    Multi-worker variant without external services: one poller per process tails
+    the Notification table for connected users and fans new rows out locally, so
+    rows created by other processes (job workers, other web workers) still reach
+    this process's streams. That is one query per process per interval, not one
+    per client. Local publishes are still delivered immediately; the stream
+    drops the poller's copy by event id.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._poller = None
+        self._last_id = None
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        if self._poller is None or self._poller.done():
+            self._poller = subscription.loop.create_task(self._poll())
+        return subscription
+
+    async def _poll(self):
+        interval = getattr(settings, 'NOTIFICATION_POLL_INTERVAL', 1.0)
+        # Tail from the current head: rows created while nobody was connected
+        # aren't live events (clients catch up through Last-Event-ID replay)
+        self._last_id = None
+        while self.subscriber_count():
+            try:
+                await sync_to_async(self._poll_once)()
+            except Exception:
+                logger.exception('Notification poll failed')
+            await asyncio.sleep(interval)
+
+    def _poll_once(self):
+        from .models import Notification
+
+        head = Notification.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        if self._last_id is None:
+            self._last_id = head
+            return
+        with self._lock:
+            user_ids = list(self._subscribers)
+        limit = 500
+        rows = list(
+            Notification.objects.filter(id__gt=self._last_id, id__lte=head, user_id__in=user_ids).order_by('id')[:limit]
+        )
+        for notification in rows:
+            self.deliver(notification.user_id, notification_event(notification))
+        # Past other users' rows too, so the next poll never rescans them and
+        # someone subscribing later doesn't get them as live events
+        self._last_id = rows[-1].id if len(rows) == limit else max(head, self._last_id)
+
+_brokers = {}
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    path = getattr(settings, 'NOTIFICATION_BROKER', 'api.realtime.InProcessBroker')
+    broker = _brokers.get(path)
+    if broker is None:
+        with _broker_lock:
+            broker = _brokers.setdefault(path, import_string(path)())
+    return broker
+
+
+def notification_event(notification):
+    return {
+        'id': notification.id,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def publish_notification(notification):
+    get_broker().publish(notification.user_id, notification_event(notification))
+
+
+def format_event(event):
+    return f'id: {event["id"]}\nevent: notification\ndata: {json.dumps(event)}\n\n'
+
+
+def _authenticate(request):
+    header = request.headers.get('Authorization', '')
+    key = header[6:].strip() if header.startswith('Token ') else request.GET.get('token')
+    if not key:
+        return None
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    return user
+
+
+def _replay(user_id, last_event_id, limit):
+    from .models import Notification
+
+    rows = Notification.objects.filter(user_id=user_id, id__gt=last_event_id).order_by('id')[:limit]
+    return [notification_event(notification) for notification in rows]
+
+
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the authenticated user's new notifications.
+
+    Authenticate with `Authorization: Token <key>` (or `?token=` for EventSource
+    clients that cannot set headers). Reconnects send `Last-Event-ID` and get all
+    the missed rows replayed from the database, NOTIFICATION_STREAM_REPLAY_LIMIT
+    per query, before live delivery resumes.
+    Needs an ASGI server; under WSGI the stream would be buffered.
+    """
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return HttpResponse(status=401)
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+    except ValueError:
+        last_event_id = 0
+
+    broker = get_broker()
+    # Subscribe before replaying so nothing published in between is lost
+    subscription = broker.subscribe(user.pk)
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+
+    async def events():
+        delivered = last_event_id
+        try:
+            yield 'retry: 3000\n\n'
+            if last_event_id:
+                # Page through the backlog up to the head before going live
+                limit = getattr(settings, 'NOTIFICATION_STREAM_REPLAY_LIMIT', 200)
+                while True:
+                    page = await sync_to_async(_replay)(user.pk, delivered, limit)
+                    for event in page:
+                        delivered = event['id']
+                        yield format_event(event)
+                    if len(page) < limit:
+                        break
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is CLOSE:
+                    break
+                if event['id'] <= delivered:
+                    continue
+                delivered = event['id']
+                yield format_event(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingHttpResponse(
+        events(), content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,216 @@
+import csv
+import hashlib
+import os
+from collections import Counter
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Payment, ReconciliationIssue, ReconciliationRun
+from .rollups import Deltas
+
+# Settlement file: a CSV with a header row. `status` and `settled_at` are optional;
+# a row without a status counts as settled.
+REQUIRED_COLUMNS = {'transaction_id', 'amount'}
+SETTLED_STATUSES = {'', 'settled', 'succeeded', 'success', 'paid', 'captured'}
+REVERSED_STATUSES = {'failed', 'declined', 'refunded', 'reversed', 'chargeback'}
+COUNTERS = ('matched', 'settled', 'reversed', 'unchanged', 'unmatched', 'mismatched', 'invalid')
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_settlements(path, skip=0):
+    """Yields `(line_number, row)` for each data row after the first `skip`, reading one line at a time."""
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        reader = csv.DictReader(fh)
+        missing = REQUIRED_COLUMNS - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f'Settlement file is missing columns: {", ".join(sorted(missing))}')
+        for number, row in enumerate(reader, start=1):
+            if number > skip:
+                yield number, row
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_settled_at(value):
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Unreadable settled_at {value!r}')
+        moment = datetime.combine(day, time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def parse_row(row):
+    transaction_id = (row.get('transaction_id') or '').strip()
+    if not transaction_id:
+        raise ValueError('Missing transaction_id')
+    try:
+        amount = Decimal((row.get('amount') or '').strip())
+    except InvalidOperation:
+        raise ValueError(f'Unreadable amount {row.get("amount")!r}')
+    if not amount.is_finite():
+        raise ValueError(f'Unreadable amount {row.get("amount")!r}')
+    status = (row.get('status') or '').strip().lower()
+    if status not in SETTLED_STATUSES and status not in REVERSED_STATUSES:
+        raise ValueError(f'Unknown status {status!r}')
+    return transaction_id, amount, status in SETTLED_STATUSES, parse_settled_at((row.get('settled_at') or '').strip())
+
+
+class ReconciliationConflict(Exception):
+    """Another process is already reconciling this file."""
+
+
+def process_chunk(run, chunk):
+    """
+    Applies one chunk in a single transaction: it claims the chunk by moving
+    the run's resume point, locks and reads all its payments in one query,
+    then writes one bulk_update of the payments that change, the dashboard
+    deltas and the issues. Payments are read under the lock, so a concurrent
+    change can neither be overwritten nor counted twice.
+    """
+    counts = Counter()
+    issues = []
+    parsed = []
+    for number, row in chunk:
+        try:
+            parsed.append((number, *parse_row(row)))
+        except ValueError as exc:
+            counts['invalid'] += 1
+            issues.append(ReconciliationIssue(
+                run=run, line_number=number, kind=ReconciliationIssue.INVALID,
+                transaction_id=(row.get('transaction_id') or '')[:255], detail=str(exc)[:255],
+            ))
+
+    with transaction.atomic():
+        # Compare-and-set on the resume point: a second process working the
+        # same run finds it moved (or the run superseded) and stops
+        claimed = ReconciliationRun.objects.filter(
+            pk=run.pk, status=ReconciliationRun.RUNNING, rows_processed=run.rows_processed,
+        ).update(rows_processed=chunk[-1][0])
+        if not claimed:
+            raise ReconciliationConflict(f'Run {run.pk} is being reconciled by another process')
+
+        payments = {}
+        lookup = (
+            Payment.objects.select_related('booking').select_for_update(of=('self',))
+            .filter(transaction_id__in={row[1] for row in parsed})
+        )
+        for payment in lookup.order_by('id'):
+            payments.setdefault(payment.transaction_id, payment)
+
+        changed = {}
+        deltas = Deltas()
+        for number, transaction_id, amount, successful, settled_at in parsed:
+            payment = payments.get(transaction_id)
+            if payment is None:
+                counts['unmatched'] += 1
+                issues.append(ReconciliationIssue(
+                    run=run, line_number=number, kind=ReconciliationIssue.UNMATCHED, transaction_id=transaction_id,
+                    settled_amount=amount,
+                ))
+                continue
+            counts['matched'] += 1
+            booking = payment.booking
+            expected = booking.negotiated_price if booking.negotiated_price is not None else payment.amount
+            if amount != expected:
+                counts['mismatched'] += 1
+                issues.append(ReconciliationIssue(
+                    run=run, line_number=number, kind=ReconciliationIssue.AMOUNT_MISMATCH,
+                    transaction_id=transaction_id, payment=payment, expected_amount=expected, settled_amount=amount,
+                ))
+
+            paid_at = (settled_at or payment.paid_at or timezone.now()) if successful else payment.paid_at
+            if payment.successful == successful and payment.paid_at == paid_at:
+                # Already applied, by an earlier run or an earlier line of this one
+                counts['unchanged'] += 1
+                continue
+            if payment.successful:
+                deltas.settled(booking.design_id, booking.created_at, payment.amount, payment.paid_at, -1)
+            payment.successful, payment.paid_at = successful, paid_at
+            if successful:
+                deltas.settled(booking.design_id, booking.created_at, payment.amount, payment.paid_at, 1)
+            counts['settled' if successful else 'reversed'] += 1
+            changed[payment.pk] = payment
+
+        if changed:
+            Payment.objects.bulk_update(list(changed.values()), ['successful', 'paid_at'])
+        # bulk_update sends no post_save, so the dashboard rollup is moved here
+        deltas.apply()
+        ReconciliationIssue.objects.bulk_create(issues, ignore_conflicts=True)
+        if counts:
+            ReconciliationRun.objects.filter(pk=run.pk).update(
+                **{name: F(name) + counts[name] for name in COUNTERS if counts[name]}
+            )
+    run.rows_processed = chunk[-1][0]
+    for name in COUNTERS:
+        setattr(run, name, getattr(run, name) + counts[name])
+
+
+def reconcile(path, chunk_size=1000, restart=False, progress=None):
+    """
+    Reconciles a settlement file, `chunk_size` rows at a time, in memory
+    bounded by the chunk rather than the file.
+
+    Runs are keyed by the file's SHA-256: a file that was fully reconciled
+    returns its finished run, and an interrupted one resumes after the last
+    committed chunk. `restart` starts a fresh run and supersedes any unfinished
+    one; re-applying rows is harmless because payments already in the settled
+    state are left alone. Only one run per file can be running: a second
+    process raises ReconciliationConflict instead of applying rows twice.
+    """
+    digest = file_digest(path)
+    run = None if restart else ReconciliationRun.objects.filter(file_sha256=digest).order_by('-id').first()
+    if run is not None and run.status == ReconciliationRun.COMPLETED:
+        return run
+    if run is None:
+        try:
+            with transaction.atomic():
+                if restart:
+                    ReconciliationRun.objects.filter(file_sha256=digest, status=ReconciliationRun.RUNNING).update(
+                        status=ReconciliationRun.FAILED, last_error='Superseded by a restart',
+                    )
+                run = ReconciliationRun.objects.create(file_name=os.path.basename(path)[:255], file_sha256=digest)
+        except IntegrityError:
+            raise ReconciliationConflict(f'{os.path.basename(path)} is being reconciled by another process')
+    elif run.status != ReconciliationRun.RUNNING:
+        run.status = ReconciliationRun.RUNNING
+        run.save(update_fields=['status'])
+
+    try:
+        for chunk in chunks(read_settlements(path, skip=run.rows_processed), chunk_size):
+            process_chunk(run, chunk)
+            if progress is not None:
+                progress(run)
+    except ReconciliationConflict:
+        # The run belongs to the other process; leave its status alone
+        raise
+    except Exception as exc:
+        run.status, run.last_error = ReconciliationRun.FAILED, str(exc)
+        run.save(update_fields=['status', 'last_error'])
+        raise
+    run.status, run.finished_at, run.last_error = ReconciliationRun.COMPLETED, timezone.now(), ''
+    run.save(update_fields=['status', 'finished_at', 'last_error'])
+    return run
@@ -0,0 +1,161 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Booking, Design, DesignDailyStats, Payment
+
+STATUS_FIELDS = {
+    Booking.PENDING: 'bookings_pending',
+    Booking.CONFIRMED: 'bookings_confirmed',
+    Booking.CANCELLED: 'bookings_cancelled',
+}
+STAT_FIELDS = [*STATUS_FIELDS.values(), 'payments', 'revenue']
+CENTS = Decimal('0.01')
+
+
+class Deltas:
+    """Pending changes to DesignDailyStats rows, keyed by (design_id, day), applied together."""
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: defaultdict(int))
+
+    def add(self, design_id, day, **fields):
+        for field, delta in fields.items():
+            if delta:
+                self.changes[(design_id, day)][field] += delta
+
+    def booking(self, booking, status, sign):
+        if status in STATUS_FIELDS:
+            self.add(booking.design_id, timezone.localdate(booking.created_at), **{STATUS_FIELDS[status]: sign})
+
+    def payment(self, booking_id, successful, amount, paid_at, sign):
+        # Only successful payments count; revenue lands on the day paid (or booked, if unset)
+        if not successful or amount is None:
+            return
+        facts = Booking.objects.filter(pk=booking_id).values_list('design_id', 'created_at').first()
+        if facts is None:
+            return
+        self.settled(*facts, amount, paid_at, sign)
+
+    def settled(self, design_id, booked_at, amount, paid_at, sign):
+        # For callers that already hold the booking's design and creation time
+        amount = Decimal(str(amount))
+        self.add(design_id, timezone.localdate(paid_at or booked_at), payments=sign, revenue=amount * sign)
+
+    def apply(self, create=True):
+        """
+        Applies everything in a fixed number of queries: the affected rows are
+        locked and read in one SELECT, missing ones inserted in one bulk insert,
+        and all of them written back with one bulk_update. Deletes pass
+        `create=False` so a cascade never re-creates a row for a design that
+        is on its way out.
+        """
+        changes = {key: fields for key, fields in self.changes.items() if any(fields.values())}
+        if not changes:
+            return
+        design_ids = {design_id for design_id, _ in changes}
+        days = {day for _, day in changes}
+        with transaction.atomic():
+            rows = self._locked(design_ids, days)
+            missing = [key for key in changes if key not in rows]
+            if missing and create:
+                designers = dict(Design.objects.filter(pk__in={d for d, _ in missing}).values_list('id', 'designer_id'))
+                DesignDailyStats.objects.bulk_create([
+                    DesignDailyStats(design_id=design_id, designer_id=designers[design_id], day=day)
+                    for design_id, day in missing if design_id in designers
+                ], ignore_conflicts=True)
+                rows = self._locked(design_ids, days)
+            touched = []
+            for key, fields in changes.items():
+                row = rows.get(key)
+                if row is None:
+                    continue
+                for field, delta in fields.items():
+                    setattr(row, field, getattr(row, field) + delta)
+                touched.append(row)
+            if touched:
+                DesignDailyStats.objects.bulk_update(touched, STAT_FIELDS)
+        self.changes.clear()
+
+    def _locked(self, design_ids, days):
+        rows = DesignDailyStats.objects.select_for_update().filter(design_id__in=design_ids, day__in=days)
+        return {(row.design_id, row.day): row for row in rows}
+
+
+def rebuild(designer_ids=None):
+    """Recomputes the rollup from Booking and Payment; returns the number of rows written."""
+    bookings = Booking.objects.all()
+    payments = Payment.objects.filter(successful=True)
+    existing = DesignDailyStats.objects.all()
+    if designer_ids is not None:
+        bookings = bookings.filter(design__designer_id__in=designer_ids)
+        payments = payments.filter(booking__design__designer_id__in=designer_ids)
+        existing = existing.filter(designer_id__in=designer_ids)
+
+    totals = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+    rows = (
+        bookings.annotate(day=TruncDate('created_at'))
+        .values('design_id', 'design__designer_id', 'day', 'status')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        if row['status'] in STATUS_FIELDS:
+            key = (row['design_id'], row['design__designer_id'], row['day'])
+            totals[key][STATUS_FIELDS[row['status']]] += row['n']
+    rows = (
+        payments.annotate(day=Coalesce(
+            TruncDate('paid_at'), TruncDate('booking__created_at'), output_field=DateField(),
+        ))
+        .values('booking__design_id', 'booking__design__designer_id', 'day')
+        .annotate(n=Count('id'), amount=Sum('amount'))
+        .order_by()
+    )
+    for row in rows:
+        key = (row['booking__design_id'], row['booking__design__designer_id'], row['day'])
+        totals[key]['payments'] += row['n']
+        totals[key]['revenue'] += row['amount'] or Decimal('0')
+
+    with transaction.atomic():
+        existing.delete()
+        DesignDailyStats.objects.bulk_create([
+            DesignDailyStats(design_id=design_id, designer_id=designer_id, day=day, **fields)
+            for (design_id, designer_id, day), fields in totals.items()
+        ], batch_size=1000)
+    return len(totals)
+
+
+def dashboard(designer, start, end, top=5):
+    """The designer dashboard, read only from DesignDailyStats rows: totals, a daily series and top designs."""
+    rows = DesignDailyStats.objects.filter(designer=designer, day__range=(start, end))
+    # Annotation names can't shadow the model's own fields
+    sums = {f'total_{field}': Sum(field) for field in STAT_FIELDS}
+
+    def shape(values):
+        return {
+            # SQLite's SUM drops the decimal places
+            'revenue': str(Decimal(values['total_revenue'] or 0).quantize(CENTS)),
+            'payments': values['total_payments'] or 0,
+            'bookings': {status: values[f'total_{field}'] or 0 for status, field in STATUS_FIELDS.items()},
+        }
+
+    daily = rows.values('day').annotate(**sums).order_by('day')
+    designs = (
+        rows.values('design_id', 'design__title')
+        .annotate(**sums)
+        .filter(Q(total_revenue__gt=0) | Q(total_bookings_pending__gt=0) | Q(total_bookings_confirmed__gt=0))
+        .order_by('-total_revenue', '-total_bookings_confirmed', 'design_id')[:top]
+    )
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'totals': shape(rows.aggregate(**sums)),
+        'daily': [{'day': row['day'].isoformat(), **shape(row)} for row in daily],
+        'top_designs': [
+            {'id': row['design_id'], 'title': row['design__title'], **shape(row)} for row in designs
+        ],
+    }
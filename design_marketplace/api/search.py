@@ -0,0 +1,154 @@
+import re
+from abc import ABC, abstractmethod
+
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+
+from .models import Design
+from .pagination import KeysetPagination
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 16
+# Terms are OR-ed together, so words this common would match nearly every row
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from in into is it of on or the to with without against'.split()
+)
+
+
+def tokenize(text):
+    terms = [term for term in TOKEN_RE.findall((text or '').lower()) if term not in STOPWORDS]
+    return terms[:MAX_TERMS]
+
+
+class SearchBackend(ABC):
+    """
+    Ranks designs for a free-text query. `search()` returns `(id, rank)` pairs
+    ordered by ascending rank (best match first), restricted to the ids in the
+    already-filtered `queryset` and positioned after the keyset `after`.
+    """
+
+    @abstractmethod
+    def search(self, terms, queryset, after=None, limit=10):
+        pass
+
+    def _filtered_ids_sql(self, queryset):
+        return queryset.order_by().values('id').query.sql_with_params()
+
+    def _run(self, inner_sql, params, after, limit):
+        sql = f'SELECT id, rank FROM ({inner_sql}) AS ranked'
+        if after is not None:
+            rank, pk = after
+            sql += ' WHERE rank > %s OR (rank = %s AND id > %s)'
+            params = [*params, rank, rank, pk]
+        sql += ' ORDER BY rank, id LIMIT %s'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, limit])
+            return cursor.fetchall()
+
+
+class SQLiteFTSBackend(SearchBackend):
+    # Column weights for bm25(): title, description, features
+    weights = (10.0, 1.0, 3.0)
+
+    def match_expression(self, terms):
+        # Quote every term so user input can never be parsed as FTS5 syntax;
+        # OR them so partial matches are still returned, ranked lower by bm25.
+        quoted = ['"%s"' % term for term in terms]
+        quoted[-1] += '*'
+        return ' OR '.join(quoted)
+
+    def search(self, terms, queryset, after=None, limit=10):
+        ids_sql, ids_params = self._filtered_ids_sql(queryset)
+        inner = (
+            'SELECT api_design_fts.rowid AS id, bm25(api_design_fts, %s, %s, %s) AS rank '
+            'FROM api_design_fts WHERE api_design_fts MATCH %s '
+            f'AND api_design_fts.rowid IN ({ids_sql})'
+        )
+        params = [*self.weights, self.match_expression(terms), *ids_params]
+        return self._run(inner, params, after, limit)
+
+
+class PostgresSearchBackend(SearchBackend):
+    config = 'english'
+
+    def tsquery(self, terms):
+        lexemes = list(terms)
+        lexemes[-1] += ':*'
+        return ' | '.join(lexemes)
+
+    def search(self, terms, queryset, after=None, limit=10):
+        ids_sql, ids_params = self._filtered_ids_sql(queryset)
+        # ts_rank_cd is higher-is-better; negate it to share the bm25 ordering
+        inner = (
+            'SELECT d.id, -ts_rank_cd(d.search_vector, q, 32) AS rank '
+            'FROM api_design d, to_tsquery(%s::regconfig, %s) q '
+            f'WHERE d.search_vector @@ q AND d.id IN ({ids_sql})'
+        )
+        params = [self.config, self.tsquery(terms), *ids_params]
+        return self._run(inner, params, after, limit)
+
+
+class LikeSearchBackend(SearchBackend):
+    """Unranked fallback for databases without a full-text engine."""
+
+    def search(self, terms, queryset, after=None, limit=10):
+        condition = Q()
+        for term in terms:
+            condition |= Q(title__icontains=term) | Q(description__icontains=term) | Q(features__icontains=term)
+        queryset = queryset.filter(condition)
+        if after is not None:
+            queryset = queryset.filter(id__gt=after[1])
+        return [(pk, 0.0) for pk in queryset.order_by('id').values_list('id', flat=True)[:limit]]
+
+
+def get_search_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return LikeSearchBackend()
+
+
+def search_designs(query, queryset=None, after=None, limit=10):
+    """Returns up to `limit` Design objects for `query`, best match first, each carrying `search_rank`."""
+    terms = tokenize(query)
+    if not terms:
+        return []
+    if queryset is None:
+        queryset = Design.objects.all()
+    ranked = get_search_backend().search(terms, queryset, after=after, limit=limit)
+    designs = queryset.in_bulk([pk for pk, _ in ranked])
+    results = []
+    for pk, rank in ranked:
+        design = designs.get(pk)
+        if design is not None:
+            design.search_rank = rank
+            results.append(design)
+    return results
+
+
+class DesignSearchPagination(KeysetPagination):
+    # Cursor over (rank, id); rank comes from the search backend, not a column
+    ordering = ('search_rank', 'id')
+    max_page_size = 50
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.position = self.decode_cursor(request)
+        after = None
+        if self.position is not None:
+            try:
+                after = (float(self.position[0]), int(self.position[1]))
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = search_designs(view.search_query, queryset, after=after, limit=self.page_size + 1)
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_position(self, row):
+        return [repr(row.search_rank), str(row.id)]
@@ -1,10 +1,37 @@
+import logging
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import DesignerProfile, Design, Message, Booking, Payment, Notification
-from .models import Booking
+from django.core.files.storage import default_storage
+from .models import DesignerProfile, Design, Message, Booking, Payment, Notification, ConversationParticipant
+from .fieldsets import SparseFieldsMixin
+from .images import DERIVATIVE_FORMATS
+from .logs import payload_logger
+from .metrics import serializer_timer
 
 User = get_user_model()
 
+class PayloadLoggingMixin:
+    # Timed for the serializer metrics; per-object dumps are off unless the `api.payloads` logger is set to DEBUG
+    def to_representation(self, instance):
+        with serializer_timer():
+            data = super().to_representation(instance)
+        if payload_logger.isEnabledFor(logging.DEBUG):
+            payload_logger.debug('Serialized %s', type(instance).__name__, extra={'payload': data})
+        return data
+
+def image_srcset(image_name, variants, request):
+    # {'webp': {'320w': url, ...}, 'jpeg': {...}}; empty until derivatives are built
+    if not variants or variants.get('source') != image_name:
+        return {}
+    srcset = {}
+    for fmt in DERIVATIVE_FORMATS:
+        srcset[fmt] = {}
+        for width, name in variants.get(fmt, {}).items():
+            url = default_storage.url(name)
+            srcset[fmt][width] = request.build_absolute_uri(url) if request else url
+    return srcset
+
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
 
@@ -15,43 +42,38 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
     def create(self, validated_data):
-        print(f"Creating user with data: {validated_data}")
+        payload_logger.debug('Creating user', extra={'payload': validated_data})
         password = validated_data.pop('password')
         user = User(**validated_data)
         user.set_password(password)
         user.save()
-        print(f"User created successfully: {user}")
         return user
 
-class DesignerProfileSerializer(serializers.ModelSerializer):
+class DesignerProfileSerializer(PayloadLoggingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
         model = DesignerProfile
         fields = ['id', 'user', 'bio', 'phone_number', 'company_name']
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        print(f"Serialized DesignerProfile: {data}")
-        return data
-
-class DesignSerializer(serializers.ModelSerializer):
+class DesignSerializer(SparseFieldsMixin, PayloadLoggingMixin, serializers.ModelSerializer):
     designer = UserSerializer(read_only=True)
     image = serializers.ImageField(use_url=True)
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Design
         fields = [
             'id', 'designer', 'title', 'description', 'features',
-            'price', 'created_at', 'updated_at', 'image'
+            'price', 'created_at', 'updated_at', 'image', 'image_srcset'
         ]
+        expandable = {'designer': (UserSerializer, ['designer'])}
+        field_columns = {'image_srcset': ['image', 'image_variants']}
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        print(f"Serialized Design: {data}")
-        return data
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image.name, obj.image_variants, self.context.get('request'))
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(SparseFieldsMixin, PayloadLoggingMixin, serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
     receiver = UserSerializer(read_only=True)
     design = DesignSerializer(read_only=True)
@@ -64,16 +86,23 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = ['id', 'sender', 'receiver', 'design', 'content', 'timestamp', 'is_read',
                   'sender_id', 'receiver_id', 'design_id']
+        expandable = {
+            'sender': (UserSerializer, ['sender']),
+            'receiver': (UserSerializer, ['receiver']),
+            'design': (DesignSerializer, ['design__designer']),
+        }
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        print(f"Serialized Message: {data}")
-        return data
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(SparseFieldsMixin, PayloadLoggingMixin, serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = ['id', 'client', 'design', 'negotiated_price', 'status', 'notes', 'created_at', 'booking_date']
         read_only_fields = ['id', 'client', 'created_at', 'status']
+        expandable = {
+            'client': (UserSerializer, ['client']),
+            'design': (DesignSerializer, ['design__designer']),
+        }
+        # The one-booking-per-day check runs under a lock in save_booking and answers 409
+        validators = []
 
     def validate_booking_date(self, value):
         from datetime import date
@@ -85,7 +114,7 @@ class BookingSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError("Design is required.")
         return value
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(PayloadLoggingMixin, serializers.ModelSerializer):
     booking = BookingSerializer(read_only=True)
     booking_id = serializers.PrimaryKeyRelatedField(queryset=Booking.objects.all(), source='booking', write_only=True)
 
@@ -93,12 +122,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         model = Payment
         fields = ['id', 'booking', 'booking_id', 'amount', 'payment_method', 'transaction_id', 'paid_at', 'successful']
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        print(f"Serialized Payment: {data}")
-        return data
-
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(PayloadLoggingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='user', write_only=True)
 
@@ -106,22 +130,55 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'user', 'user_id', 'message', 'is_read', 'created_at']
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        print(f"Serialized Notification: {data}")
-        return data
-
+class NotificationBatchSerializer(NotificationSerializer):
+    # Batch creates look users up in context['users'], loaded once for the whole batch
+    user_id = serializers.IntegerField(source='user', write_only=True)
 
+    def validate_user_id(self, value):
+        user = self.context['users'].get(value)
+        if user is None:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return user
 
+class NotificationReadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ['id', 'is_read']
+        read_only_fields = ['id']
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
-        fields = ['id', 'user', 'design', 'booking_date', 'notes', 'status', 'created_at']
-        read_only_fields = ['id', 'user', 'created_at', 'status']
+        fields = ['id', 'status']
+        read_only_fields = ['id']
 
-    def validate_booking_date(self, value):
-        from datetime import date
-        if value < date.today():
-            raise serializers.ValidationError("Booking date cannot be in the past.")
-        return value
\ No newline at end of file
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'profile_image']
+
+class DesignSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Design
+        fields = ['id', 'title', 'image']
+
+class ConversationSerializer(PayloadLoggingMixin, serializers.ModelSerializer):
+    # One inbox row: the thread as seen by the requesting participant
+    id = serializers.IntegerField(source='conversation_id', read_only=True)
+    design = DesignSummarySerializer(source='conversation.design', read_only=True)
+    participant = serializers.SerializerMethodField()
+    last_message_preview = serializers.CharField(source='conversation.last_message_preview', read_only=True)
+
+    class Meta:
+        model = ConversationParticipant
+        fields = ['id', 'design', 'participant', 'last_message_preview', 'last_message_at', 'unread_count']
+
+    def get_participant(self, obj):
+        conversation = obj.conversation
+        other = conversation.user_b if conversation.user_a_id == obj.user_id else conversation.user_a
+        return UserSummarySerializer(other, context=self.context).data
+
+class ThreadMessageSerializer(PayloadLoggingMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Message
+        fields = ['id', 'sender', 'receiver', 'content', 'timestamp', 'is_read']
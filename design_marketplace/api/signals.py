@@ -0,0 +1,206 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.db import transaction
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import counters
+from .authentication import USER_SNAPSHOT_FIELDS, forget_tokens, forget_user
+from .cache import design_cache
+from .conversations import adjust_unread, attach_conversation, record_message
+from .images import schedule_design_variants
+from .storage import blob_store
+from .models import Booking, Design, Message, Notification, Payment, UnreadCounter, User
+from .realtime import publish_notification
+from .rollups import Deltas
+from .sync import record_deletion
+
+# User fields rendered in the nested `designer` block of DesignSerializer
+DESIGNER_FIELDS = {'username', 'email', 'role', 'profile_image', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Design)
+@receiver(post_delete, sender=Design)
+def invalidate_design_cache(sender, **kwargs):
+    design_cache.invalidate()
+
+
+@receiver(post_save, sender=Design)
+def build_image_variants(sender, instance, **kwargs):
+    if instance.image and instance.image_variants.get('source') != instance.image.name:
+        schedule_design_variants(instance.pk)
+
+
+@receiver(post_delete, sender=Design)
+def release_design_image(sender, instance, **kwargs):
+    blob_store.release(instance.image.name)
+
+
+@receiver(post_save, sender=User)
+def invalidate_designer_cache(sender, instance, created, update_fields=None, **kwargs):
+    # A new user has no designs yet, and deleting one cascades to Design's own
+    # post_delete. Logins save only `last_login`, which must not flush the feed.
+    if created:
+        UnreadCounter.objects.get_or_create(user=instance)
+        return
+    if update_fields and not DESIGNER_FIELDS.intersection(update_fields):
+        return
+    design_cache.invalidate()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_auth(sender, instance, created=False, update_fields=None, **kwargs):
+    # Token auth serves a snapshot of these fields; logins save only `last_login`
+    if created or (update_fields and not {*USER_SNAPSHOT_FIELDS, 'password'}.intersection(update_fields)):
+        return
+    forget_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    forget_tokens(instance.key)
+
+
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_notification(instance))
+
+
+@receiver(pre_save, sender=Message)
+def assign_conversation(sender, instance, **kwargs):
+    attach_conversation(instance)
+
+
+@receiver(post_save, sender=Message)
+def update_conversation(sender, instance, created, **kwargs):
+    if created:
+        record_message(instance)
+
+
+def unread_owner(instance):
+    """The user whose unread counter a notification or message counts towards, if any."""
+    if isinstance(instance, Notification):
+        return instance.user_id
+    if instance.receiver_id != instance.sender_id:
+        return instance.receiver_id
+    return None
+
+
+def counter_field(instance):
+    return 'notifications' if isinstance(instance, Notification) else 'messages'
+
+
+@receiver(post_init, sender=Notification)
+@receiver(post_init, sender=Message)
+def remember_read_state(sender, instance, **kwargs):
+    # __dict__ rather than the attribute so a deferred is_read isn't fetched
+    instance._loaded_is_read = instance.__dict__.get('is_read')
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_save, sender=Message)
+def track_unread_on_save(sender, instance, created, **kwargs):
+    owner = unread_owner(instance)
+    was_read, instance._loaded_is_read = instance._loaded_is_read, instance.is_read
+    if owner is None:
+        return
+    if created:
+        delta = 0 if instance.is_read else 1
+    elif was_read is None or was_read == instance.is_read:
+        delta = 0
+    else:
+        delta = -1 if instance.is_read else 1
+    if delta:
+        counters.adjust(owner, **{counter_field(instance): delta})
+        if isinstance(instance, Message):
+            adjust_unread(instance, delta)
+
+
+@receiver(post_delete, sender=Notification)
+@receiver(post_delete, sender=Message)
+def track_unread_on_delete(sender, instance, **kwargs):
+    owner = unread_owner(instance)
+    if owner is not None and instance._loaded_is_read is False:
+        counters.adjust(owner, **{counter_field(instance): -1})
+        if isinstance(instance, Message):
+            adjust_unread(instance, -1)
+
+
+@receiver(post_delete, sender=Design)
+def tombstone_design(sender, instance, **kwargs):
+    record_deletion(instance, [instance.designer_id])
+
+
+@receiver(post_delete, sender=Booking)
+def tombstone_booking(sender, instance, **kwargs):
+    # By id: when the design itself is being deleted its cached instance may be stale
+    designer_id = Design.objects.filter(pk=instance.design_id).values_list('designer_id', flat=True).first()
+    record_deletion(instance, [instance.client_id, designer_id])
+
+
+@receiver(post_delete, sender=Notification)
+def tombstone_notification(sender, instance, **kwargs):
+    record_deletion(instance, [instance.user_id])
+
+
+@receiver(post_delete, sender=Message)
+def tombstone_message(sender, instance, **kwargs):
+    record_deletion(instance, [instance.sender_id, instance.receiver_id])
+
+
+def payment_state(payment):
+    return {
+        'booking_id': payment.__dict__.get('booking_id'),
+        'successful': payment.__dict__.get('successful'),
+        'amount': payment.__dict__.get('amount'),
+        'paid_at': payment.__dict__.get('paid_at'),
+    }
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_status(sender, instance, **kwargs):
+    instance._rollup_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Booking)
+def roll_up_booking(sender, instance, created, **kwargs):
+    previous, instance._rollup_status = instance._rollup_status, instance.status
+    deltas = Deltas()
+    if created:
+        deltas.booking(instance, instance.status, 1)
+    elif previous is not None and previous != instance.status:
+        deltas.booking(instance, previous, -1)
+        deltas.booking(instance, instance.status, 1)
+    deltas.apply()
+
+
+@receiver(post_delete, sender=Booking)
+def roll_up_booking_deletion(sender, instance, **kwargs):
+    deltas = Deltas()
+    deltas.booking(instance, instance._rollup_status or instance.status, -1)
+    deltas.apply(create=False)
+
+
+@receiver(post_init, sender=Payment)
+def remember_payment_state(sender, instance, **kwargs):
+    instance._rollup_state = payment_state(instance)
+
+
+@receiver(post_save, sender=Payment)
+def roll_up_payment(sender, instance, created, **kwargs):
+    previous, instance._rollup_state = instance._rollup_state, payment_state(instance)
+    if not created and previous == instance._rollup_state:
+        return
+    deltas = Deltas()
+    if not created:
+        deltas.payment(**previous, sign=-1)
+    deltas.payment(**instance._rollup_state, sign=1)
+    deltas.apply()
+
+
+@receiver(post_delete, sender=Payment)
+def roll_up_payment_deletion(sender, instance, **kwargs):
+    deltas = Deltas()
+    deltas.payment(**instance._rollup_state, sign=-1)
+    deltas.apply(create=False)
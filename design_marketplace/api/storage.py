@@ -0,0 +1,124 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .images import delete_derivatives
+from .models import ContentBlob
+
+HASH_ALGORITHM = 'sha256'
+
+
+def hash_upload(upload):
+    """Hashes a Django File chunk by chunk, so large uploads never sit in memory whole."""
+    digest = hashlib.new(HASH_ALGORITHM)
+    size = 0
+    for chunk in upload.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    upload.seek(0)
+    return digest.hexdigest(), size
+
+
+def blob_name(digest, original_name):
+    ext = os.path.splitext(original_name or '')[1].lower()
+    return posixpath.join('blobs', digest[:2], digest[2:4], f'{digest}{ext}')
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded files.
+
+    Identical uploads resolve to one file named after its SHA-256, tracked by a
+    ContentBlob row whose `ref_count` says how many model fields point at it.
+    The file is only removed when the last reference is released.
+    """
+
+    def __init__(self, storage=None):
+        self._storage = storage
+
+    @property
+    def storage(self):
+        return self._storage or default_storage
+
+    def acquire(self, upload):
+        digest, size = hash_upload(upload)
+        name = blob_name(digest, upload.name)
+        with transaction.atomic():
+            blob = ContentBlob.objects.select_for_update().filter(digest=digest).first()
+            if blob is None:
+                try:
+                    with transaction.atomic():
+                        blob = ContentBlob.objects.create(digest=digest, name=name, size=size, ref_count=0)
+                except IntegrityError:
+                    # Another request stored the same content first
+                    blob = ContentBlob.objects.select_for_update().get(digest=digest)
+            if not self.storage.exists(blob.name):
+                saved = self.storage.save(blob.name, upload)
+                if saved != blob.name:
+                    # Lost a race on the file itself; keep the canonical copy
+                    self.storage.delete(saved)
+            ContentBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        return blob.name
+
+    def acquire_many(self, uploads):
+        """
+        `acquire` for a batch in a constant number of queries: one lookup of the
+        known digests, one bulk insert of the new ones, one ref_count update.
+        Returns the stored names in upload order.
+        """
+        hashed = [(upload,) + hash_upload(upload) for upload in uploads]
+        counts = {}
+        for _, digest, _ in hashed:
+            counts[digest] = counts.get(digest, 0) + 1
+        with transaction.atomic():
+            blobs = ContentBlob.objects.select_for_update().in_bulk(list(counts), field_name='digest')
+            missing = {}
+            for upload, digest, size in hashed:
+                if digest not in blobs and digest not in missing:
+                    missing[digest] = ContentBlob(
+                        digest=digest, name=blob_name(digest, upload.name), size=size, ref_count=0,
+                    )
+            if missing:
+                ContentBlob.objects.bulk_create(missing.values(), ignore_conflicts=True)
+                # Re-read: a concurrent upload may have won a digest with another name
+                blobs = ContentBlob.objects.select_for_update().in_bulk(list(counts), field_name='digest')
+            stored = set()
+            for upload, digest, _ in hashed:
+                name = blobs[digest].name
+                if name not in stored and not self.storage.exists(name):
+                    saved = self.storage.save(name, upload)
+                    if saved != name:
+                        self.storage.delete(saved)
+                stored.add(name)
+            ContentBlob.objects.filter(digest__in=list(counts)).update(ref_count=F('ref_count') + Case(
+                *[When(digest=digest, then=Value(count)) for digest, count in counts.items()],
+                output_field=IntegerField(),
+            ))
+        return [blobs[digest].name for _, digest, _ in hashed]
+
+    def release(self, name):
+        if not name:
+            return
+        with transaction.atomic():
+            blob = ContentBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                # Files uploaded before content addressing are not reference counted
+                return
+            if blob.ref_count > 1:
+                ContentBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            blob.delete()
+            transaction.on_commit(lambda: self._delete_file(name))
+
+    def _delete_file(self, name):
+        if ContentBlob.objects.filter(name=name).exists():
+            return
+        self.storage.delete(name)
+        delete_derivatives(name, storage=self.storage)
+
+
+blob_store = BlobStore()
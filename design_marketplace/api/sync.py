@@ -0,0 +1,146 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import Booking, Design, Message, Notification, Tombstone
+from .serializers import BookingSerializer, DesignSerializer, MessageSerializer, NotificationSerializer
+
+TOKEN_VERSION = 1
+
+
+def user_designs(user):
+    return Design.objects.select_related('designer').filter(designer=user)
+
+
+def user_bookings(user):
+    return Booking.objects.filter(Q(client=user) | Q(design__designer=user))
+
+
+def user_notifications(user):
+    return Notification.objects.select_related('user').filter(user=user)
+
+
+def user_messages(user):
+    return Message.objects.select_related('sender', 'receiver', 'design__designer').filter(
+        Q(sender=user) | Q(receiver=user)
+    )
+
+
+# kind -> (rows visible to the user, serializer); the kind names are also the tombstone kinds
+SOURCES = {
+    'designs': (user_designs, DesignSerializer),
+    'bookings': (user_bookings, BookingSerializer),
+    'notifications': (user_notifications, NotificationSerializer),
+    'messages': (user_messages, MessageSerializer),
+}
+TOMBSTONE_KINDS = {
+    Design: 'designs',
+    Booking: 'bookings',
+    Notification: 'notifications',
+    Message: 'messages',
+}
+
+
+def record_deletion(instance, user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    Tombstone.objects.bulk_create([
+        Tombstone(user_id=user_id, kind=TOMBSTONE_KINDS[type(instance)], object_id=instance.pk)
+        for user_id in user_ids
+    ])
+
+
+def encode_token(positions):
+    payload = {'v': TOKEN_VERSION, 'pos': positions}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    """Per-source `(updated_at, id)` positions from a sync token; an empty dict for a first sync."""
+    if not token:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        if payload.get('v') != TOKEN_VERSION:
+            raise ValueError
+        positions = {}
+        for kind, (moment, pk) in payload['pos'].items():
+            moment = parse_datetime(moment)
+            if (kind not in SOURCES and kind != 'deleted') or moment is None:
+                raise ValueError
+            positions[kind] = (moment, int(pk))
+    except (TypeError, ValueError, KeyError, AttributeError, binascii.Error, UnicodeDecodeError):
+        raise ValidationError({'token': 'Invalid sync token.'})
+    return positions
+
+
+def after(position, field):
+    moment, pk = position
+    return Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': pk})
+
+
+def read_changes(queryset, field, position, upper, limit):
+    """
+    Rows changed after `position` and before `upper`, oldest first, and the
+    position to resume from. A full page resumes after its last row; otherwise
+    the source is drained and resumes at `upper`.
+    """
+    queryset = queryset.filter(**{f'{field}__lt': upper})
+    if position is not None:
+        queryset = queryset.filter(after(position, field))
+    rows = list(queryset.order_by(field, 'id')[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, (getattr(last, field), last.pk), True
+    return rows, (upper, 0), False
+
+
+def changes_since(user, token, context=None):
+    """
+    Everything the user's local store needs since `token`: changed rows per
+    source, deleted ids from tombstones, and the token for the next call.
+
+    Each source is read with a keyset over `(updated_at, id)`, so rows sharing
+    a timestamp are never skipped. Rows newer than SYNC_SETTLE_SECONDS are left
+    for the next call, giving transactions that started before the read time
+    to commit. `has_more` means a page filled up and the client should call
+    again straight away with the new token.
+    """
+    positions = decode_token(token)
+    limit = getattr(settings, 'SYNC_PAGE_SIZE', 200)
+    upper = timezone.now() - timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 1))
+    result = {}
+    new_positions = {}
+    has_more = False
+
+    for kind, (source, serializer_class) in SOURCES.items():
+        rows, position, truncated = read_changes(source(user), 'updated_at', positions.get(kind), upper, limit)
+        result[kind] = serializer_class(rows, many=True, context=context or {}).data
+        new_positions[kind] = position
+        has_more = has_more or truncated
+
+    deleted = {kind: [] for kind in SOURCES}
+    if positions:
+        tombstones, position, truncated = read_changes(
+            Tombstone.objects.filter(user_id=user.pk), 'deleted_at', positions.get('deleted'), upper, limit,
+        )
+        for tombstone in tombstones:
+            deleted[tombstone.kind].append(tombstone.object_id)
+        has_more = has_more or truncated
+    else:
+        # A first sync has nothing local to delete
+        position = (upper, 0)
+    new_positions['deleted'] = position
+    result['deleted'] = deleted
+
+    token = encode_token({kind: [moment.isoformat(), pk] for kind, (moment, pk) in new_positions.items()})
+    return {'token': token, 'has_more': has_more, **result}
@@ -0,0 +1,39 @@
+import json
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+
+from .images import refresh_design_variants
+from .jobs import task
+from .models import Booking, Notification
+
+
+@task('notify_designer_of_booking')
+def notify_designer_of_booking(booking_id):
+    booking = Booking.objects.select_related('client', 'design__designer').filter(pk=booking_id).first()
+    if booking is None:
+        return
+    # Jobs run at least once: a re-run finds the first notification
+    Notification.objects.get_or_create(dedupe_key=f'booking:{booking.pk}:created', defaults={
+        'user': booking.design.designer,
+        'message': f"New booking for your design '{booking.design.title}' by {booking.client.username}",
+    })
+
+
+@task('build_design_variants')
+def build_design_variants(design_id):
+    refresh_design_variants(design_id)
+
+
+@task('deliver_webhook')
+def deliver_webhook(url, event, data, event_id=None):
+    # A retried job POSTs again; receivers dedupe on the event id, which stays the same
+    headers = {'Content-Type': 'application/json'}
+    if event_id:
+        headers['X-Event-Id'] = event_id
+    body = json.dumps({'id': event_id, 'event': event, 'data': data}).encode('utf-8')
+    request = Request(url, data=body, headers=headers, method='POST')
+    timeout = getattr(settings, 'WEBHOOK_TIMEOUT', 5)
+    with urlopen(request, timeout=timeout) as response:
+        if response.status >= 300:
+            raise RuntimeError(f'Webhook answered {response.status}')
@@ -0,0 +1,26 @@
+import logging
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class StrictQueryBudgetRunner(DiscoverRunner):
+    """
+    Runs every test with QUERY_BUDGET_STRICT, so a query-budget overrun fails
+    the test that caused it. The `api` logger's handlers are swapped for a
+    NullHandler meanwhile, so expected errors don't print JSON lines over the
+    test output; tests that care about a record use assertLogs.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._budget_strict = settings.QUERY_BUDGET_STRICT
+        settings.QUERY_BUDGET_STRICT = True
+        logger = logging.getLogger('api')
+        self._api_handlers = logger.handlers[:]
+        logger.handlers = [logging.NullHandler()]
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGET_STRICT = self._budget_strict
+        logging.getLogger('api').handlers = self._api_handlers
+        super().teardown_test_environment(**kwargs)
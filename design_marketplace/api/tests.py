@@ -1,3 +1,1747 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from PIL import Image
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APITestCase
+
+from .cache import design_cache
+from .realtime import CLOSE, DatabasePollingBroker, InProcessBroker, get_broker
+from .jobs import TASKS, enqueue, task
+from .models import Booking, ContentBlob, Conversation, ConversationParticipant, DeadLetterJob, Design, DesignDailyStats, Job, DesignerProfile, Message, Notification, Payment, ReconciliationIssue, ReconciliationRun, Tombstone, UnreadCounter, User
+from .search import SearchBackend
+from .reconciliation import ReconciliationConflict, file_digest, process_chunk, read_settlements, reconcile
+from .logs import JSONFormatter, redact
+from .throttling import take
+from .authentication import CachedTokenAuthentication, cache_key, forget_user
+from .metrics import render_metrics
+from .benchmarks import SCENARIOS, compare, percentile, run, seed
+from .counters import recount
+
+
+def make_user(username, role=User.DESIGNER, **extra):
+    user = User(username=username, role=role, **extra)
+    user.set_unusable_password()
+    user.save()
+    return user
+
+
+def make_design(designer, title='Design', price='100.00', **extra):
+    extra.setdefault('image', 'design_images/sample.png')
+    extra.setdefault('description', 'A design')
+    return Design.objects.create(designer=designer, title=title, price=price, **extra)
+
+
+class DesignFeedTests(APITestCase):
+    def setUp(self):
+        self.designer = make_user('designer')
+        now = timezone.now()
+        self.designs = []
+        for i in range(25):
+            design = make_design(self.designer, title=f'Design {i}')
+            self.designs.append(design)
+        # Put several rows on the same timestamp so the id tie-breaker matters
+        for i, design in enumerate(self.designs):
+            Design.objects.filter(pk=design.pk).update(created_at=now - timedelta(minutes=i // 4))
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_feed_visits_every_design_once_in_order(self):
+        ids = self.walk('/api/designs/feed/?page_size=7')
+        expected = list(
+            Design.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_deep_page_costs_the_same_as_first_page(self):
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get('/api/designs/feed/?page_size=5')
+        next_url = response.data['next']
+        for _ in range(3):
+            next_url = self.client.get(next_url).data['next']
+        with CaptureQueriesContext(connection) as deep_page:
+            self.client.get(next_url)
+        self.assertEqual(len(deep_page), len(first_page))
+        sql = deep_page.captured_queries[0]['sql'].upper()
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT(', sql)
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/designs/feed/?cursor=not-a-cursor').status_code, 404)
+        self.assertEqual(self.client.get('/api/designs/feed/?cursor=WyJ4IiwiMSJd').status_code, 404)
+
+
+class QueryBudgetTests(APITestCase):
+    """Every endpoint must stay within its declared budget however many rows it returns."""
+
+    def setUp(self):
+        self.designer = make_user('designer')
+        self.client_user = make_user('client', role=User.CLIENT)
+        DesignerProfile.objects.create(user=self.designer, bio='Bio')
+        for i in range(6):
+            other = make_user(f'other{i}', role=User.CLIENT)
+            DesignerProfile.objects.create(user=other)
+            design = make_design(self.designer, title=f'Design {i}')
+            Message.objects.create(sender=other, receiver=self.designer, design=design, content='Hi')
+            Message.objects.create(sender=self.designer, receiver=other, design=design, content='Hello')
+            booking = Booking.objects.create(client=other, design=design, negotiated_price='90.00')
+            Payment.objects.create(booking=booking, amount='90.00', payment_method='card')
+            Notification.objects.create(user=self.designer, message=f'Booking {i}')
+        token = Token.objects.create(user=self.designer)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def assertConstantQueries(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        results = response.data.get('results', response.data)
+        if isinstance(results, list):
+            self.assertGreater(len(results), 1, url)
+        return response
+
+    def test_list_endpoints_stay_within_budget(self):
+        for url in ['/api/users/', '/api/designer-profiles/', '/api/designs/', '/api/designs/feed/',
+                    '/api/messages/', '/api/bookings/', '/api/payments/', '/api/notifications/']:
+            self.assertConstantQueries(url)
+
+    def test_detail_endpoints_stay_within_budget(self):
+        urls = [
+            f'/api/designs/{Design.objects.first().pk}/',
+            f'/api/messages/{Message.objects.first().pk}/',
+            f'/api/payments/{Payment.objects.first().pk}/',
+            f'/api/notifications/{Notification.objects.first().pk}/',
+            f'/api/designer-profiles/{DesignerProfile.objects.first().pk}/',
+        ]
+        for url in urls:
+            self.assertConstantQueries(url)
+
+    def test_budget_overrun_is_reported(self):
+        from .querybudget import QueryBudgetExceeded
+        from .views import MessageViewSet
+
+        original = MessageViewSet.queryset
+        MessageViewSet.queryset = Message.objects.all()
+        try:
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/messages/')
+        finally:
+            MessageViewSet.queryset = original
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False)
+class DesignCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.designer = make_user('designer', first_name='Ada')
+        self.design = make_design(self.designer, title='Car against a bright wall')
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get('/api/designs/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        # Only the conditional-GET validator aggregate runs
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/designs/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        stats = design_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_design_save_invalidates_list_and_detail(self):
+        url = f'/api/designs/{self.design.pk}/'
+        self.client.get('/api/designs/')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.design.title = 'Renamed'
+            self.design.save()
+        self.assertEqual(self.client.get(url).data['title'], 'Renamed')
+        self.assertEqual(self.client.get('/api/designs/').data['results'][0]['title'], 'Renamed')
+
+    def test_designer_rename_invalidates_nested_block(self):
+        self.client.get('/api/designs/')
+        self.designer.first_name = 'Grace'
+        self.designer.save()
+        response = self.client.get('/api/designs/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['designer']['first_name'], 'Grace')
+
+    def test_login_timestamp_does_not_invalidate(self):
+        self.client.get('/api/designs/')
+        self.designer.last_login = timezone.now()
+        self.designer.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get('/api/designs/')['X-Cache'], 'HIT')
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.designer = make_user('designer')
+        self.design = make_design(self.designer)
+        Notification.objects.create(user=self.designer, message='Booked')
+        self.client.force_authenticate(self.designer)
+
+    def test_matching_etag_returns_304_without_serializing(self):
+        first = self.client.get('/api/designs/')
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/designs/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertFalse(second.content)
+
+    def test_if_modified_since_on_detail(self):
+        url = f'/api/designs/{self.design.pk}/'
+        first = self.client.get(url)
+        second = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_if_modified_since_sees_deletes_and_salt_changes(self):
+        make_design(self.designer, title='Second')
+        first = self.client.get('/api/designs/')
+        later = timezone.now() + timedelta(seconds=5)
+        with mock.patch('api.conditional.timezone.now', return_value=later):
+            Design.objects.latest('id').delete()
+            response = self.client.get('/api/designs/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+            self.assertEqual(response.status_code, 200)
+            unchanged = self.client.get('/api/designs/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(unchanged.status_code, 304)
+        with mock.patch('api.conditional.timezone.now', return_value=later + timedelta(seconds=5)):
+            design_cache.invalidate()
+            response = self.client.get('/api/designs/', HTTP_IF_MODIFIED_SINCE=unchanged['Last-Modified'])
+            self.assertEqual(response.status_code, 200)
+
+    def test_malformed_pk_is_404(self):
+        for url in ['/api/designs/abc/', '/api/notifications/abc/']:
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_update_and_delete_change_the_etag(self):
+        etag = self.client.get('/api/notifications/')['ETag']
+        notification = Notification.objects.get()
+        notification.is_read = True
+        notification.save()
+        changed = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        Notification.objects.create(user=self.designer, message='Another')
+        etag = self.client.get('/api/notifications/')['ETag']
+        Notification.objects.latest('id').delete()
+        self.assertEqual(self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_bookings_list_supports_etag(self):
+        client = make_user('client', role=User.CLIENT)
+        Booking.objects.create(client=client, design=self.design)
+        self.client.force_authenticate(client)
+        etag = self.client.get('/api/bookings/')['ETag']
+        self.assertEqual(self.client.get('/api/bookings/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+def png_upload(name='artwork.png', size=(1600, 900), color=(200, 30, 30)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False)
+class ImageDerivativeTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.designer = make_user('designer')
+
+    def test_upload_builds_variants_and_exposes_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            design = make_design(self.designer, image=png_upload())
+        design.refresh_from_db()
+        for fmt in ('webp', 'jpeg'):
+            for width in (320, 640, 1080):
+                name = design.image_variants[fmt][f'{width}w']
+                self.assertTrue(default_storage.exists(name))
+                with default_storage.open(name) as fh, Image.open(fh) as image:
+                    self.assertEqual(image.width, width)
+        srcset = self.client.get(f'/api/designs/{design.pk}/').data['image_srcset']
+        self.assertTrue(srcset['webp']['320w'].startswith('http://testserver/'))
+        self.assertTrue(srcset['jpeg']['1080w'].endswith('1080w.jpeg'))
+
+    def test_backfill_command_is_idempotent(self):
+        design = make_design(self.designer, image=png_upload(size=(500, 500)))
+        Design.objects.filter(pk=design.pk).update(image_variants={})
+        call_command('generate_image_derivatives', stdout=StringIO())
+        design.refresh_from_db()
+        name = design.image_variants['webp']['1080w']
+        modified = default_storage.get_modified_time(name)
+        with default_storage.open(name) as fh, Image.open(fh) as image:
+            # Small originals are not upscaled
+            self.assertEqual(image.width, 500)
+        call_command('generate_image_derivatives', stdout=StringIO())
+        self.assertEqual(default_storage.get_modified_time(name), modified)
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False)
+class ContentBlobTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.designer = make_user('designer')
+        self.client.force_authenticate(self.designer)
+
+    def upload(self, **kwargs):
+        payload = {'title': 'Poster', 'description': 'Red', 'price': '10.00', 'image': png_upload(**kwargs)}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/designs/', payload, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Design.objects.get(pk=response.data['id'])
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.upload(name='a.png')
+        second = self.upload(name='b.png')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('blobs/'))
+        blob = ContentBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.name, first.image.name)
+
+    def test_file_removed_only_with_last_reference(self):
+        first = self.upload()
+        second = self.upload()
+        name = first.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(ContentBlob.objects.get().ref_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(ContentBlob.objects.exists())
+
+    def test_replacing_image_releases_previous_blob(self):
+        design = self.upload(color=(0, 0, 255))
+        old_name = design.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/designs/{design.pk}/', {'image': png_upload(color=(0, 255, 0))}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(ContentBlob.objects.get().name, Design.objects.get().image.name)
+
+
+class DesignSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.designer = make_user('designer')
+        self.other = make_user('other')
+        self.car = make_design(self.designer, title='Car against a bright wall', price='250.00')
+        self.wall = make_design(self.other, title='Mural', description='A bright wall painting', price='80.00')
+        self.logo = make_design(self.designer, title='Logo', description='Minimal mark', features='vector')
+
+    def search(self, query):
+        response = self.client.get('/api/designs/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.search('car against a bright wall'), [self.car.pk, self.wall.pk])
+        self.assertEqual(self.search('vect'), [self.logo.pk])
+
+    def test_index_follows_save_and_delete(self):
+        self.logo.title = 'Bright logo'
+        self.logo.save()
+        self.assertIn(self.logo.pk, self.search('bright'))
+        self.wall.delete()
+        self.assertNotIn(self.wall.pk, self.search('bright'))
+
+    def test_backend_without_search_cannot_be_created(self):
+        class Incomplete(SearchBackend):
+            pass
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_filters_and_cursor_pagination(self):
+        response = self.client.get('/api/designs/search/', {'q': 'bright', 'max_price': '100'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.wall.pk])
+        response = self.client.get('/api/designs/search/', {'q': 'bright', 'designer': self.designer.pk})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.car.pk])
+
+        for i in range(5):
+            make_design(self.other, title=f'Bright poster {i}')
+        ids, url = [], '/api/designs/search/?q=bright&page_size=2'
+        while url:
+            response = self.client.get(url)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(len(set(ids)), 7)
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search('"car" AND (wall OR'), [self.car.pk, self.wall.pk])
+        self.assertEqual(self.client.get('/api/designs/search/').status_code, 400)
+
+
+class DesignFilterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.ada = make_user('ada')
+        self.bob = make_user('bob')
+        now = timezone.now()
+        prices = [('ada', '20.00', 40), ('ada', '75.00', 20), ('ada', '300.00', 5), ('bob', '120.00', 10),
+                  ('bob', '900.00', 1)]
+        self.designs = {}
+        for owner, price, age in prices:
+            design = make_design(getattr(self, owner), title=f'{owner} {price}', price=price)
+            Design.objects.filter(pk=design.pk).update(created_at=now - timedelta(days=age))
+            self.designs[price] = design.pk
+
+    def ids(self, params, url='/api/designs/'):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['id'] for item in response.data['results']]
+
+    def test_price_designer_and_date_filters(self):
+        self.assertEqual(
+            self.ids({'min_price': '50', 'max_price': '300', 'ordering': 'price'}),
+            [self.designs['75.00'], self.designs['120.00'], self.designs['300.00']],
+        )
+        self.assertEqual(
+            self.ids({'designer': self.bob.pk, 'ordering': '-price'}),
+            [self.designs['900.00'], self.designs['120.00']],
+        )
+        since = (timezone.now() - timedelta(days=12)).date().isoformat()
+        self.assertEqual(
+            self.ids({'created_after': since, 'ordering': 'newest'}),
+            [self.designs['900.00'], self.designs['300.00'], self.designs['120.00']],
+        )
+
+    def test_feed_keyset_follows_requested_ordering(self):
+        ids, url = [], '/api/designs/feed/?ordering=-price&page_size=2'
+        while url:
+            response = self.client.get(url)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        expected = [self.designs[p] for p in ('900.00', '300.00', '120.00', '75.00', '20.00')]
+        self.assertEqual(ids, expected)
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'min_price': 'cheap'}, {'ordering': 'random'}, {'created_after': 'yesterday'}):
+            self.assertEqual(self.client.get('/api/designs/', params).status_code, 400)
+
+    def test_facets_are_counted_in_sql(self):
+        with self.assertNumQueries(2):
+            facets = self.client.get('/api/designs/facets/').data
+        self.assertEqual(facets['total'], 5)
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 1, 1, 1, 1])
+        self.assertEqual(
+            [(d['username'], d['count']) for d in facets['designers']], [('ada', 3), ('bob', 2)]
+        )
+        filtered = self.client.get('/api/designs/facets/', {'max_price': '100'}).data
+        self.assertEqual(filtered['designers'], [{'id': self.ada.pk, 'username': 'ada', 'count': 2}])
+
+
+@override_settings(NOTIFICATION_BROKER='api.realtime.InProcessBroker')
+class NotificationStreamTests(TestCase):
+    def make_fixture(self):
+        user = make_user('designer')
+        token = Token.objects.create(user=user)
+        seen = Notification.objects.create(user=user, message='Seen')
+        missed = Notification.objects.create(user=user, message='Missed while offline')
+        return user, token.key, seen, missed
+
+    async def test_stream_replays_missed_rows_then_pushes_live(self):
+        user, key, seen, missed = await sync_to_async(self.make_fixture)()
+        response = await self.async_client.get(
+            '/api/notifications/stream/',
+            headers={'Authorization': f'Token {key}', 'Last-Event-ID': str(seen.pk)},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertIn(f'id: {missed.pk}'.encode(), await anext(stream))
+
+        get_broker().publish(user.pk, {'id': missed.pk + 1, 'message': 'Live'})
+        live = await anext(stream)
+        payload = json.loads(live.decode().split('data: ')[1])
+        self.assertEqual(payload['message'], 'Live')
+        await stream.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_REPLAY_LIMIT=2)
+    async def test_replay_pages_through_the_whole_backlog(self):
+        user, key, seen, missed = await sync_to_async(self.make_fixture)()
+        backlog = [missed.pk] + [
+            (await sync_to_async(Notification.objects.create)(user=user, message=f'Missed {i}')).pk for i in range(4)
+        ]
+        response = await self.async_client.get(
+            '/api/notifications/stream/',
+            headers={'Authorization': f'Token {key}', 'Last-Event-ID': str(seen.pk)},
+        )
+        stream = response.streaming_content
+        await anext(stream)
+        replayed = [int((await anext(stream)).split(b'\n')[0][4:]) for _ in backlog]
+        self.assertEqual(replayed, backlog)
+        await stream.aclose()
+
+    async def test_stream_requires_token(self):
+        response = await self.async_client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(NOTIFICATION_STREAM_QUEUE_SIZE=2)
+    async def test_slow_consumer_is_disconnected(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(1)
+        for i in range(3):
+            broker.publish(1, {'id': i})
+        await asyncio.sleep(0)
+        self.assertTrue(subscription.overflowed)
+        self.assertIs(await subscription.get(), CLOSE)
+
+    @override_settings(NOTIFICATION_POLL_INTERVAL=0.01)
+    async def test_polling_broker_starts_from_the_head(self):
+        user, _, seen, missed = await sync_to_async(self.make_fixture)()
+        broker = DatabasePollingBroker()
+        broker._last_id = seen.pk - 1  # left over from an earlier poll loop
+        subscription = broker.subscribe(user.pk)
+        await asyncio.sleep(0.05)
+        self.assertTrue(subscription.queue.empty())
+        live = await sync_to_async(Notification.objects.create)(user=user, message='Live')
+        event = await asyncio.wait_for(subscription.get(), 1)
+        self.assertEqual(event['id'], live.pk)
+        broker.unsubscribe(subscription)
+        await asyncio.wait_for(broker._poller, 1)
+
+    @override_settings(NOTIFICATION_POLL_INTERVAL=0.01)
+    async def test_polling_broker_moves_past_rows_nobody_is_watching(self):
+        user, _, seen, missed = await sync_to_async(self.make_fixture)()
+        watcher = await sync_to_async(make_user)('watcher')
+        broker = DatabasePollingBroker()
+        watching = broker.subscribe(watcher.pk)
+        await asyncio.sleep(0.05)
+        unwatched = await sync_to_async(Notification.objects.create)(user=user, message='Nobody connected')
+        await asyncio.sleep(0.05)
+        self.assertEqual(broker._last_id, unwatched.pk)
+
+        late = broker.subscribe(user.pk)
+        await asyncio.sleep(0.05)
+        self.assertTrue(late.queue.empty())
+        broker.unsubscribe(watching)
+        broker.unsubscribe(late)
+        await asyncio.wait_for(broker._poller, 1)
+
+    def test_created_notification_is_published_after_commit(self):
+        user = make_user('designer')
+        published = []
+        broker = get_broker()
+        original, broker.publish = broker.publish, lambda user_id, event: published.append((user_id, event))
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                notification = Notification.objects.create(user=user, message='New booking')
+        finally:
+            broker.publish = original
+        self.assertEqual(published, [(user.pk, {
+            'id': notification.pk, 'message': 'New booking', 'is_read': False,
+            'created_at': notification.created_at.isoformat(),
+        })])
+
+
+class JobQueueTests(APITestCase):
+    def setUp(self):
+        self.designer = make_user('designer')
+        self.client_user = make_user('client', role=User.CLIENT)
+        self.design = make_design(self.designer, title='Poster')
+        Job.objects.all().delete()
+        self.calls = []
+
+    def register(self, name, func):
+        task(name)(func)
+        self.addCleanup(TASKS.pop, name)
+
+    def test_booking_enqueues_notification_instead_of_creating_it(self):
+        self.client.force_authenticate(self.client_user)
+        response = self.client.post('/api/bookings/', {'design': self.design.pk, 'notes': 'Soon'})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Notification.objects.exists())
+        job = Job.objects.get()
+        self.assertEqual((job.task, job.status), ('notify_designer_of_booking', Job.QUEUED))
+
+        call_command('run_workers', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.user, self.designer)
+        self.assertIn("'Poster' by client", notification.message)
+
+    def test_idempotency_key_deduplicates(self):
+        self.register('record', lambda value: self.calls.append(value))
+        first = enqueue('record', {'value': 1}, idempotency_key='once')
+        second = enqueue('record', {'value': 2}, idempotency_key='once')
+        self.assertEqual(first.pk, second.pk)
+        call_command('run_workers', '--once', stdout=StringIO())
+        self.assertEqual(self.calls, [1])
+
+    def test_failures_back_off_then_dead_letter(self):
+        def explode():
+            raise RuntimeError('provider down')
+        self.register('explode', explode)
+        job = enqueue('explode', max_attempts=2)
+
+        call_command('run_workers', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('provider down', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        call_command('run_workers', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        dead = DeadLetterJob.objects.get()
+        self.assertEqual((dead.job_id, dead.attempts, dead.task), (job.pk, 2, 'explode'))
+
+    def test_handlers_run_outside_a_transaction(self):
+        depth = len(connection.atomic_blocks)
+        self.register('record', lambda value: self.calls.append(len(connection.atomic_blocks)))
+        job = enqueue('record', {'value': 1})
+        call_command('run_workers', '--once', stdout=StringIO())
+        self.assertEqual(self.calls, [depth])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_stale_running_jobs_are_requeued(self):
+        self.register('record', lambda value: self.calls.append(value))
+        job = enqueue('record', {'value': 3})
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, locked_by='dead-worker', locked_at=timezone.now() - timedelta(hours=1)
+        )
+        call_command('run_workers', '--once', stdout=StringIO())
+        self.assertEqual(self.calls, [3])
+
+    @override_settings(BOOKING_WEBHOOK_URL='https://hooks.example.com/bookings')
+    def test_booking_jobs_are_safe_to_run_twice(self):
+        self.client.force_authenticate(self.client_user)
+        booking_id = self.client.post('/api/bookings/', {'design': self.design.pk}).data['id']
+        with mock.patch('api.tasks.urlopen') as urlopen:
+            urlopen.return_value.__enter__.return_value.status = 200
+            for _ in range(2):
+                # As after a crash before the DONE mark, or a lease that ran out
+                Job.objects.update(status=Job.QUEUED)
+                call_command('run_workers', '--once', stdout=StringIO())
+        self.assertEqual(Notification.objects.filter(user=self.designer).count(), 1)
+        requests = [call.args[0] for call in urlopen.call_args_list]
+        self.assertEqual(len(requests), 2)
+        event_ids = {request.get_header('X-event-id') for request in requests}
+        self.assertEqual(event_ids, {f'booking:{booking_id}:created'})
+
+
+class ConversationTests(APITestCase):
+    def setUp(self):
+        self.designer = make_user('designer')
+        self.clients = [make_user(f'client{i}', role=User.CLIENT) for i in range(3)]
+        self.design = make_design(self.designer, title='Poster')
+
+    def send(self, sender, receiver, content):
+        self.client.force_authenticate(sender)
+        response = self.client.post('/api/messages/', {
+            'sender_id': sender.pk, 'receiver_id': receiver.pk, 'design_id': self.design.pk, 'content': content,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return Message.objects.get(pk=response.data['id'])
+
+    def test_messages_share_one_thread_per_pair_and_design(self):
+        client = self.clients[0]
+        first = self.send(client, self.designer, 'Hi')
+        reply = self.send(self.designer, client, 'Hello!')
+        self.assertEqual(first.conversation_id, reply.conversation_id)
+        conversation = Conversation.objects.get()
+        self.assertEqual((conversation.last_message_id, conversation.last_message_preview), (reply.pk, 'Hello!'))
+        unread = dict(ConversationParticipant.objects.values_list('user__username', 'unread_count'))
+        self.assertEqual(unread, {'designer': 1, 'client0': 1})
+
+    def test_inbox_is_ordered_by_latest_activity_and_paginated(self):
+        for client in self.clients:
+            self.send(client, self.designer, f'From {client.username}')
+        self.send(self.clients[0], self.designer, 'Bump')
+
+        self.client.force_authenticate(self.designer)
+        response = self.client.get('/api/conversations/?page_size=2')
+        rows = response.data['results']
+        self.assertEqual([row['participant']['username'] for row in rows], ['client0', 'client2'])
+        self.assertEqual(rows[0]['last_message_preview'], 'Bump')
+        self.assertEqual(rows[0]['unread_count'], 2)
+        rest = self.client.get(response.data['next']).data['results']
+        self.assertEqual([row['participant']['username'] for row in rest], ['client1'])
+
+    def test_thread_history_and_mark_read(self):
+        client = self.clients[0]
+        for i in range(5):
+            self.send(client, self.designer, f'Message {i}')
+        conversation = Conversation.objects.get()
+
+        self.client.force_authenticate(self.designer)
+        url = f'/api/conversations/{conversation.pk}/messages/?page_size=3'
+        first = self.client.get(url).data
+        second = self.client.get(first['next']).data
+        contents = [m['content'] for m in first['results'] + second['results']]
+        self.assertEqual(contents, [f'Message {i}' for i in range(4, -1, -1)])
+
+        self.assertEqual(self.client.post(f'/api/conversations/{conversation.pk}/read/').status_code, 204)
+        self.assertFalse(Message.objects.filter(is_read=False).exists())
+        self.assertEqual(self.client.get(f'/api/conversations/{conversation.pk}/').data['unread_count'], 0)
+
+    def test_outsiders_cannot_read_a_thread(self):
+        self.send(self.clients[0], self.designer, 'Private')
+        conversation = Conversation.objects.get()
+        self.client.force_authenticate(self.clients[1])
+        self.assertEqual(self.client.get(f'/api/conversations/{conversation.pk}/messages/').status_code, 404)
+
+
+class UnreadCounterTests(APITestCase):
+    def setUp(self):
+        self.designer = make_user('designer')
+        self.client_user = make_user('client', role=User.CLIENT)
+        self.design = make_design(self.designer)
+
+    def counters(self, user):
+        counter = UnreadCounter.objects.get(user=user)
+        return {'notifications': counter.notifications, 'messages': counter.messages}
+
+    def message(self, sender, receiver, **extra):
+        return Message.objects.create(sender=sender, receiver=receiver, design=self.design, content='Hi', **extra)
+
+    def test_counters_follow_creates_reads_and_deletes(self):
+        notes = [Notification.objects.create(user=self.designer, message=f'N{i}') for i in range(3)]
+        self.message(self.client_user, self.designer)
+        self.message(self.designer, self.client_user)
+        self.message(self.designer, self.designer)
+        self.assertEqual(self.counters(self.designer), {'notifications': 3, 'messages': 1})
+        self.assertEqual(self.counters(self.client_user), {'notifications': 0, 'messages': 1})
+
+        notes[0].is_read = True
+        notes[0].save()
+        notes[0].save()
+        notes[1].delete()
+        Notification.objects.get(pk=notes[0].pk).delete()
+        self.assertEqual(self.counters(self.designer), {'notifications': 1, 'messages': 1})
+
+    def test_thread_unread_count_follows_saves_and_deletes(self):
+        messages = [self.message(self.client_user, self.designer) for _ in range(3)]
+        self.message(self.client_user, self.designer, is_read=True)
+        entry = ConversationParticipant.objects.get(user=self.designer)
+        self.assertEqual(entry.unread_count, 3)
+
+        messages[0].is_read = True
+        messages[0].save()
+        messages[1].delete()
+        Message.objects.get(pk=messages[0].pk).delete()
+        entry.refresh_from_db()
+        self.assertEqual((entry.unread_count, self.counters(self.designer)['messages']), (1, 1))
+
+    def test_bulk_mark_read_is_a_single_update(self):
+        notes = [Notification.objects.create(user=self.designer, message=f'N{i}') for i in range(4)]
+        other = Notification.objects.create(user=self.client_user, message='Not yours')
+        self.client.force_authenticate(self.designer)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/notifications/mark-read/', {'up_to_id': notes[1].pk})
+        self.assertEqual(response.data, {'updated': 2, 'notifications': 2, 'messages': 0})
+        notification_updates = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('UPDATE') and 'api_notification' in q['sql']
+        ]
+        self.assertEqual(len(notification_updates), 1)
+
+        response = self.client.post('/api/notifications/mark-read/')
+        self.assertEqual(response.data['updated'], 2)
+        self.assertFalse(Notification.objects.filter(user=self.designer, is_read=False).exists())
+        other.refresh_from_db()
+        self.assertFalse(other.is_read)
+
+    def test_marking_messages_read_updates_the_inbox(self):
+        for _ in range(3):
+            self.message(self.client_user, self.designer)
+        self.client.force_authenticate(self.designer)
+        response = self.client.post('/api/messages/mark-read/')
+        self.assertEqual(response.data, {'updated': 3, 'notifications': 0, 'messages': 0})
+        entry = ConversationParticipant.objects.get(user=self.designer)
+        self.assertEqual(entry.unread_count, 0)
+
+    def test_marking_many_threads_read_is_constant_queries(self):
+        designs = [make_design(self.designer, title=f'D{i}') for i in range(8)]
+        for design in designs:
+            for _ in range(2):
+                Message.objects.create(sender=self.client_user, receiver=self.designer, design=design, content='Hi')
+        reply = self.message(self.designer, self.client_user)
+        self.client.force_authenticate(self.designer)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/messages/mark-read/')
+        self.assertEqual(response.data['updated'], 16)
+        inbox_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "api_conversationparticipant"')]
+        self.assertEqual(len(inbox_updates), 1)
+        self.assertLessEqual(len(ctx.captured_queries), 7)
+        self.assertEqual(set(ConversationParticipant.objects.filter(user=self.designer)
+                             .values_list('unread_count', flat=True)), {0})
+        self.assertEqual(ConversationParticipant.objects.get(
+            conversation_id=reply.conversation_id, user=self.client_user).unread_count, 1)
+
+    def test_conversation_read_clears_the_badge(self):
+        message = self.message(self.client_user, self.designer)
+        self.client.force_authenticate(self.designer)
+        self.client.post(f'/api/conversations/{message.conversation_id}/read/')
+        self.assertEqual(self.counters(self.designer)['messages'], 0)
+
+    def test_counters_endpoint_reads_one_row(self):
+        Notification.objects.create(user=self.designer, message='Hello')
+        self.client.force_authenticate(self.designer)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/me/counters/')
+        self.assertEqual(response.data, {'notifications': 1, 'messages': 0})
+
+    def test_missing_counter_row_is_rebuilt(self):
+        Notification.objects.create(user=self.designer, message='Hello')
+        UnreadCounter.objects.filter(user=self.designer).delete()
+        Notification.objects.create(user=self.designer, message='Again')
+        self.assertEqual(self.counters(self.designer), {'notifications': 2, 'messages': 0})
+
+
+class BookingAvailabilityTests(APITestCase):
+    def setUp(self):
+        self.designer = make_user('designer')
+        self.clients = [make_user(f'client{i}', role=User.CLIENT) for i in range(2)]
+        self.design = make_design(self.designer)
+        self.day = date.today() + timedelta(days=40)
+
+    def book(self, client, day):
+        self.client.force_authenticate(client)
+        return self.client.post('/api/bookings/', {'design': self.design.pk, 'booking_date': day.isoformat()})
+
+    def test_second_booking_for_the_same_date_conflicts(self):
+        self.assertEqual(self.book(self.clients[0], self.day).status_code, 201)
+        response = self.book(self.clients[1], self.day)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['detail'].code, 'date_unavailable')
+        self.assertEqual(self.book(self.clients[1], self.day + timedelta(days=1)).status_code, 201)
+
+    def test_cancelling_frees_the_date(self):
+        self.book(self.clients[0], self.day)
+        Booking.objects.update(status=Booking.CANCELLED)
+        self.assertEqual(self.book(self.clients[1], self.day).status_code, 201)
+
+    def test_calendar_lists_taken_dates_in_one_range_query(self):
+        self.book(self.clients[0], self.day)
+        Booking.objects.create(client=self.clients[1], design=self.design, booking_date=self.day + timedelta(days=1),
+                               status=Booking.CANCELLED)
+        month = self.day.strftime('%Y-%m')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/designs/{self.design.pk}/availability/?month={month}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['taken'], [self.day.isoformat()])
+        days = {day['date']: day['available'] for day in response.data['days']}
+        self.assertFalse(days[self.day.isoformat()])
+        self.assertEqual(len(days), len([d for d in days if d.startswith(month)]))
+        booking_queries = [q['sql'] for q in ctx.captured_queries if 'api_booking' in q['sql']]
+        self.assertEqual(len(booking_queries), 1)
+        self.assertIn('BETWEEN', booking_queries[0])
+
+    def test_calendar_rejects_a_bad_month(self):
+        response = self.client.get(f'/api/designs/{self.design.pk}/availability/?month=2026-13')
+        self.assertEqual(response.status_code, 400)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    def test_racing_clients_get_one_booking(self):
+        designer = make_user('designer')
+        clients = [make_user(f'client{i}', role=User.CLIENT) for i in range(8)]
+        design = make_design(designer)
+        day = (date.today() + timedelta(days=10)).isoformat()
+        barrier = threading.Barrier(len(clients))
+        statuses = []
+
+        def book(user):
+            api = APIClient()
+            api.force_authenticate(user)
+            try:
+                barrier.wait()
+                statuses.append(api.post('/api/bookings/', {'design': design.pk, 'booking_date': day}).status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=book, args=(user,)) for user in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses.count(201), 1, statuses)
+        self.assertEqual(len(statuses), len(clients))
+        self.assertEqual(Booking.objects.filter(design=design, booking_date=day).count(), 1)
+
+
+@override_settings(API_BATCH_MAX_SIZE=5)
+class BatchEndpointTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.designer = make_user('designer')
+        self.client_user = make_user('client', role=User.CLIENT)
+
+    def test_batch_create_designs_shares_one_transaction(self):
+        self.client.force_authenticate(self.designer)
+        items = [
+            {'title': f'Poster {i}', 'description': 'Art', 'price': '10.00', 'image': f'file{i}'} for i in range(5)
+        ]
+        files = {f'file{i}': png_upload(name=f'p{i}.png', color=(i, 0, 0)) for i in range(5)}
+        response = self.client.post('/api/designs/batch/', {'items': json.dumps(items), **files}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([row['title'] for row in response.data['results']], [f'Poster {i}' for i in range(5)])
+        self.assertEqual(ContentBlob.objects.count(), 5)
+        self.assertEqual(Job.objects.filter(task='build_design_variants').count(), 5)
+
+        items[1]['price'] = 'free'
+        files = {f'file{i}': png_upload(name=f'q{i}.png') for i in range(5)}
+        response = self.client.post('/api/designs/batch/', {'items': json.dumps(items), **files}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertEqual(Design.objects.count(), 5)
+
+    def test_batch_update_designs_only_touches_own_rows(self):
+        mine = [make_design(self.designer, title=f'Mine {i}') for i in range(3)]
+        theirs = make_design(make_user('other'), title='Theirs')
+        self.client.force_authenticate(self.designer)
+        items = [{'id': design.pk, 'price': '42.00'} for design in mine]
+        response = self.client.patch('/api/designs/batch/', items, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(set(Design.objects.filter(price='42.00').values_list('pk', flat=True)),
+                         {design.pk for design in mine})
+        self.assertTrue(all(
+            design.updated_at > original.updated_at
+            for design, original in zip(Design.objects.filter(pk__in=[d.pk for d in mine]).order_by('pk'), mine)
+        ))
+
+        response = self.client.patch('/api/designs/batch/', [{'id': theirs.pk, 'price': '1.00'}], format='json')
+        self.assertEqual(response.data['errors'], [{'index': 0, 'errors': {'id': ['Not found.']}}])
+
+    def test_batch_size_is_enforced(self):
+        self.client.force_authenticate(self.designer)
+        response = self.client.patch('/api/designs/batch/', [{'id': i} for i in range(6)], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+        self.assertEqual(self.client.get('/api/designs/batch/?ids=1,2,3,4,5,6').status_code, 400)
+
+    def test_multi_get_keeps_the_requested_order(self):
+        designs = [make_design(self.designer, title=f'D{i}') for i in range(3)]
+        ids = f'{designs[2].pk},999,{designs[0].pk}'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/designs/batch/?ids={ids}')
+        self.assertEqual([row['title'] for row in response.data['results']], ['D2', 'D0'])
+        self.assertEqual(response.data['missing'], [999])
+        self.assertEqual(len([q for q in ctx.captured_queries if 'api_design' in q['sql']]), 1)
+
+    def test_designer_confirms_bookings_in_one_request(self):
+        design = make_design(self.designer)
+        bookings = [Booking.objects.create(client=self.client_user, design=design) for _ in range(3)]
+        self.client.force_authenticate(self.designer)
+        items = [{'id': booking.pk, 'status': Booking.CONFIRMED} for booking in bookings]
+        response = self.client.patch('/api/bookings/batch/', items, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Booking.objects.filter(status=Booking.CONFIRMED).count(), 3)
+
+        self.client.force_authenticate(self.client_user)
+        response = self.client.patch('/api/bookings/batch/', items[:1], format='json')
+        self.assertEqual(response.data['errors'][0]['errors'], {'id': ['Not found.']})
+
+    def test_notification_batches_keep_counters_in_step(self):
+        admin = make_user('admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        items = [{'user_id': self.client_user.pk, 'message': f'N{i}'} for i in range(3)]
+        items.append({'user_id': self.designer.pk, 'message': 'Hello'})
+        response = self.client.post('/api/notifications/batch/', items, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(UnreadCounter.objects.get(user=self.client_user).notifications, 3)
+        self.assertEqual(UnreadCounter.objects.get(user=self.designer).notifications, 1)
+
+        self.client.force_authenticate(self.client_user)
+        self.assertEqual(self.client.post('/api/notifications/batch/', items, format='json').status_code, 403)
+        ids = list(Notification.objects.filter(user=self.client_user).values_list('pk', flat=True))
+        response = self.client.patch(
+            '/api/notifications/batch/', [{'id': pk, 'is_read': True} for pk in ids[:2]], format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(UnreadCounter.objects.get(user=self.client_user).notifications, 1)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0, SYNC_PAGE_SIZE=2)
+class DeltaSyncTests(APITestCase):
+    def setUp(self):
+        self.designer = make_user('designer')
+        self.client_user = make_user('client', role=User.CLIENT)
+        self.client.force_authenticate(self.designer)
+
+    def sync(self, token=None):
+        url = '/api/sync/' + (f'?token={token}' if token else '')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def drain(self, token=None):
+        # Follows has_more the way the app does; returns merged ids per source
+        seen = {}
+        while True:
+            data = self.sync(token)
+            token = data['token']
+            for kind in ('designs', 'bookings', 'notifications', 'messages'):
+                seen.setdefault(kind, []).extend(row['id'] for row in data[kind])
+            for kind, ids in data['deleted'].items():
+                seen.setdefault(f'deleted_{kind}', []).extend(ids)
+            if not data['has_more']:
+                return seen, token
+
+    def test_first_sync_returns_everything_then_nothing(self):
+        design = make_design(self.designer)
+        booking = Booking.objects.create(client=self.client_user, design=design)
+        message = Message.objects.create(sender=self.client_user, receiver=self.designer, design=design, content='Hi')
+        notification = Notification.objects.create(user=self.designer, message='Hello')
+        make_design(make_user('other'))
+
+        seen, token = self.drain()
+        self.assertEqual(seen['designs'], [design.pk])
+        self.assertEqual(seen['bookings'], [booking.pk])
+        self.assertEqual(seen['messages'], [message.pk])
+        self.assertEqual(seen['notifications'], [notification.pk])
+        data = self.sync(token)
+        self.assertEqual(
+            [data[kind] for kind in ('designs', 'bookings', 'notifications', 'messages')], [[], [], [], []]
+        )
+
+    def test_updates_and_deletes_since_the_token(self):
+        design = make_design(self.designer)
+        kept, dropped = [Notification.objects.create(user=self.designer, message=f'N{i}') for i in range(2)]
+        _, token = self.drain()
+
+        kept.is_read = True
+        kept.save()
+        dropped_id, design_id = dropped.pk, design.pk
+        dropped.delete()
+        design.delete()
+        seen, _ = self.drain(token)
+        self.assertEqual(seen['notifications'], [kept.pk])
+        self.assertEqual(seen['deleted_notifications'], [dropped_id])
+        self.assertEqual(seen['deleted_designs'], [design_id])
+        self.assertFalse(Tombstone.objects.filter(user_id=self.client_user.pk).exists())
+
+    def test_rows_sharing_a_timestamp_are_paged_without_gaps(self):
+        Notification.objects.bulk_create([Notification(user=self.designer, message=f'N{i}') for i in range(5)])
+        _, token = self.drain()
+        mark = self.client.post('/api/notifications/mark-read/')
+        self.assertEqual(mark.data['updated'], 5)
+        seen, _ = self.drain(token)
+        self.assertEqual(sorted(seen['notifications']),
+                         sorted(Notification.objects.values_list('pk', flat=True)))
+        self.assertEqual(len(seen['notifications']), 5)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        design = make_design(self.designer)
+        for i in range(2):
+            Message.objects.create(sender=self.client_user, receiver=self.designer, design=design, content=f'{i}')
+        _, token = self.drain()
+        with self.assertNumQueries(5):
+            self.sync(token)
+
+    def test_bad_token_is_rejected(self):
+        response = self.client.get('/api/sync/?token=nonsense')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('token', response.data)
+
+
+class DashboardRollupTests(APITestCase):
+    def setUp(self):
+        self.designer = make_user('designer')
+        self.client_user = make_user('client', role=User.CLIENT)
+        self.poster = make_design(self.designer, title='Poster')
+        self.logo = make_design(self.designer, title='Logo')
+
+    def snapshot(self):
+        fields = ('design_id', 'day', 'bookings_pending', 'bookings_confirmed', 'bookings_cancelled',
+                  'payments', 'revenue')
+        return sorted(DesignDailyStats.objects.values_list(*fields))
+
+    def make_activity(self):
+        bookings = [Booking.objects.create(client=self.client_user, design=self.poster) for _ in range(3)]
+        logo_booking = Booking.objects.create(client=self.client_user, design=self.logo)
+        bookings[0].status = Booking.CONFIRMED
+        bookings[0].save()
+        bookings[1].status = Booking.CANCELLED
+        bookings[1].save()
+        payment = Payment.objects.create(booking=bookings[0], amount='120.00', payment_method='card')
+        payment.successful = True
+        payment.paid_at = timezone.now()
+        payment.save()
+        Payment.objects.create(booking=logo_booking, amount='30.00', payment_method='card', successful=True)
+        return bookings
+
+    def test_rollup_follows_status_changes_and_payments(self):
+        self.make_activity()
+        today = timezone.localdate()
+        poster = DesignDailyStats.objects.get(design=self.poster, day=today)
+        self.assertEqual(
+            (poster.bookings_pending, poster.bookings_confirmed, poster.bookings_cancelled, poster.payments),
+            (1, 1, 1, 1),
+        )
+        self.assertEqual(str(poster.revenue), '120.00')
+
+    def test_incremental_rollup_matches_a_rebuild(self):
+        bookings = self.make_activity()
+        bookings[2].delete()
+        Payment.objects.filter(amount='30.00').get().delete()
+        incremental = self.snapshot()
+        call_command('rebuild_dashboard_rollups', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_batch_status_changes_are_rolled_up(self):
+        bookings = [Booking.objects.create(client=self.client_user, design=self.poster) for _ in range(2)]
+        self.client.force_authenticate(self.designer)
+        self.client.patch('/api/bookings/batch/', [
+            {'id': booking.pk, 'status': Booking.CONFIRMED} for booking in bookings
+        ], format='json')
+        stats = DesignDailyStats.objects.get(design=self.poster)
+        self.assertEqual((stats.bookings_pending, stats.bookings_confirmed), (0, 2))
+
+    def test_dashboard_reads_only_the_rollup(self):
+        self.make_activity()
+        self.client.force_authenticate(self.designer)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all('api_booking' not in q['sql'] and 'api_payment' not in q['sql']
+                            for q in ctx.captured_queries))
+        self.assertEqual(response.data['totals']['revenue'], '150.00')
+        self.assertEqual(response.data['totals']['bookings'], {'pending': 2, 'confirmed': 1, 'cancelled': 1})
+        self.assertEqual([row['title'] for row in response.data['top_designs']], ['Poster', 'Logo'])
+        self.assertEqual(len(response.data['daily']), 1)
+
+        self.client.force_authenticate(self.client_user)
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 403)
+
+
+
+class CachedTokenAuthTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('designer')
+        self.user.set_password('secret-pass')
+        self.user.save()
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def token_queries(self, url='/api/me/counters/'):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q for q in ctx.captured_queries if 'authtoken_token' in q['sql']]
+
+    def test_repeat_requests_skip_the_token_lookup(self):
+        response, queries = self.token_queries()
+        self.assertEqual((response.status_code, len(queries)), (200, 1))
+        response, queries = self.token_queries()
+        self.assertEqual((response.status_code, len(queries)), (200, 0))
+
+    def test_deactivation_and_logout_take_effect_at_once(self):
+        self.token_queries()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.token_queries()[0].status_code, 403)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.token_queries()[0].status_code, 403)
+
+    def test_cache_hit_costs_no_query_and_holds_no_secrets(self):
+        auth = CachedTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, _ = auth.authenticate_credentials(self.token.key)
+            self.assertEqual((user.pk, user.username, user.role), (self.user.pk, 'designer', self.user.role))
+            self.assertTrue(user.is_authenticated)
+        entry = cache.get(cache_key(self.token.key))
+        self.assertNotIn('password', entry['user'])
+        self.assertNotIn(self.user.password, repr(entry))
+        # Fields outside the snapshot load on access rather than reading as blank
+        self.assertEqual(user.email, self.user.email)
+
+    def test_role_and_password_changes_retire_cached_snapshots(self):
+        auth = CachedTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+        self.user.role = User.CLIENT
+        self.user.save(update_fields=['role'])
+        self.assertEqual(auth.authenticate_credentials(self.token.key)[0].role, User.CLIENT)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        forget_user(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            auth.authenticate_credentials(self.token.key)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+        forget_user(self.user.pk)
+        auth.authenticate_credentials(self.token.key)
+        self.user.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+            auth.authenticate_credentials(self.token.key)
+
+    @override_settings(AUTH_TOKEN_TTL=3600)
+    def test_expired_tokens_are_rejected_and_replaced_at_login(self):
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(hours=2))
+        response = self.token_queries()[0]
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['detail'], 'Token has expired.')
+
+        self.client.credentials()
+        response = self.client.post('/api-token-auth/', {'username': 'designer', 'password': 'secret-pass'})
+        self.assertNotEqual(response.data['token'], self.token.key)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.data["token"]}')
+        self.assertEqual(self.token_queries()[0].status_code, 200)
+
+    def test_rotation_retires_the_old_key(self):
+        self.token_queries()
+        new_key = self.client.post('/api/token/rotate/').data['token']
+        self.assertEqual(self.token_queries()[0].status_code, 403)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {new_key}')
+        self.assertEqual(self.token_queries()[0].status_code, 200)
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_allows_bursts_and_refills(self):
+        with mock.patch('api.throttling.time.time', return_value=1000.0) as clock:
+            self.assertEqual([take('bucket', 2, 10) for _ in range(3)], [0, 0, 5.0])
+            clock.return_value = 1005.0
+            self.assertEqual(take('bucket', 2, 10), 0)
+            self.assertEqual(take('bucket', 2, 10), 5.0)
+            clock.return_value = 1100.0
+            self.assertEqual([take('bucket', 2, 10) for _ in range(3)], [0, 0, 5.0])
+
+    @override_settings(API_THROTTLE_RATES={'register': '2/min'})
+    def test_registration_is_throttled_per_ip_with_retry_after(self):
+        responses = [self.client.post('/api/register/', {}, format='json') for _ in range(3)]
+        self.assertEqual([r.status_code for r in responses], [400, 400, 429])
+        self.assertEqual(responses[2]['Retry-After'], '30')
+
+        admin = make_user('admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.client.get('/api/throttle-stats/').data, {'register': 1})
+
+    @override_settings(API_THROTTLE_RATES={'login': '2/min'})
+    def test_spoofed_forwarded_for_does_not_reset_the_login_bucket(self):
+        statuses = [
+            self.client.post('/api-token-auth/', {'username': 'x', 'password': 'y'}, format='json',
+                             HTTP_X_FORWARDED_FOR=f'198.51.100.{i}').status_code
+            for i in range(4)
+        ]
+        self.assertEqual(statuses, [400, 400, 429, 429])
+
+    @override_settings(API_THROTTLE_RATES={'booking_create': '1/min'})
+    def test_booking_creation_is_throttled_per_user(self):
+        design = make_design(make_user('designer'))
+        first, second = make_user('c1', role=User.CLIENT), make_user('c2', role=User.CLIENT)
+        for user, expected in [(first, 201), (first, 429), (second, 201)]:
+            self.client.force_authenticate(user)
+            response = self.client.post('/api/bookings/', {'design': design.pk}, format='json')
+            self.assertEqual(response.status_code, expected)
+        # Only creation is limited
+        self.assertEqual(self.client.get('/api/bookings/').status_code, 200)
+
+
+class StructuredLoggingTests(APITestCase):
+    def test_redaction_masks_credentials_at_any_depth(self):
+        data = {'username': 'ann', 'password': 'pw', 'headers': [{'Authorization': 'Token abc'}], 'auth_token': 'x'}
+        self.assertEqual(redact(data), {
+            'username': 'ann', 'password': '[REDACTED]', 'headers': [{'Authorization': '[REDACTED]'}],
+            'auth_token': '[REDACTED]',
+        })
+
+    def test_registration_logs_never_carry_the_password(self):
+        with self.assertLogs('api', 'DEBUG') as logs:
+            self.client.post('/api/register/', {
+                'username': 'ann', 'password': 'hunter2-secret', 'role': User.CLIENT,
+            }, format='json')
+        lines = [JSONFormatter().format(record) for record in logs.records]
+        self.assertTrue(any('"User registered"' in line for line in lines))
+        self.assertFalse(any('hunter2' in line for line in lines))
+
+    @override_settings(LOG_REQUEST_SAMPLE_RATE=1.0)
+    def test_one_line_per_request_with_timing_and_queries(self):
+        make_design(make_user('designer'))
+        with self.assertLogs('api.requests', 'INFO') as logs:
+            self.client.get('/api/designs/')
+        entry = json.loads(JSONFormatter().format(logs.records[-1]))
+        self.assertEqual((entry['method'], entry['path'], entry['status']), ('GET', '/api/designs/', 200))
+        self.assertGreater(entry['queries'], 0)
+        self.assertIn('duration_ms', entry)
+
+    @override_settings(LOG_REQUEST_SAMPLE_RATE=0.0, LOG_SLOW_REQUEST_MS=10000)
+    def test_unsampled_requests_are_not_logged(self):
+        with self.assertNoLogs('api.requests', 'INFO'):
+            self.client.get('/api/designs/')
+
+    def test_payload_dumps_only_when_enabled(self):
+        design = make_design(make_user('designer'))
+        with mock.patch('api.serializers.payload_logger.debug') as debug:
+            self.client.get(f'/api/designs/{design.pk}/')
+        debug.assert_not_called()
+        with self.assertLogs('api.payloads', 'DEBUG') as logs:
+            self.client.get(f'/api/designs/{design.pk}/?v=2')
+        self.assertEqual(logs.records[0].payload['title'], 'Design')
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.designer = make_user('designer')
+        self.client_user = make_user('client', role=User.CLIENT)
+        self.design = make_design(self.designer, title='Poster')
+        Message.objects.create(sender=self.client_user, receiver=self.designer, design=self.design, content='Hi')
+        Booking.objects.create(client=self.client_user, design=self.design)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response, ' '.join(q['sql'] for q in ctx.captured_queries)
+
+    def test_fields_limit_both_the_payload_and_the_query(self):
+        response, sql = self.get('/api/designs/feed/?fields=id,title')
+        self.assertEqual(response.json()['results'], [{'id': self.design.pk, 'title': 'Poster'}])
+        self.assertNotIn('api_user', sql)
+        self.assertNotIn('"api_design"."description"', sql)
+
+    def test_expand_chooses_which_relations_are_nested(self):
+        self.client.force_authenticate(self.designer)
+        message = self.get('/api/messages/?expand=design')[0].json()['results'][0]
+        self.assertEqual((message['sender'], message['receiver']), (self.client_user.pk, self.designer.pk))
+        self.assertEqual(message['design']['designer']['username'], 'designer')
+
+        response, sql = self.get('/api/designs/?expand=')
+        self.assertEqual(response.json()['results'][0]['designer'], self.designer.pk)
+        self.assertNotIn('api_user', sql)
+
+        booking = self.get('/api/bookings/?fields=id,design&expand=design')[0].json()['results'][0]
+        self.assertEqual(set(booking), {'id', 'design'})
+        self.assertEqual(booking['design']['title'], 'Poster')
+
+    def test_default_shape_is_unchanged(self):
+        response = self.client.get(f'/api/designs/{self.design.pk}/')
+        self.assertEqual(response.json()['designer']['username'], 'designer')
+        self.assertIn('image_srcset', response.json())
+
+    def test_fast_renderer_matches_drf_byte_for_byte(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        data = self.client.get('/api/designs/').data
+        extra = {'when': timezone.now(), 'day': date(2024, 1, 2), 'price': Decimal('9.50'),
+                 'text': 'caf\u00e9 \u2028 \u2029 \U0001f600', 'by_id': {1: 'one'}, 'none': None}
+        for payload in [data, extra]:
+            self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+
+class FlatSerializerContractTests(APITestCase):
+    """The flat list path must render exactly what the DRF serializers render."""
+
+    def setUp(self):
+        cache.clear()
+        self.designer = make_user('designer', first_name='Dee', email='dee@example.com',
+                                  profile_image='profile_images/dee.png')
+        other = make_user('other')
+        for i, price in enumerate(['12.5', '100', '7.99']):
+            design = make_design(self.designer if i % 2 == 0 else other, title=f'Caf\u00e9 {i}', price=price,
+                                 features='' if i else 'Vector')
+            Design.objects.filter(pk=design.pk).update(created_at=timezone.now() - timedelta(hours=i, microseconds=i))
+        Design.objects.filter(pk=design.pk).update(image_variants={
+            'source': design.image.name, 'webp': {'320w': 'derived/a.webp'}, 'jpeg': {'320w': 'derived/a.jpg'},
+        })
+        for i in range(3):
+            Notification.objects.create(user=self.designer, message=f'Note {i}', is_read=bool(i % 2))
+
+    def both(self, url):
+        cache.clear()
+        fast = self.client.get(url)
+        cache.clear()
+        with mock.patch('api.flat.FlatListMixin.use_flat', return_value=False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200, url)
+        return fast.content, slow.content
+
+    def test_design_lists_are_byte_identical(self):
+        for url in ['/api/designs/', '/api/designs/?ordering=price', '/api/designs/feed/?page_size=2',
+                    '/api/designs/?min_price=10']:
+            fast, slow = self.both(url)
+            self.assertEqual(fast, slow, url)
+        self.assertIn(b'derived/a.webp', self.both('/api/designs/')[0])
+
+    def test_notification_list_is_byte_identical(self):
+        self.client.force_authenticate(self.designer)
+        fast, slow = self.both('/api/notifications/')
+        self.assertEqual(fast, slow)
+        self.assertIn(b'profile_images/dee.png', fast)
+
+    def test_flat_list_is_one_query_for_the_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/designs/feed/')
+        self.assertEqual(len([q for q in ctx.captured_queries if 'FROM "api_design"' in q['sql']]), 1)
+
+
+@override_settings(METRICS_TOKEN='scrape')
+class MetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        make_design(make_user('designer'))
+
+    def test_requests_are_recorded_per_route(self):
+        self.client.get('/api/designs/')
+        body = self.client.get('/api/internal/metrics/', HTTP_AUTHORIZATION='Bearer scrape').content.decode()
+        self.assertIn('api_request_duration_seconds_bucket{method="GET",view="design-list",le="+Inf"}', body)
+        self.assertIn('api_requests_total{method="GET",view="design-list",status="200"}', body)
+        self.assertIn('api_db_queries_count{method="GET",view="design-list"}', body)
+        self.assertIn('api_db_duration_seconds_sum{method="GET",view="design-list"}', body)
+        self.assertIn('api_serializer_duration_seconds_sum{method="GET",view="design-list"}', body)
+        self.assertNotIn('/api/designs/', render_metrics())
+
+    def test_query_count_histogram(self):
+        def sample(name):
+            prefix = name + '{method="GET",view="design-list"'
+            lines = [line for line in render_metrics().splitlines() if line.startswith(prefix)]
+            return float(lines[0].rsplit(' ', 1)[1]) if lines else 0
+        count, queries = sample('api_db_queries_count'), sample('api_db_queries_sum')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/designs/')
+        self.assertEqual(sample('api_db_queries_count'), count + 1)
+        self.assertEqual(sample('api_db_queries_sum'), queries + len(ctx.captured_queries))
+
+    def test_metrics_are_internal(self):
+        url = '/api/internal/metrics/'
+        # Token-only by default: a local reverse proxy makes every client look like 127.0.0.1
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer caf\u00e9').status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/8']):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='10.1.2.3').status_code, 200)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.9').status_code, 403)
+        denied = self.client.get(url, REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(denied.status_code, 403)
+        response = self.client.get(url, REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        make_design(make_user('designer'))
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        override = override_settings(PROFILING_TOKEN='profile-me', PROFILE_DIR=self.profile_dir, PROFILE_KEEP=2)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_only_requests_with_the_token_are_profiled(self):
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/designs/'))
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/designs/', HTTP_X_PROFILE='guess'))
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/designs/', HTTP_X_PROFILE='caf\u00e9'))
+        self.assertEqual(os.listdir(self.profile_dir), [])
+        with override_settings(PROFILING_TOKEN=''):
+            self.assertNotIn('X-Profile-Id', self.client.get('/api/designs/', HTTP_X_PROFILE=''))
+
+    def test_profile_is_stored_for_download(self):
+        response = self.client.get('/api/designs/', HTTP_X_PROFILE='profile-me')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(os.listdir(self.profile_dir), [f'{profile_id}.prof'])
+
+        url = f'/api/internal/profiles/{profile_id}/'
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.9').status_code, 403)
+        download = self.client.get(url, HTTP_X_PROFILE='profile-me', REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(b''.join(download.streaming_content))
+        text = self.client.get(url + '?format=text', HTTP_X_PROFILE='profile-me').content.decode()
+        self.assertIn('cumulative', text)
+        for missing in ['/api/internal/profiles/../etc/', '/api/internal/profiles/%s/' % ('0' * 32)]:
+            self.assertEqual(self.client.get(missing, HTTP_X_PROFILE='profile-me').status_code, 404)
+
+    def test_old_profiles_are_pruned(self):
+        for _ in range(3):
+            self.client.get('/api/designs/', HTTP_X_PROFILE='profile-me')
+        self.assertEqual(len(os.listdir(self.profile_dir)), 2)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.designer = make_user('designer')
+        self.client_user = make_user('client', role=User.CLIENT)
+        design = make_design(self.designer, title='Poster')
+        other = make_design(make_user('other'), title='Not mine')
+        self.bookings = [Booking.objects.create(client=self.client_user, design=design, notes=f'n{i}')
+                         for i in range(5)]
+        Booking.objects.create(client=self.client_user, design=other)
+        Payment.objects.create(booking=self.bookings[0], amount='10.00', payment_method='card',
+                               successful=True, paid_at=timezone.now())
+        self.client.force_authenticate(self.designer)
+
+    def download(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_export_streams_only_the_designers_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            rows = list(csv.DictReader(self.download('/api/exports/bookings.csv', HTTP_ACCEPT='text/csv').splitlines()))
+        self.assertEqual([int(row['id']) for row in rows], [booking.pk for booking in self.bookings])
+        self.assertEqual(rows[0]['design_title'], 'Poster')
+        self.assertEqual(rows[0]['client_username'], 'client')
+        self.assertEqual(len([q for q in ctx.captured_queries if 'api_booking' in q['sql']]), 1)
+
+    def test_csv_cells_cannot_inject_formulas(self):
+        payloads = ['=HYPERLINK("http://evil")', '+1', '-2+3', '@SUM(A1)', '\tx']
+        for booking, notes in zip(self.bookings, payloads):
+            Booking.objects.filter(pk=booking.pk).update(notes=notes)
+        User.objects.filter(pk=self.client_user.pk).update(username='\r=cmd')
+        rows = list(csv.DictReader(StringIO(self.download('/api/exports/bookings.csv'), newline='')))
+        self.assertEqual([row['notes'] for row in rows], ["'" + notes for notes in payloads])
+        self.assertEqual(rows[0]['client_username'], "'\r=cmd")
+        self.assertEqual(rows[0]['id'], str(self.bookings[0].pk))
+
+    def test_export_resumes_after_the_last_seen_id(self):
+        url = f'/api/exports/bookings.ndjson?after_id={self.bookings[2].pk}'
+        rows = [json.loads(line) for line in self.download(url).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [b.pk for b in self.bookings[3:]])
+        self.assertEqual(rows[0]['status'], Booking.PENDING)
+
+    def test_payment_export_and_date_range(self):
+        rows = [json.loads(line) for line in self.download('/api/exports/payments.ndjson').splitlines()]
+        self.assertEqual([(row['booking_id'], row['amount']) for row in rows], [(self.bookings[0].pk, '10.00')])
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(self.download(f'/api/exports/payments.ndjson?from={tomorrow}'), '')
+        self.assertEqual(self.client.get('/api/exports/payments.csv?from=soon').status_code, 400)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_asgi_export_is_streamed_in_batches(self):
+        await self.async_client.aforce_login(self.designer)
+        response = await self.async_client.get('/api/exports/bookings.ndjson')
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+        rows = [json.loads(line) for line in b''.join(chunks).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [booking.pk for booking in self.bookings])
+
+    def test_clients_cannot_export(self):
+        self.client.force_authenticate(self.client_user)
+        self.assertEqual(self.client.get('/api/exports/bookings.csv').status_code, 403)
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        designer = make_user('designer')
+        client = make_user('client', role=User.CLIENT)
+        self.design = make_design(designer)
+        self.payments = []
+        for i, price in enumerate(['100.00', '50.00', '75.00']):
+            booking = Booking.objects.create(client=client, design=self.design, negotiated_price=price)
+            self.payments.append(Payment.objects.create(
+                booking=booking, amount=price, payment_method='card', transaction_id=f'tx-{i}',
+            ))
+
+    def settlement_file(self, rows):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False)
+        self.addCleanup(os.remove, handle.name)
+        with handle:
+            writer = csv.writer(handle)
+            writer.writerow(['transaction_id', 'amount', 'status', 'settled_at'])
+            writer.writerows(rows)
+        return handle.name
+
+    def test_matches_rows_and_records_issues(self):
+        path = self.settlement_file([
+            ['tx-0', '100.00', 'settled', '2024-03-01T10:00:00Z'],
+            ['tx-1', '45.00', 'settled', ''],
+            ['tx-9', '10.00', 'settled', ''],
+            ['tx-2', 'lots', 'settled', ''],
+        ])
+        with CaptureQueriesContext(connection) as ctx:
+            run = reconcile(path, chunk_size=10)
+        # One lookup and one bulk write for the whole chunk
+        self.assertEqual(len([q for q in ctx.captured_queries if 'FROM "api_payment"' in q['sql']]), 1)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "api_payment"')]), 1)
+        self.assertEqual(run.status, ReconciliationRun.COMPLETED)
+        self.assertEqual((run.rows_processed, run.matched, run.settled, run.unmatched, run.mismatched, run.invalid),
+                         (4, 2, 2, 1, 1, 1))
+        self.assertEqual(
+            sorted(run.issues.values_list('line_number', 'kind')),
+            [(2, ReconciliationIssue.AMOUNT_MISMATCH), (3, ReconciliationIssue.UNMATCHED),
+             (4, ReconciliationIssue.INVALID)],
+        )
+        self.assertEqual(list(Payment.objects.order_by('id').values_list('successful', flat=True)),
+                         [True, True, False])
+        self.assertEqual(str(DesignDailyStats.objects.get(day=date(2024, 3, 1)).revenue), '100.00')
+
+    def test_rerunning_a_file_is_a_no_op(self):
+        path = self.settlement_file([['tx-0', '100.00', 'settled', ''], ['tx-1', '50.00', 'refunded', '']])
+        first = reconcile(path)
+        self.assertEqual(reconcile(path).pk, first.pk)
+        again = reconcile(path, restart=True)
+        self.assertNotEqual(again.pk, first.pk)
+        self.assertEqual((again.settled, again.unchanged), (0, 2))
+        self.assertEqual(DesignDailyStats.objects.get().payments, 1)
+
+    def test_interrupted_run_resumes_after_the_committed_chunk(self):
+        path = self.settlement_file([[f'tx-{i}', price, 'settled', ''] for i, price in
+                                     enumerate(['100.00', '50.00', '75.00'])])
+        calls = []
+
+        def fail_second_chunk(run, chunk):
+            calls.append(chunk)
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+            process_chunk(run, chunk)
+
+        with mock.patch('api.reconciliation.process_chunk', side_effect=fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                reconcile(path, chunk_size=2)
+        run = ReconciliationRun.objects.get()
+        self.assertEqual((run.status, run.rows_processed, run.last_error), (ReconciliationRun.FAILED, 2, 'disk full'))
+
+        progress = []
+        run = reconcile(path, chunk_size=2, progress=lambda r: progress.append(r.rows_processed))
+        self.assertEqual(progress, [3])
+        # Counters cover the whole run; only the third row was read again
+        self.assertEqual((run.status, run.rows_processed, run.settled), (ReconciliationRun.COMPLETED, 3, 3))
+        self.assertEqual(Payment.objects.filter(successful=True).count(), 3)
+
+    def test_concurrent_runs_of_one_file_are_refused(self):
+        path = self.settlement_file([[f'tx-{i}', price, 'settled', ''] for i, price in
+                                     enumerate(['100.00', '50.00', '75.00'])])
+        rows = list(read_settlements(path))
+        run = ReconciliationRun.objects.create(file_name='s.csv', file_sha256=file_digest(path))
+        # Another process already committed the first chunk of this run
+        ReconciliationRun.objects.filter(pk=run.pk).update(rows_processed=2)
+        with self.assertRaises(ReconciliationConflict):
+            process_chunk(run, rows[:2])
+        self.assertFalse(Payment.objects.filter(successful=True).exists())
+
+        # Nor can a second running run of the file be opened beside it
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ReconciliationRun.objects.create(file_name='s.csv', file_sha256=file_digest(path))
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.rows_processed), (ReconciliationRun.RUNNING, 2))
+
+    def test_payments_are_read_after_the_chunk_is_claimed(self):
+        path = self.settlement_file([['tx-0', '100.00', 'settled', '']])
+        with CaptureQueriesContext(connection) as ctx:
+            reconcile(path)
+        sqls = [q['sql'] for q in ctx.captured_queries]
+        claim = next(i for i, sql in enumerate(sqls) if sql.startswith('UPDATE "api_reconciliationrun"'))
+        lookup = next(i for i, sql in enumerate(sqls) if 'FROM "api_payment"' in sql)
+        self.assertLess(claim, lookup)
+
+    def test_command_reports_progress(self):
+        path = self.settlement_file([['tx-0', '100.00', 'paid', '']])
+        out = StringIO()
+        call_command('reconcile_payments', path, '--chunk-size', '1', stdout=out)
+        self.assertIn('1 rows', out.getvalue())
+        self.assertIn('1 settled', out.getvalue())
+
+
+class BenchmarkTests(TestCase):
+    sizes = {'users': 10, 'designs': 8, 'bookings': 12, 'messages': 15, 'notifications': 20}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_keeps_derived_state_consistent(self):
+        inserted = seed(self.sizes, batch_size=4)
+        self.assertEqual(inserted['users'], 10)
+        self.assertEqual(Design.objects.count(), 8)
+        self.assertEqual(Message.objects.count(), 15)
+        self.assertEqual(inserted['conversations'], 3)
+        for user in User.objects.all():
+            counter = UnreadCounter.objects.filter(user=user).first()
+            expected = recount(user.pk)
+            self.assertEqual((getattr(counter, 'notifications', 0), getattr(counter, 'messages', 0)),
+                             (expected.notifications, expected.messages))
+        for conversation in Conversation.objects.all():
+            last = Message.objects.filter(conversation=conversation).latest('id')
+            self.assertEqual(conversation.last_message_id, last.pk)
+            self.assertEqual(conversation.last_message_preview, last.content[:140])
+            for participant in conversation.participants.all():
+                self.assertEqual(participant.unread_count, Message.objects.filter(
+                    conversation=conversation, receiver_id=participant.user_id, is_read=False,
+                ).count())
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark_data', '--scale', '20', stdout=StringIO())
+
+    def test_run_reports_every_scenario(self):
+        seed(self.sizes)
+        report = run(requests=5, concurrency=1, warmup=1)
+        self.assertEqual(set(report['scenarios']), set(SCENARIOS))
+        for name, result in report['scenarios'].items():
+            self.assertEqual(result['requests'], 5)
+            self.assertEqual(result['errors'], 0, (name, result['status_codes']))
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+        self.assertEqual(report['scenarios']['feed']['queries_per_request']['max'], 0)
+        self.assertEqual(report['scenarios']['booking_create']['status_codes'], {'201': 5})
+        json.dumps(report)
+
+    def test_run_needs_a_dataset(self):
+        with self.assertRaises(CommandError):
+            call_command('run_benchmarks', '--requests', '1', stdout=StringIO())
+
+    def test_compare_flags_regressions(self):
+        def report(p95, queries, errors=0, rps=100.0):
+            return {'scenarios': {'feed': {
+                'requests': 100, 'errors': errors, 'throughput_rps': rps,
+                'latency_ms': {'p50': 2.0, 'p95': p95}, 'queries_per_request': {'mean': queries, 'max': queries},
+            }}}
+        baseline = report(10.0, 2)
+        self.assertEqual(compare(report(11.5, 2), baseline), [])
+        self.assertEqual(compare(report(10.4, 2), report(8.0, 2), floor_ms=5), [])
+        self.assertEqual(compare(report(13.0, 3, errors=1, rps=50.0), baseline), [
+            'feed: p95 latency 10.00ms -> 13.00ms',
+            'feed: throughput 100.0/s -> 50.0/s',
+            'feed: queries per request 2 (max 2) -> 3 (max 3)',
+            'feed: error rate 0.0% -> 1.0%',
+        ])
+        self.assertEqual(compare({'scenarios': {'inbox': {}}}, baseline), [])
+
+    def test_percentiles_are_nearest_rank(self):
+        ordered = list(range(1, 101))
+        self.assertEqual([percentile(ordered, pct) for pct in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([7.0], 99), 7.0)
@@ -0,0 +1,132 @@
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger('api.throttling')
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60): a bucket of 10 requests that refills completely every 60 seconds."""
+    if not rate:
+        return None
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_THROTTLE_CACHE_ALIAS', 'default')]
+
+
+def stats_key(scope):
+    return f'throttle:stats:{scope}:throttled'
+
+
+def throttle_stats():
+    """Throttled request counts per configured scope since the counters were last evicted."""
+    scopes = sorted(getattr(settings, 'API_THROTTLE_RATES', {}))
+    counts = get_cache().get_many([stats_key(scope) for scope in scopes])
+    return {scope: counts.get(stats_key(scope), 0) for scope in scopes}
+
+
+def take(key, capacity, period):
+    """
+    Takes one token from the bucket at `key`; returns the seconds to wait, or 0 if allowed.
+
+    The bucket is kept as a GCRA "theoretical arrival time" in milliseconds,
+    which only ever moves through `incr`/`decr`. Those are atomic on locmem,
+    Redis and Memcached, so concurrent workers never lose an update the way a
+    get-then-set would. A full bucket is the same as a missing key, so the
+    key expires once it has had time to refill.
+    """
+    cache = get_cache()
+    now = int(time.time() * 1000)
+    interval = max(period * 1000 // capacity, 1)
+    timeout = period + 1
+    cache.add(key, now, timeout)
+    try:
+        arrival = cache.incr(key, interval)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, now + interval, timeout)
+        arrival = now + interval
+    if arrival < now + interval:
+        # The bucket refilled while idle; restart from now. A concurrent catch-up
+        # can overshoot, which only ever errs towards throttling.
+        arrival = cache.incr(key, now + interval - arrival)
+    excess = arrival - now - interval * capacity
+    if excess > 0:
+        cache.decr(key, interval)
+        return excess / 1000
+    cache.touch(key, timeout)
+    return 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token-bucket throttle configured per `scope` in API_THROTTLE_RATES, e.g.
+    {'login': '10/min'}: bursts of up to 10 requests, refilled at one every six
+    seconds. Scopes without a rate are not throttled. Throttled requests get a
+    429 with Retry-After and are counted for /api/throttle-stats/.
+    """
+    scope = None
+
+    def get_rate(self):
+        return parse_rate(getattr(settings, 'API_THROTTLE_RATES', {}).get(self.scope))
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        rate = self.get_rate()
+        if rate is None:
+            return True
+        key = f'throttle:{self.scope}:{self.get_cache_key(request, view)}'
+        self.delay = take(key, *rate)
+        if not self.delay:
+            return True
+        self.record()
+        logger.warning('Throttled %s request from %s (retry in %.1fs)', self.scope, key, self.delay)
+        return False
+
+    def record(self):
+        cache = get_cache()
+        key = stats_key(self.scope)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+    def wait(self):
+        return math.ceil(self.delay) if self.delay else None
+
+
+class IPRateThrottle(TokenBucketThrottle):
+    def get_cache_key(self, request, view):
+        return f'ip:{self.get_ident(request)}'
+
+
+class UserRateThrottle(TokenBucketThrottle):
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class LoginRateThrottle(IPRateThrottle):
+    scope = 'login'
+
+
+class RegisterRateThrottle(IPRateThrottle):
+    scope = 'register'
+
+
+class BookingCreateRateThrottle(UserRateThrottle):
+    scope = 'booking_create'
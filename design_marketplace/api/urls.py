@@ -1,22 +1,41 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from .views import (
     UserViewSet,
     DesignerProfileViewSet,
     DesignViewSet,
     MessageViewSet,
+    ConversationViewSet,
     PaymentViewSet,
     NotificationViewSet,
+    CountersView,
+    SyncView,
+    DashboardView,
+    ExportView,
+    ThrottleStatsView,
 )
+from .realtime import notification_stream
+from .metrics import metrics_view
+from .profiling import profile_view
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'designer-profiles', DesignerProfileViewSet)
 router.register(r'designs', DesignViewSet)
 router.register(r'messages', MessageViewSet)
+router.register(r'conversations', ConversationViewSet)
 router.register(r'payments', PaymentViewSet)
 router.register(r'notifications', NotificationViewSet)
 
 urlpatterns = [
+    # Must precede the router, whose notifications/<pk>/ route would match "stream"
+    path('notifications/stream/', notification_stream, name='notification-stream'),
+    path('me/counters/', CountersView.as_view(), name='me-counters'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('throttle-stats/', ThrottleStatsView.as_view(), name='throttle-stats'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    re_path(r'^exports/(?P<kind>bookings|payments)\.(?P<fmt>csv|ndjson)$', ExportView.as_view(), name='export'),
+    path('internal/metrics/', metrics_view, name='internal-metrics'),
+    path('internal/profiles/<str:profile_id>/', profile_view, name='internal-profile'),
     path('', include(router.urls)),
 ]
@@ -1,137 +1,337 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model, logout
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.db import IntegrityError, transaction
 from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
 from rest_framework import viewsets, permissions, status
 from rest_framework.views import APIView
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 
-from .models import DesignerProfile, Design, Message, Booking, Payment, Notification, User
+from .models import DesignerProfile, Design, Message, Booking, Payment, Notification, User, ConversationParticipant
 from .serializers import (
     UserSerializer, DesignerProfileSerializer, DesignSerializer,
-    MessageSerializer, BookingSerializer, PaymentSerializer, NotificationSerializer
+    MessageSerializer, BookingSerializer, PaymentSerializer, NotificationSerializer,
+    ConversationSerializer, ThreadMessageSerializer, NotificationBatchSerializer, NotificationReadSerializer,
+    BookingStatusSerializer
 )
+from . import counters
+from .authentication import issue_token, revoke_token, rotate_token
+from .batch import batch_items, bulk_apply, load_instances, parse_ids, validate_items
+from .bookings import DateUnavailable, month_calendar, parse_month, save_booking
+from .cache import design_cache
+from .conditional import ConditionalGetMixin
+from .conversations import mark_conversation_read
+from .counters import get_counters, mark_messages_read, mark_notifications_read
+from .exports import CONTENT_TYPES, CSVRenderer, NDJSONRenderer, STREAMS, export_filename, export_rows, stream_async
+from .fieldsets import sparse_queryset
+from .flat import FlatListMixin, design_flat, notification_flat
+from .filters import DesignFilterBackend, design_facets, parse_int, parse_moment
+from .images import schedule_design_variants
+from .jobs import enqueue
+from .pagination import DesignFeedPagination, InboxPagination, ThreadPagination
+from .querybudget import QueryBudgetMixin
+from .realtime import publish_notification
+from .rollups import Deltas, dashboard
+from .search import DesignSearchPagination
+from .storage import blob_store
+from .sync import changes_since
+from .throttling import BookingCreateRateThrottle, LoginRateThrottle, RegisterRateThrottle, throttle_stats
 
 User = get_user_model()
+logger = logging.getLogger('api.views')
 
 @method_decorator(csrf_exempt, name='dispatch')
 class CsrfExemptAuthToken(ObtainAuthToken):
+    # Password hashing makes each attempt expensive
+    throttle_classes = [LoginRateThrottle]
+
     def post(self, request, *args, **kwargs):
-        print("🔐 Login request received:", request.data)
-        response = super().post(request, *args, **kwargs)
-        print("🔐 Login response:", response.data)
-        return response
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Reuses the current token unless it has expired or is due for rotation
+        user = serializer.validated_data['user']
+        token = issue_token(user)
+        logger.info('Login succeeded', extra={'user_id': user.pk})
+        return Response({'token': token.key})
 
 class RegisterAPIView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterRateThrottle]
 
     def post(self, request):
-        print("📥 Registration data:", request.data)
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            token, _ = Token.objects.get_or_create(user=user)
-            print("✅ Registration successful for:", user.username)
+            token = issue_token(user)
+            logger.info('User registered', extra={'user_id': user.pk})
             return Response({
                 'user': UserSerializer(user).data,
                 'token': token.key,
             }, status=status.HTTP_201_CREATED)
-        print("❌ Registration failed with errors:", serializer.errors)
+        logger.info('Registration rejected', extra={'errors': serializer.errors})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class LogoutAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        print("🚪 Logging out user:", request.user.username)
-        request.user.auth_token.delete()
+        logger.info('User logged out', extra={'user_id': request.user.pk})
+        revoke_token(request.user)
         logout(request)
         return Response({'detail': 'Successfully logged out.'}, status=status.HTTP_200_OK)
 
-class UserViewSet(viewsets.ModelViewSet):
+class TokenRotateAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # The key used for this request stops working as soon as the new one is issued
+        token = rotate_token(request.user)
+        return Response({'token': token.key}, status=status.HTTP_200_OK)
+
+class UserViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 3, 'retrieve': 2}
 
-class DesignerProfileViewSet(viewsets.ModelViewSet):
-    queryset = DesignerProfile.objects.all()
+class DesignerProfileViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = DesignerProfile.objects.select_related('user')
     serializer_class = DesignerProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 3, 'retrieve': 2}
 
-class DesignViewSet(viewsets.ModelViewSet):
-    queryset = Design.objects.all()
+class DesignViewSet(FlatListMixin, ConditionalGetMixin, QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = Design.objects.select_related('designer')
     serializer_class = DesignSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    filter_backends = [DesignFilterBackend]
+    query_budget = {'list': 4, 'retrieve': 3, 'feed': 2, 'search': 3, 'facets': 4, 'availability': 2,
+                    'batch': 1, 'create_batch': 10, 'update_batch': 4}
+    # The list and feed pages are shaped from flat .values() rows
+    flat_serializer = design_flat
+    flat_actions = ('list', 'feed')
+
+    def get_queryset(self):
+        # ?fields=&expand= skip the designer join and unused columns; ordering columns stay loaded
+        return sparse_queryset(super().get_queryset(), DesignSerializer, self.request, keep=('created_at', 'price'))
+
+    def get_validator_salt(self):
+        # Designer edits change the nested `designer` block without touching updated_at
+        return design_cache.get_generation()
+
+    def cached_response(self, request, kind, render):
+        # Design payloads are the same for every user, so they are cached per URL
+        data = design_cache.get(request, kind)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        response = render()
+        if response.status_code == status.HTTP_200_OK:
+            design_cache.set(request, kind, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
 
     def list(self, request, *args, **kwargs):
-        print("📡 Design list requested by:", request.user)
         try:
-            response = super().list(request, *args, **kwargs)
-            print("✅ Designs fetched successfully")
+            response = self.cached_response(
+                request, 'list', lambda: super(DesignViewSet, self).list(request, *args, **kwargs)
+            )
             return response
         except Exception as e:
-            print("🔥 Failed to fetch designs:", str(e))
+            logger.exception('Failed to fetch designs')
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def retrieve(self, request, *args, **kwargs):
-        print(f"🔍 Retrieving Design with id={kwargs.get('pk')} for user={request.user}")
         try:
-            response = super().retrieve(request, *args, **kwargs)
-            print("✅ Design retrieved successfully")
+            response = self.cached_response(
+                request, 'detail', lambda: super(DesignViewSet, self).retrieve(request, *args, **kwargs)
+            )
             return response
         except Exception as e:
-            print("🔥 Failed to retrieve design:", str(e))
+            logger.info('Failed to retrieve design', extra={'design_id': kwargs.get('pk'), 'error': str(e)})
             return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
 
+    @action(detail=False, methods=['get'], pagination_class=DesignFeedPagination)
+    def feed(self, request):
+        # Infinite-scroll feed: newest first, keyset cursors, no total count
+        def render():
+            queryset = self.filter_queryset(self.get_queryset())
+            if self.use_flat():
+                return self.flat_list(queryset)
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        return self.cached_response(request, 'feed', render)
+
+    @action(detail=False, methods=['get'], pagination_class=DesignSearchPagination)
+    def search(self, request):
+        # Ranked full-text search over title/description/features: ?q=&min_price=&max_price=&designer=
+        self.search_query = request.query_params.get('q', '').strip()
+        if not self.search_query:
+            return Response({'q': ['This query parameter is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        # Price buckets and top designers for the same filters the list accepts
+        def render():
+            return Response(design_facets(self.filter_queryset(self.get_queryset())))
+        return self.cached_response(request, 'facets', render)
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        # Multi-get: ?ids=3,1,2 returns those designs in the order asked, plus the ids that don't exist
+        ids = parse_ids(request.query_params.get('ids'))
+        def render():
+            found = self.get_queryset().in_bulk(ids)
+            serializer = self.get_serializer([found[pk] for pk in ids if pk in found], many=True)
+            return Response({'results': serializer.data, 'missing': [pk for pk in ids if pk not in found]})
+        return self.cached_response(request, 'batch', render)
+
+    @batch.mapping.post
+    def create_batch(self, request):
+        # Multipart: `items` is a JSON array whose `image` values name the uploaded file parts
+        items = batch_items(request.data, request.FILES, file_fields=['image'])
+        serializers = validate_items(self.get_serializer_class(), items, self.get_serializer_context())
+        with transaction.atomic():
+            images = blob_store.acquire_many([serializer.validated_data['image'] for serializer in serializers])
+            designs = Design.objects.bulk_create([
+                Design(**{**serializer.validated_data, 'image': image}, designer=request.user)
+                for serializer, image in zip(serializers, images)
+            ])
+            # bulk_create sends no post_save, so do the signal handlers' work here
+            schedule_design_variants(*[design.pk for design in designs])
+            design_cache.invalidate()
+        return Response({'results': self.get_serializer(designs, many=True).data}, status=status.HTTP_201_CREATED)
+
+    @batch.mapping.patch
+    def update_batch(self, request):
+        items = batch_items(request.data)
+        instances = load_instances(self.get_queryset().filter(designer=request.user), items)
+        serializers = validate_items(self.get_serializer_class(), items, self.get_serializer_context(), instances)
+        with transaction.atomic():
+            designs = bulk_apply(Design, serializers)
+            design_cache.invalidate()
+        return Response({'results': self.get_serializer(designs, many=True).data})
+
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        # Month calendar of free/taken dates: ?month=YYYY-MM (defaults to the current month)
+        year, month = parse_month(request.query_params.get('month'))
+        design = self.get_object()
+        return Response(month_calendar(design.pk, year, month))
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        return Response(design_cache.stats())
+
     def perform_create(self, serializer):
-        print("🛠 Creating Design for user:", self.request.user)
         try:
-            serializer.save(designer=self.request.user)
-            print("✅ Design created successfully")
-        except Exception as e:
-            print("🔥 Failed to create design:", str(e))
+            with transaction.atomic():
+                image = blob_store.acquire(serializer.validated_data['image'])
+                serializer.save(designer=self.request.user, image=image)
+            logger.info('Design created', extra={'design_id': serializer.instance.pk, 'user_id': self.request.user.pk})
+        except Exception:
+            logger.exception('Failed to create design')
+
+    def perform_update(self, serializer):
+        upload = serializer.validated_data.get('image')
+        if upload is None:
+            serializer.save()
+            return
+        with transaction.atomic():
+            previous = serializer.instance.image.name
+            serializer.save(image=blob_store.acquire(upload))
+            # Also balances the extra reference when the same content is re-uploaded
+            blob_store.release(previous)
 
-class MessageViewSet(viewsets.ModelViewSet):
-    queryset = Message.objects.all()
+class MessageViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = Message.objects.select_related('sender', 'receiver', 'design__designer')
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 3, 'retrieve': 2, 'mark_read': 7}
 
     def get_queryset(self):
         user = self.request.user
-        print("✉️ Fetching messages for user:", user)
         qs = self.queryset.filter(Q(sender=user) | Q(receiver=user)).order_by('-timestamp')
-        print("🔍 Retrieved message count:", qs.count())
-        return qs
+        return sparse_queryset(qs, MessageSerializer, self.request, keep=('timestamp',))
 
     def perform_create(self, serializer):
-        print("✉️ Creating message from:", self.request.user)
-        serializer.save(sender=self.request.user)
+        # The message and its conversation/inbox updates commit together
+        with transaction.atomic():
+            serializer.save(sender=self.request.user)
+
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_read(self, request):
+        # Marks received messages read in one UPDATE; `up_to_id` limits it to ids <= the given one
+        updated = mark_messages_read(request.user, up_to_id=parse_int(request.data, 'up_to_id'))
+        return Response({'updated': updated, **get_counters(request.user)})
+
+class ConversationViewSet(QueryBudgetMixin, viewsets.ReadOnlyModelViewSet):
+    # Inbox: one row per thread the user takes part in, newest activity first
+    queryset = ConversationParticipant.objects.select_related(
+        'conversation__design', 'conversation__user_a', 'conversation__user_b'
+    )
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = InboxPagination
+    lookup_field = 'conversation_id'
+    query_budget = {'list': 2, 'retrieve': 2, 'messages': 3, 'read': 6}
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user, last_message_at__isnull=False)
+
+    @action(detail=True, methods=['get'], pagination_class=ThreadPagination)
+    def messages(self, request, conversation_id=None):
+        entry = self.get_object()
+        page = self.paginate_queryset(Message.objects.filter(conversation_id=entry.conversation_id))
+        serializer = ThreadMessageSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
-class BookingViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'])
+    def read(self, request, conversation_id=None):
+        entry = self.get_object()
+        mark_conversation_read(entry.conversation_id, request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class BookingViewSet(ConditionalGetMixin, QueryBudgetMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 4, 'retrieve': 3, 'batch': 11}
 
     def get_queryset(self):
         user = self.request.user
-        print("📋 Fetching bookings for user:", user)
         if hasattr(user, 'role') and user.role == User.DESIGNER:
             qs = self.queryset.filter(design__designer=user)
         else:
             qs = self.queryset.filter(client=user)
-        print("🔍 Retrieved booking count:", qs.count())
-        return qs
+        return sparse_queryset(qs, BookingSerializer, self.request, keep=('created_at',))
+
+    def get_throttles(self):
+        if self.action == 'create':
+            return [BookingCreateRateThrottle()]
+        return super().get_throttles()
 
     def perform_create(self, serializer):
         user = self.request.user
-        print("📋 Creating booking for user:", user)
         if user.role != User.CLIENT:
-            print("🔥 User is not a client, cannot create booking")
+            logger.info('Booking refused: not a client', extra={'user_id': user.pk})
             return Response(
                 {'error': 'Only clients can create bookings.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -140,49 +340,200 @@ class BookingViewSet(viewsets.ModelViewSet):
         try:
             design = Design.objects.get(id=design_id)
         except Design.DoesNotExist:
-            print("🔥 Design not found:", design_id)
+            logger.info('Booking refused: design not found', extra={'design_id': design_id})
             return Response(
                 {'error': 'Design does not exist.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         try:
-            booking = serializer.save(client=user, design=design)
-            print("✅ Booking created successfully:", booking)
-            # Create notification for designer
-            Notification.objects.create(
-                user=design.designer,
-                message=f"New booking for your design '{design.title}' by {user.username}"
-            )
-            print("🔔 Notification created for designer:", design.designer)
+            with transaction.atomic():
+                booking = save_booking(serializer, client=user, design=design)
+                # Side effects run on the job workers, committed together with the booking
+                enqueue_booking_jobs(booking)
+            logger.info('Booking created', extra={'booking_id': booking.pk, 'design_id': design.pk, 'user_id': user.pk})
+        except DateUnavailable:
+            raise
         except Exception as e:
-            print("🔥 Failed to create booking:", str(e))
+            logger.exception('Failed to create booking')
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class PaymentViewSet(viewsets.ModelViewSet):
-    queryset = Payment.objects.all()
+    def perform_update(self, serializer):
+        save_booking(serializer)
+
+    @action(detail=False, methods=['patch'])
+    def batch(self, request):
+        # Status changes for many bookings at once: [{"id": 1, "status": "confirmed"}, ...]
+        bookings = self.queryset if request.user.is_staff else self.queryset.filter(design__designer=request.user)
+        items = batch_items(request.data)
+        instances = load_instances(bookings, items)
+        was = {booking.pk: booking.status for booking in instances}
+        serializers = validate_items(BookingStatusSerializer, items, self.get_serializer_context(), instances)
+        try:
+            with transaction.atomic():
+                bookings = bulk_apply(Booking, serializers)
+                # bulk_update sends no post_save: move the dashboard counts here
+                deltas = Deltas()
+                for booking in bookings:
+                    if booking.status != was[booking.pk]:
+                        deltas.booking(booking, was[booking.pk], -1)
+                        deltas.booking(booking, booking.status, 1)
+                    booking._rollup_status = booking.status
+                deltas.apply()
+        except IntegrityError:
+            # Un-cancelling onto a date that has been booked since
+            raise DateUnavailable()
+        return Response({'results': BookingSerializer(bookings, many=True).data})
+
+def enqueue_booking_jobs(booking):
+    enqueue('notify_designer_of_booking', {'booking_id': booking.pk},
+            idempotency_key=f'booking:{booking.pk}:notify')
+    if settings.BOOKING_WEBHOOK_URL:
+        enqueue('deliver_webhook', {
+            'url': settings.BOOKING_WEBHOOK_URL,
+            'event': 'booking.created',
+            'event_id': f'booking:{booking.pk}:created',
+            'data': {'id': booking.pk, 'design': booking.design_id, 'client': booking.client_id},
+        }, idempotency_key=f'booking:{booking.pk}:webhook')
+
+class PaymentViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = Payment.objects.select_related('booking')
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 3, 'retrieve': 2}
 
     def get_queryset(self):
         user = self.request.user
-        print("💸 Fetching payments for user:", user)
         if hasattr(user, 'role') and user.role == User.DESIGNER:
             qs = self.queryset.filter(booking__design__designer=user)
         else:
             qs = self.queryset.filter(booking__client=user)
-        print("🔍 Retrieved payment count:", qs.count())
         return qs
 
-class NotificationViewSet(viewsets.ModelViewSet):
-    queryset = Notification.objects.all()
+class NotificationViewSet(FlatListMixin, ConditionalGetMixin, QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = Notification.objects.select_related('user')
     serializer_class = NotificationSerializer
+    flat_serializer = notification_flat
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 4, 'retrieve': 3, 'mark_read': 5, 'batch': 5, 'create_batch': 5}
 
     def get_queryset(self):
-        print("🔔 Fetching notifications for user:", self.request.user)
         qs = self.queryset.filter(user=self.request.user).order_by('-created_at')
-        print("🔍 Notification count:", qs.count())
-        return qs
\ No newline at end of file
+        return qs
+
+    @action(detail=False, methods=['patch'])
+    def batch(self, request):
+        # Read/unread flags for many of the user's notifications: [{"id": 1, "is_read": true}, ...]
+        items = batch_items(request.data)
+        instances = load_instances(self.get_queryset(), items)
+        was_read = {notification.pk: notification.is_read for notification in instances}
+        serializers = validate_items(NotificationReadSerializer, items, self.get_serializer_context(), instances)
+        with transaction.atomic():
+            notifications = bulk_apply(Notification, serializers)
+            delta = sum(
+                -1 if notification.is_read else 1
+                for notification in notifications if notification.is_read != was_read[notification.pk]
+            )
+            counters.adjust(request.user.pk, notifications=delta)
+        return Response({'results': self.get_serializer(notifications, many=True).data})
+
+    @batch.mapping.post
+    def create_batch(self, request):
+        # Staff broadcast: [{"user_id": 1, "message": "..."}, ...]
+        if not request.user.is_staff:
+            raise PermissionDenied()
+        items = batch_items(request.data)
+        user_ids = set()
+        for item in items:
+            try:
+                user_ids.add(int(item.get('user_id')))
+            except (TypeError, ValueError):
+                pass
+        context = {**self.get_serializer_context(), 'users': User.objects.in_bulk(user_ids)}
+        serializers = validate_items(NotificationBatchSerializer, items, context)
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create(
+                [Notification(**serializer.validated_data) for serializer in serializers]
+            )
+            # bulk_create sends no post_save: keep the badges and the live stream in step by hand
+            unread = {}
+            for notification in notifications:
+                if not notification.is_read:
+                    unread[notification.user_id] = unread.get(notification.user_id, 0) + 1
+            counters.adjust_many('notifications', unread)
+            transaction.on_commit(lambda: [publish_notification(notification) for notification in notifications])
+        return Response(
+            {'results': self.get_serializer(notifications, many=True).data}, status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_read(self, request):
+        updated = mark_notifications_read(request.user, up_to_id=parse_int(request.data, 'up_to_id'))
+        return Response({'updated': updated, **get_counters(request.user)})
+
+class CountersView(APIView):
+    """Unread badge counts for the current user, read from the maintained counter row."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_counters(request.user))
+
+class ThrottleStatsView(APIView):
+    """Throttled request counts per rate-limit scope."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(throttle_stats())
+
+class SyncView(APIView):
+    """
+    Delta sync for the mobile app: `GET /api/sync/?token=` returns the user's
+    designs, bookings, notifications and messages changed since the token, the
+    ids deleted since then, and the next token. No token means a full sync.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(changes_since(request.user, request.query_params.get('token'), {'request': request}))
+
+class DashboardView(APIView):
+    """
+    Designer dashboard: revenue, bookings by status and top designs for
+    `?from=&to=` (default: the last 30 days), read from the daily rollup.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.role != User.DESIGNER:
+            raise PermissionDenied('Only designers have a dashboard.')
+        end = parse_moment(request.query_params, 'to')
+        start = parse_moment(request.query_params, 'from')
+        end = timezone.localdate(end) if end else timezone.localdate()
+        start = timezone.localdate(start) if start else end - timedelta(days=29)
+        return Response(dashboard(request.user, start, end))
+
+class ExportView(APIView):
+    """
+    Streams a designer's bookings or payments, e.g. `/api/exports/bookings.csv`
+    or `/api/exports/payments.ndjson`, with `?from=&to=&after_id=`. Rows come
+    from a chunked server-side cursor, so memory stays flat however many
+    there are, under WSGI or ASGI. Staff export everyone, or one designer with `?designer=`.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, CSVRenderer, NDJSONRenderer]
+
+    def get(self, request, kind, fmt):
+        if request.user.is_staff:
+            designer_id = parse_int(request.query_params, 'designer')
+        elif request.user.role == User.DESIGNER:
+            designer_id = request.user.pk
+        else:
+            raise PermissionDenied('Only designers can export.')
+        lines = STREAMS[fmt](kind, export_rows(kind, designer_id, request.query_params))
+        if isinstance(request._request, ASGIRequest):
+            lines = stream_async(lines)
+        response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(kind, fmt)}"'
+        return response
@@ -58,6 +58,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 MIDDLEWARE.insert(0, 'corsheaders.middleware.CorsMiddleware')
+MIDDLEWARE.insert(1, 'api.profiling.ProfilingMiddleware')
+MIDDLEWARE.insert(2, 'api.logs.RequestLogMiddleware')
+MIDDLEWARE.insert(3, 'api.metrics.MetricsMiddleware')
 ROOT_URLCONF = 'design_marketplace.urls'
 
 REST_FRAMEWORK = {
@@ -66,12 +69,125 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
+    # orjson-backed when installed; same bytes as DRF's JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Reverse proxies in front of the app. Throttles key on the client address
+    # that many hops back in X-Forwarded-For; at 0 the header is ignored and
+    # REMOTE_ADDR is used, so clients can't pick their own throttle bucket.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
+}
+
+# Structured logging (api/logs.py): JSON lines written from a background thread,
+# with credential-like fields redacted. `api.requests` gets one line per request
+# (method, path, status, duration, queries): every 5xx and every request slower
+# than LOG_SLOW_REQUEST_MS, plus LOG_REQUEST_SAMPLE_RATE of the rest. Set the
+# `api.payloads` logger to DEBUG to dump every serialized object.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_REQUEST_SAMPLE_RATE = float(os.environ.get('LOG_REQUEST_SAMPLE_RATE', '0.1'))
+LOG_SLOW_REQUEST_MS = 500
+LOG_REDACT_FIELDS = ('password', 'token', 'authorization', 'secret', 'cookie', 'csrf')
+# Request metrics (api/metrics.py), in Prometheus text format at /api/internal/metrics/:
+# per-route latency, DB query count and time, and serializer time. Internal
+# endpoints answer `Authorization: Bearer <METRICS_TOKEN>`, or addresses in
+# METRICS_ALLOWED_IPS. That list is empty by default: behind a reverse proxy on
+# the same host every client would appear to come from 127.0.0.1.
+METRICS_ALLOWED_IPS = []
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Per-request profiling (api/profiling.py): a request sent with
+# `X-Profile: <PROFILING_TOKEN>` is run under cProfile and the stats saved to
+# PROFILE_DIR for /api/internal/profiles/<id>/. Disabled while the token is empty.
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', BASE_DIR / 'profiles'))
+PROFILE_KEEP = 50
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'api.logs.JSONFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'api.logs.NonBlockingStreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'api.payloads': {'level': 'WARNING'},
+    },
 }
 
+# Per-action query budgets declared on the API viewsets (api/querybudget.py).
+# Counting wraps every query, so logging overruns is opt-in (QUERY_BUDGET_LOG=1,
+# e.g. on a canary); the test runner turns on strict mode for every test so
+# they fail instead.
+QUERY_BUDGET_LOG = os.environ.get('QUERY_BUDGET_LOG', '') == '1'
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'api.testrunner.StrictQueryBudgetRunner'
+
+# Point 'default' at a shared backend (Redis/Memcached) when running several
+# workers so cached design payloads and their invalidation are shared.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+API_RESPONSE_CACHE_TIMEOUT = 300
+
+# Token auth (api/authentication.py): token -> user lookups are cached for
+# AUTH_TOKEN_CACHE_TIMEOUT seconds. AUTH_TOKEN_TTL (seconds) makes tokens expire;
+# AUTH_TOKEN_ROTATE_AFTER has logins hand out a new key once a token is that old.
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+AUTH_TOKEN_TTL = None
+AUTH_TOKEN_ROTATE_AFTER = None
+
+# Token-bucket rate limits per scope (api/throttling.py): 'N/period' allows bursts
+# of N requests refilled evenly over the period (s/min/hour/day). Buckets live in
+# API_THROTTLE_CACHE_ALIAS, so a shared backend makes the limits global.
+API_THROTTLE_RATES = {
+    'login': '10/min',
+    'register': '5/hour',
+    'booking_create': '30/min',
+}
+API_THROTTLE_CACHE_ALIAS = 'default'
+
+# Largest number of objects accepted by the batch endpoints and ?ids= multi-get
+API_BATCH_MAX_SIZE = 100
+
+# Delta sync (/api/sync/): rows per source per call, and how long a change must
+# have been committed before it is handed out (covers in-flight transactions)
+SYNC_PAGE_SIZE = 200
+SYNC_SETTLE_SECONDS = 1
+
+# Rows fetched per round trip by the streaming exports (/api/exports/)
+EXPORT_CHUNK_SIZE = 2000
+
+# Build WebP/JPEG thumbnails of uploaded designs on the job workers
+IMAGE_DERIVATIVES_ASYNC = True
+
+# Server-Sent Events notification push (/api/notifications/stream/, ASGI only).
+# Notifications are created by the job workers, so the broker tails the table;
+# 'api.realtime.InProcessBroker' only sees rows created in the web process.
+NOTIFICATION_BROKER = 'api.realtime.DatabasePollingBroker'
+NOTIFICATION_POLL_INTERVAL = 1.0
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+NOTIFICATION_STREAM_HEARTBEAT = 15
+NOTIFICATION_STREAM_REPLAY_LIMIT = 200
+
+# Database-backed job queue (api/jobs.py), drained by `manage.py run_workers`
+JOB_POLL_INTERVAL = 1.0
+JOB_VISIBILITY_TIMEOUT = 300
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 2
+JOB_RETRY_BACKOFF_MAX = 3600
+# Optional endpoint notified of every new booking
+BOOKING_WEBHOOK_URL = ''
+WEBHOOK_TIMEOUT = 5
+
 
 
 TEMPLATES = [
@@ -98,7 +214,17 @@ WSGI_APPLICATION = 'design_marketplace.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # Overridable so benchmarks (seed_benchmark_data) can run against a scratch copy
+        'NAME': os.environ.get('DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            # Writers take the lock at BEGIN and wait for it, instead of failing
+            # with "database is locked" when two transactions upgrade at once
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # On disk rather than in memory so the concurrency tests' threads can
+        # wait on each other's locks (shared-cache memory DBs fail instead)
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -4,7 +4,7 @@ from rest_framework.authtoken import views as drf_views
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
-from api.views import RegisterAPIView, LogoutAPIView
+from api.views import RegisterAPIView, LogoutAPIView, TokenRotateAPIView
 from api.views import CsrfExemptAuthToken
 from api.views import BookingViewSet
 from django.conf import settings
@@ -34,7 +34,9 @@ urlpatterns = [
     # Custom Registration & Logout
     path('api/register/', RegisterAPIView.as_view(), name='register'),
     path('api/logout/', LogoutAPIView.as_view(), name='logout'),
+    path('api/token/rotate/', TokenRotateAPIView.as_view(), name='token-rotate'),
    path('api/bookings/', BookingViewSet.as_view({'get': 'list', 'post': 'create'}), name='booking-create'),
+   path('api/bookings/batch/', BookingViewSet.as_view({'patch': 'batch'}), name='booking-batch'),
     # API docs
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),